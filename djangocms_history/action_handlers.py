@@ -1,12 +1,20 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Iterable
+from collections import defaultdict
+from itertools import chain
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
 
-from cms.models import CMSPlugin
+from django.db import transaction
+from django.db.models import Count, F, Max, Min
 
+from cms.models import CMSPlugin, Placeholder
+
+from . import columns
 from .helpers import delete_plugins
+from .restore import restore_plugins
 
 if TYPE_CHECKING:
+    from .datastructures import ArchivedPlugin
     from .models import PlaceholderAction
 
 
@@ -18,68 +26,145 @@ def _delete_plugins(action: PlaceholderAction, plugin_ids: Iterable[int]) -> Non
     action.placeholder.clear_cache(action.language)
 
 
+def _iter_archived_chunks(
+    plugins: columns.PluginStream | list[ArchivedPlugin],
+) -> Iterator[list[ArchivedPlugin]]:
+    # Yields the archived plugins in position order, a chunk at a time.
+    # Streamed plugins are decoded chunk by chunk; lists (and plugins
+    # recorded out of order) are sorted first.
+    if isinstance(plugins, columns.PluginStream) and plugins.is_ordered():
+        return plugins.iter_chunks()
+
+    plugins = sorted(plugins, key=lambda plugin: plugin.position)
+    return (
+        plugins[index:index + columns.CHUNK_SIZE]
+        for index in range(0, len(plugins), columns.CHUNK_SIZE)
+    )
+
+
+def _open_position_gap(placeholder: Placeholder, language: str, start: int, count: int, last: int) -> None:
+    # Shifts the plugins at or after ``start`` (up to ``last``, the last
+    # position) by ``count``, leaving the positions ``start`` to
+    # ``start + count - 1`` free.
+    if start > last:
+        return
+
+    plugins = placeholder.get_plugins(language).filter(position__gte=start)
+
+    if last - start < count:
+        # The shifted positions all lie beyond the current ones.
+        plugins.update(position=F('position') + count)
+        return
+
+    # A shifted position would take the place of one not shifted yet; park
+    # the shifted plugins at negative positions first.
+    plugins.update(position=-count - F('position'))
+    placeholder.get_plugins(language).filter(position__lt=0).update(position=-F('position'))
+
+
+@transaction.atomic
 def _restore_archived_plugins(action: PlaceholderAction, data: dict[str, Any]) -> None:
     """
     Recreates the archived plugins (a subtree or a list of subtrees)
     in the action's placeholder, at their archived positions and with
     their original primary keys.
 
-    Strategy: open a collision-free gap in the placeholder's plugin tree,
-    create the rows at their archived (global) positions, then squash all
-    positions to close any holes. Restoring plugin-by-plugin through
-    ``Placeholder.add_plugin`` instead would renumber previously restored
-    siblings and invalidate the archived positions.
+    Strategy: the restored plugins take the places from their first
+    archived position on (or follow the last plugin, if the placeholder
+    shrank since), in their archived order; the plugins at or after that
+    position move up by the number of restored plugins. Restoring
+    plugin-by-plugin through ``Placeholder.add_plugin`` instead would
+    renumber previously restored siblings and invalidate the archived
+    positions.
+
+    If the positions of the placeholder have holes, the plugins at or after
+    the first archived position are shifted beyond any archived position
+    instead, the rows are created at their archived positions and all
+    positions are squashed afterwards.
+
+    The plugins are restored in chunks (see ``columns.PluginStream``), each
+    with a few bulk inserts (see ``restore.restore_plugins``). The plugins
+    come in tree order, so only the restored ancestors of the last restored
+    plugin can be parents of the following ones; only their primary keys
+    are kept. Other parents are checked in the database.
     """
     placeholder = action.placeholder
     language = action.language
-    archived_plugins = sorted(data['plugins'], key=lambda plugin: plugin.position)
+    count = len(data['plugins'])
 
-    if not archived_plugins:
+    if not count:
         return
 
-    start = archived_plugins[0].position
-    count = len(archived_plugins)
-    last = placeholder.get_last_plugin_position(language) or 0
+    chunks = _iter_archived_chunks(data['plugins'])
+    first_chunk = next(chunks)
+    start = first_chunk[0].position
+    positions = placeholder.get_plugins(language).aggregate(
+        first=Min('position'),
+        last=Max('position'),
+        count=Count('pk'),
+    )
+    last = positions['last'] or 0
 
-    if last >= start:
+    if positions['count'] == last and positions['first'] in (1, None):
+        position = min(start, last + 1)
+        _open_position_gap(placeholder, language, start=position, count=count, last=last)
+    else:
         # Shift all plugins at or after the first archived position out of
         # the way. The offset guarantees the shifted plugins land beyond
         # any archived position (which is at most the size of the tree at
         # archive time), so the unique (placeholder, language, position)
         # constraint cannot be violated by the inserts below.
-        placeholder._shift_plugin_positions(
-            language,
-            start=start,
-            offset=last + count,
-        )
-
-    restored_ids = {archived_plugin.pk for archived_plugin in archived_plugins}
-    # Parents that are not part of the restored set survived in the
-    # placeholder (e.g. a nested plugin restored under an existing parent).
-    # Fetch them all in one query rather than one lookup per plugin.
-    surviving_parent_ids = {
-        archived_plugin.parent_id
-        for archived_plugin in archived_plugins
-        if archived_plugin.parent_id and archived_plugin.parent_id not in restored_ids
-    }
-    plugins_by_id = CMSPlugin.objects.in_bulk(surviving_parent_ids)
-
-    for archived_plugin in archived_plugins:
-        if archived_plugin.parent_id:
-            parent = plugins_by_id[archived_plugin.parent_id]
-        else:
-            parent = None
-
-        plugin = archived_plugin.restore(
-            placeholder=placeholder,
-            language=language,
-            parent=parent,
-        )
-        plugins_by_id[plugin.pk] = plugin
-
-    # Close the holes left by the shift; restored plugins keep their
-    # relative order, surviving plugins keep theirs.
-    placeholder._recalculate_plugin_positions(language)
+        position = None
+
+        if last >= start:
+            placeholder._shift_plugin_positions(
+                language,
+                start=start,
+                offset=last + count,
+            )
+
+    # The primary keys of the restored ancestors of the last restored plugin
+    ancestor_ids = []
+
+    for chunk in chain([first_chunk], chunks):
+        # Parents are restored before their children; the others survived
+        # in the placeholder (e.g. a nested plugin restored under an
+        # existing parent). Check them all in one query per chunk.
+        chunk_ids = {archived_plugin.pk for archived_plugin in chunk}
+        surviving_parent_ids = {
+            archived_plugin.parent_id
+            for archived_plugin in chunk
+            if archived_plugin.parent_id
+        }.difference(ancestor_ids, chunk_ids)
+
+        if surviving_parent_ids:
+            missing = surviving_parent_ids.difference(
+                CMSPlugin.objects.filter(pk__in=surviving_parent_ids).values_list('pk', flat=True)
+            )
+
+            if missing:
+                raise CMSPlugin.DoesNotExist(
+                    'Parent plugins {} of the restored plugins do not exist'.format(sorted(missing))
+                )
+
+        if position is not None:
+            chunk = [
+                archived_plugin._replace(position=position + index)
+                for index, archived_plugin in enumerate(chunk)
+            ]
+            position += len(chunk)
+
+        restore_plugins(chunk, placeholder=placeholder, language=language)
+
+        for archived_plugin in chunk:
+            while ancestor_ids and ancestor_ids[-1] != archived_plugin.parent_id:
+                ancestor_ids.pop()
+            ancestor_ids.append(archived_plugin.pk)
+
+    if position is None:
+        # Close the holes left by the shift; restored plugins keep their
+        # relative order, surviving plugins keep theirs.
+        placeholder._recalculate_plugin_positions(language)
     placeholder.clear_cache(language)
 
 
@@ -130,28 +215,71 @@ def undo_add_plugin(action: PlaceholderAction) -> None:
 
 
 def redo_add_plugin(action: PlaceholderAction) -> None:
-    post_data = action.get_post_action_data()
+    post_data = action.stream_post_action_data()
     _restore_archived_plugins(action, data=post_data)
 
 
+def _update_plugins(changes: Iterable[tuple[ArchivedPlugin, dict[str, Any]]]) -> None:
+    # Writes the given field values of the archived plugins, with one
+    # query per plugin model and set of fields.
+    groups = defaultdict(list)
+
+    for plugin, data in changes:
+        if data:
+            groups[plugin.model, tuple(sorted(data))].append((plugin.pk, data))
+
+    for (model, names), rows in groups.items():
+        if len(rows) == 1:
+            pk, data = rows[0]
+            model.objects.filter(pk=pk).update(**data)
+            continue
+
+        fields = [
+            field for field in map(model._meta.get_field, names)
+            if not field.primary_key
+        ]
+
+        if not fields:
+            continue
+
+        plugins = []
+
+        for pk, data in rows:
+            plugin = model(pk=pk)
+
+            for field in fields:
+                setattr(plugin, field.attname, data[field.name])
+            plugins.append(plugin)
+        model.objects.bulk_update(plugins, [field.name for field in fields])
+
+
 def undo_change_plugin(action: PlaceholderAction) -> None:
     archived_plugins = action.get_pre_action_data()['plugins']
+    # Only the fields in the post data were changed (older actions
+    # have every field in there).
+    changed_fields = {
+        plugin.pk: plugin.data
+        for plugin in action.get_post_action_data()['plugins']
+    }
+    changes = []
 
     for plugin in archived_plugins:
-        if plugin.data:
-            plugin.model.objects.filter(pk=plugin.pk).update(**plugin.data)
+        fields = changed_fields.get(plugin.pk)
+        data = plugin.data
+
+        if data and fields is not None:
+            data = {name: value for name, value in data.items() if name in fields}
+        changes.append((plugin, data))
+    _update_plugins(changes)
 
 
 def redo_change_plugin(action: PlaceholderAction) -> None:
     archived_plugins = action.get_post_action_data()['plugins']
-
-    for plugin in archived_plugins:
-        if plugin.data:
-            plugin.model.objects.filter(pk=plugin.pk).update(**plugin.data)
+    _update_plugins((plugin, plugin.data) for plugin in archived_plugins)
 
 
 def undo_delete_plugin(action: PlaceholderAction) -> None:
-    pre_data = action.get_pre_action_data()
+    pre_data = action.stream_pre_action_data()
     _restore_archived_plugins(action, data=pre_data)
 
 
@@ -204,7 +332,7 @@ def undo_move_plugin_in_to_clipboard(action: PlaceholderAction) -> None:
 
 
 def redo_move_plugin_in_to_clipboard(action: PlaceholderAction) -> None:
-    post_data = action.get_post_action_data()
+    post_data = action.stream_post_action_data()
 
     # clear the clipboard
     action.placeholder.clear()
@@ -217,7 +345,7 @@ def redo_move_plugin_in_to_clipboard(action: PlaceholderAction) -> None:
 
 
 def undo_move_plugin_out_to_clipboard(action: PlaceholderAction) -> None:
-    pre_data = action.get_pre_action_data()
+    pre_data = action.stream_pre_action_data()
 
     # Plugin was moved to the clipboard.
     # Recreate it (and its descendants) in the source placeholder.
@@ -243,7 +371,7 @@ def undo_paste_plugin(action: PlaceholderAction) -> None:
 
 
 def redo_paste_plugin(action: PlaceholderAction) -> None:
-    post_data = action.get_post_action_data()
+    post_data = action.stream_post_action_data()
     _restore_archived_plugins(action, data=post_data)
 
 
@@ -255,7 +383,7 @@ def undo_paste_placeholder(action: PlaceholderAction) -> None:
 
 
 def redo_paste_placeholder(action: PlaceholderAction) -> None:
-    post_data = action.get_post_action_data()
+    post_data = action.stream_post_action_data()
     _restore_archived_plugins(action, data=post_data)
 
 
@@ -267,12 +395,12 @@ def undo_add_plugins_from_placeholder(action: PlaceholderAction) -> None:
 
 
 def redo_add_plugins_from_placeholder(action: PlaceholderAction) -> None:
-    post_data = action.get_post_action_data()
+    post_data = action.stream_post_action_data()
     _restore_archived_plugins(action, data=post_data)
 
 
 def undo_clear_placeholder(action: PlaceholderAction) -> None:
-    pre_data = action.get_pre_action_data()
+    pre_data = action.stream_pre_action_data()
     _restore_archived_plugins(action, data=pre_data)
 
 
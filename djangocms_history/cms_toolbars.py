@@ -12,11 +12,7 @@ from cms.toolbar_base import CMSToolbar
 from cms.toolbar_pool import toolbar_pool
 from cms.utils.page_permissions import user_can_change_page
 
-from .helpers import (
-    get_active_operation,
-    get_inactive_operation,
-    get_operations_from_request,
-)
+from .helpers import get_history_context, get_operations_from_request
 from .models import PlaceholderAction, PlaceholderOperation
 
 
@@ -93,16 +89,20 @@ class UndoRedoToolbar(CMSToolbar):
         return operations
 
     def get_active_operation(self) -> PlaceholderOperation | None:
-        operations = self.get_operations()
-        return get_active_operation(operations)
+        context = get_history_context(self.request)
+        return context.get_active_operation(
+            path=self.toolbar.request_path,
+            language=self.toolbar.toolbar_language,
+            operations=self.get_operations(),
+        )
 
     def get_inactive_operation(self) -> PlaceholderOperation | None:
-        operations = self.get_operations()
-        operation = get_inactive_operation(
-            operations,
-            active_operation=self.active_operation,
+        context = get_history_context(self.request)
+        return context.get_inactive_operation(
+            path=self.toolbar.request_path,
+            language=self.toolbar.toolbar_language,
+            operations=self.get_operations(),
         )
-        return operation
 
     def add_buttons(self) -> None:
         container = ButtonList(side=self.toolbar.RIGHT)
@@ -0,0 +1,191 @@
+"""
+Column-wise encoding of the plugin lists of action data.
+
+Each snapshot in ``data['plugins']`` (see ``helpers.get_plugin_data``)
+repeats the same keys and, in ``data``, the field names of its plugin type.
+The list is stored column by column instead::
+
+    {
+        "__columns__": 1,
+        "pk": [...],                        difference to the previous pk
+        "creation_date": [...],
+        "position": [...],                  difference to the previous position
+        "parent_id": [...],
+        "types": ["LinkPlugin", ...],       plugin types, each stored once
+        "type": [0, ...],                   index in "types"
+        "fields": [["name", ...], ...],     field names of each data shape
+        "shape": [0, ...],                  index in "fields", null without data
+        "data": [["A Link", ...], ...]      field values, in the shape's order,
+                                            or the digest of a stored snapshot
+    }
+
+and decoded straight into ``ArchivedPlugin`` objects. The plugins of a type
+usually share one shape; the post data of plugin changes, which only holds
+the changed fields, can have several. Stored as differences, the mostly
+consecutive pks and positions of a subtree take a digit each. Snapshots
+(see ``djangocms_history.snapshots``) have no shape.
+"""
+from __future__ import annotations
+
+from itertools import accumulate, chain, islice
+from sys import intern
+from typing import Any, Iterator
+
+from . import snapshots as snapshot_store
+from .datastructures import ArchivedPlugin, intern_data
+
+COLUMNS_KEY = '__columns__'
+
+VERSION = 1
+
+# Plugins decoded at a time when a plugin list is streamed (see ``PluginStream``)
+CHUNK_SIZE = 500
+
+
+def encode_plugins(
+    plugins: list[dict[str, Any]],
+    snapshots: dict[str, str] | None = None,
+) -> dict[str, Any]:
+    """
+    Returns the plugin list encoded column-wise. With ``snapshots``, the
+    data of the plugins is added to it by digest and only the digests are
+    kept in the list.
+    """
+    types = {}
+    shapes = {}
+    type_column = []
+    shape_column = []
+    data_column = []
+
+    for plugin in plugins:
+        type_column.append(types.setdefault(plugin['plugin_type'], len(types)))
+        data = plugin['data']
+
+        if data is None:
+            shape_column.append(None)
+            data_column.append(None)
+            continue
+
+        if snapshots is not None:
+            text = snapshot_store.dump(data)
+
+            if len(text) >= snapshot_store.MIN_SIZE:
+                digest = snapshot_store.get_digest(text)
+                snapshots[digest] = text
+                shape_column.append(None)
+                data_column.append(digest)
+                continue
+
+        shape_column.append(shapes.setdefault(tuple(data), len(shapes)))
+        data_column.append(list(data.values()))
+
+    return {
+        COLUMNS_KEY: VERSION,
+        'pk': _get_differences([plugin['pk'] for plugin in plugins]),
+        'creation_date': [plugin['creation_date'] for plugin in plugins],
+        'position': _get_differences([plugin['position'] for plugin in plugins]),
+        'parent_id': [plugin['parent_id'] for plugin in plugins],
+        'types': list(types),
+        'type': type_column,
+        'fields': [list(shape) for shape in shapes],
+        'shape': shape_column,
+        'data': data_column,
+    }
+
+
+def decode_plugins(
+    columns: dict[str, Any],
+    snapshots: dict[str, str] | None = None,
+) -> list[ArchivedPlugin]:
+    """
+    Returns the ``ArchivedPlugin`` objects of an encoded plugin list. The
+    JSON of the snapshots it references is taken from ``snapshots`` and
+    fetched from the store if missing.
+    """
+    stream = PluginStream(columns, snapshots)
+    return next(stream.iter_chunks(size=len(stream)), [])
+
+
+class PluginStream:
+    """
+    The plugins of an encoded plugin list, decoded into ``ArchivedPlugin``
+    objects a chunk at a time as they are iterated over. Only the snapshots
+    referenced by the current chunk are fetched. The columns themselves are
+    parsed as a whole beforehand.
+    """
+
+    def __init__(self, columns: dict[str, Any], snapshots: dict[str, str] | None = None) -> None:
+        if columns[COLUMNS_KEY] != VERSION:
+            raise ValueError('Unknown plugin columns version {!r}'.format(columns[COLUMNS_KEY]))
+        self.columns = columns
+        self.snapshots = snapshots
+        # Shared by the plugins of all action data (see ``ArchivedPlugin``)
+        self.types = [intern(plugin_type) for plugin_type in columns['types']]
+        self.fields = [[intern(name) for name in shape] for shape in columns['fields']]
+
+    def __len__(self) -> int:
+        return len(self.columns['pk'])
+
+    def __iter__(self) -> Iterator[ArchivedPlugin]:
+        return chain.from_iterable(self.iter_chunks())
+
+    def is_ordered(self) -> bool:
+        """
+        Whether the plugins are in position order, as recorded.
+        """
+        return all(difference > 0 for difference in islice(self.columns['position'], 1, None))
+
+    def iter_chunks(self, size: int = CHUNK_SIZE) -> Iterator[list[ArchivedPlugin]]:
+        columns = self.columns
+        types = self.types
+        rows = zip(
+            accumulate(columns['pk']),
+            columns['creation_date'],
+            accumulate(columns['position']),
+            (types[index] for index in columns['type']),
+            columns['parent_id'],
+            columns['shape'],
+            columns['data'],
+        )
+
+        while True:
+            chunk = list(islice(rows, size))
+
+            if not chunk:
+                return
+            yield self._decode_chunk(chunk)
+
+    def _decode_chunk(self, rows: list[tuple]) -> list[ArchivedPlugin]:
+        fields = self.fields
+        snapshots = self.snapshots or {}
+        missing = {row[-1] for row in rows if isinstance(row[-1], str)}.difference(snapshots)
+
+        if missing:
+            snapshots = {**snapshots, **snapshot_store.fetch(missing)}
+            lost = missing.difference(snapshots)
+
+            if lost:
+                raise snapshot_store.MissingSnapshotError(
+                    'Plugin snapshots {} are no longer stored'.format(sorted(lost))
+                )
+
+        make = ArchivedPlugin._make
+        plugins = []
+
+        for pk, creation_date, position, plugin_type, parent_id, shape, values in rows:
+            if isinstance(values, str):
+                data = intern_data(snapshot_store.load(snapshots[values]))
+            elif shape is None:
+                data = None
+            else:
+                data = dict(zip(fields[shape], values))
+            plugins.append(make((pk, creation_date, position, plugin_type, parent_id, data)))
+        return plugins
+
+
+def is_columns(data: dict[str, Any]) -> bool:
+    return COLUMNS_KEY in data
+
+
+def _get_differences(values: list[int]) -> list[int]:
+    return values[:1] + [value - previous for previous, value in zip(values, values[1:])]
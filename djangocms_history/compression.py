@@ -0,0 +1,211 @@
+"""
+Compression of the JSON stored as the pre and post data of actions.
+
+Plugin snapshots repeat the same keys, plugin types and dates over and over
+and compress well. Compressed data is stored as text, so that the columns
+keep their type: a ``~`` (which can't start a JSON document), a letter
+naming the method and the base64 encoded compressed bytes::
+
+    ~z<base64>                  zlib
+    ~d<dictionary id><base64>   zlib with the preset dictionary
+    ~x<base64>                  lzma
+
+Anything else is plain JSON, which is what earlier versions stored and what
+is stored for short data or data that doesn't get smaller.
+
+``DJANGOCMS_HISTORY_COMPRESSION`` selects the method (``'zlib'``, the
+default, or ``'lzma'``); ``None`` stores plain JSON. With
+``DJANGOCMS_HISTORY_COMPRESSION_DICTIONARY = True`` zlib is primed with a
+dictionary of the keys and the field names of the installed plugins, which
+mostly helps small snapshots. The dictionary changes when plugins are
+installed or removed, so each dictionary is stored in the
+``CompressionDictionary`` table, by id, before data is compressed with it;
+data compressed with an earlier dictionary is read with the stored one.
+"""
+from __future__ import annotations
+
+import base64
+import lzma
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import router, transaction
+
+from cms.plugin_pool import plugin_pool
+
+from .utils import get_plugin_fields
+
+MARKER = '~'
+
+ZLIB = 'z'
+ZLIB_DICTIONARY = 'd'
+LZMA = 'x'
+
+# Data shorter than this is stored as is; there is little to gain.
+MIN_SIZE = 256
+
+# zlib only uses the last 32 KB of a preset dictionary.
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+# Length of the dictionary id (a hex encoded crc32).
+DICTIONARY_ID_LENGTH = 8
+
+# The keys of the action data (see ``columns.encode_plugins``), in the order
+# they are written.
+ACTION_DATA_KEYS = (
+    '{"parent_id":null,',
+    '{"plugins":{"__columns__":1,"pk":[',
+    '],"creation_date":["',
+    '"],"position":[',
+    '],"parent_id":[',
+    '],"types":["',
+    '"],"type":[',
+    '],"fields":[["',
+    '"]],"shape":[',
+    '],"data":[[',
+)
+
+
+# Ids of the dictionaries known to be stored, and the stored dictionaries
+# read, by id (see ``save_dictionary`` and ``get_stored_dictionary``)
+_saved_dictionary_ids = set()
+_stored_dictionaries = {}
+
+
+class UnknownDictionaryError(ValueError):
+    pass
+
+
+def get_method() -> str | None:
+    return getattr(settings, 'DJANGOCMS_HISTORY_COMPRESSION', 'zlib')
+
+
+def use_dictionary() -> bool:
+    return getattr(settings, 'DJANGOCMS_HISTORY_COMPRESSION_DICTIONARY', False)
+
+
+def compress(text: str, method: str | None = None) -> str:
+    """
+    Returns ``text`` compressed with the given method (by default the
+    configured one) if that makes it shorter, otherwise ``text``.
+    """
+    method = method or get_method()
+
+    if not method or len(text) < MIN_SIZE:
+        return text
+
+    data = text.encode()
+
+    if method == 'lzma':
+        prefix = LZMA
+        compressed = lzma.compress(data, preset=9)
+    elif method == 'zlib' and use_dictionary():
+        dictionary_id, dictionary = get_dictionary()
+        save_dictionary(dictionary_id, dictionary)
+        compressor = zlib.compressobj(zlib.Z_BEST_COMPRESSION, zdict=dictionary)
+        prefix = ZLIB_DICTIONARY + dictionary_id
+        compressed = compressor.compress(data) + compressor.flush()
+    elif method == 'zlib':
+        prefix = ZLIB
+        compressed = zlib.compress(data, zlib.Z_BEST_COMPRESSION)
+    else:
+        raise ValueError(f'Unknown compression method {method!r}')
+
+    value = MARKER + prefix + base64.b64encode(compressed).decode('ascii')
+    return value if len(value) < len(text) else text
+
+
+def decompress(value: str) -> str:
+    """
+    Returns the JSON text of stored action data, compressed or not.
+    """
+    if not value.startswith(MARKER):
+        return value
+
+    method, body = value[1], value[2:]
+
+    if method == ZLIB_DICTIONARY:
+        dictionary_id, body = body[:DICTIONARY_ID_LENGTH], body[DICTIONARY_ID_LENGTH:]
+        current_id, dictionary = get_dictionary()
+
+        if dictionary_id != current_id:
+            dictionary = get_stored_dictionary(dictionary_id)
+        decompressor = zlib.decompressobj(zdict=dictionary)
+        data = decompressor.decompress(base64.b64decode(body)) + decompressor.flush()
+    elif method == ZLIB:
+        data = zlib.decompress(base64.b64decode(body))
+    elif method == LZMA:
+        data = lzma.decompress(base64.b64decode(body))
+    else:
+        raise ValueError(f'Unknown compression method {method!r}')
+    return data.decode()
+
+
+def is_compressed(value: str) -> bool:
+    return value.startswith(MARKER)
+
+
+@lru_cache()
+def get_dictionary() -> tuple[str, bytes]:
+    """
+    Returns the id and the contents of the preset dictionary: the plugin
+    types and field names of the installed plugins, followed by the keys of
+    the action data (zlib encodes the matches closest to the data shortest).
+    """
+    words = []
+
+    for plugin in sorted(plugin_pool.get_all_plugins(), key=lambda plugin: plugin.__name__):
+        words.append(f'"{plugin.__name__}",')
+        words.extend(f'"{name}",' for name in get_plugin_fields(plugin.__name__))
+    words.extend(ACTION_DATA_KEYS)
+
+    dictionary = ''.join(words).encode()[-MAX_DICTIONARY_SIZE:]
+    dictionary_id = '{:08x}'.format(zlib.crc32(dictionary))
+    return dictionary_id, dictionary
+
+
+def save_dictionary(dictionary_id: str, dictionary: bytes) -> None:
+    """
+    Stores the dictionary, unless it is known to be stored already.
+    """
+    from .models import CompressionDictionary
+
+    if dictionary_id in _saved_dictionary_ids:
+        return
+
+    using = router.db_for_write(CompressionDictionary)
+    CompressionDictionary.objects.using(using).bulk_create(
+        [CompressionDictionary(dictionary_id=dictionary_id, data=dictionary)],
+        ignore_conflicts=True,
+    )
+    # Until then, the row goes away if the transaction is rolled back.
+    transaction.on_commit(lambda: _saved_dictionary_ids.add(dictionary_id), using=using)
+
+
+def get_stored_dictionary(dictionary_id: str) -> bytes:
+    """
+    Returns the contents of a stored dictionary.
+    """
+    from .models import CompressionDictionary
+
+    try:
+        return _stored_dictionaries[dictionary_id]
+    except KeyError:
+        pass
+
+    dictionary = (
+        CompressionDictionary
+        .objects
+        .filter(pk=dictionary_id)
+        .values_list('data', flat=True)
+        .first()
+    )
+
+    if dictionary is None:
+        raise UnknownDictionaryError(
+            'The action data was compressed with the unknown preset '
+            'dictionary {}'.format(dictionary_id)
+        )
+    _stored_dictionaries[dictionary_id] = bytes(dictionary)
+    return _stored_dictionaries[dictionary_id]
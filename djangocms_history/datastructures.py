@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+import warnings
 from collections import namedtuple
+from sys import intern
+from typing import Any
 
 from django.core.serializers import deserialize
 from django.core.serializers.base import DeserializedObject
 from django.db import transaction
 from django.utils.encoding import force_str
-from django.utils.functional import cached_property
 from django.utils.timezone import now
 
 from cms.models import CMSPlugin, Placeholder
@@ -19,14 +21,31 @@ BaseArchivedPlugin = namedtuple(
 )
 
 
+# Default of the deprecated ``parent`` argument of ``ArchivedPlugin.restore``
+_UNSET = object()
+
+
+def intern_data(data: dict[str, Any] | None) -> dict[str, Any] | None:
+    """
+    Returns the field data of an archived plugin with its field names
+    interned, so that the plugins of a type share them.
+    """
+    if data is None:
+        return None
+    return {intern(name): value for name, value in data.items()}
+
+
 class ArchivedPlugin(BaseArchivedPlugin):
+    # No instance dictionary: a restore can hold thousands of these. The
+    # model is looked up in the (cached) plugin model table and the
+    # deserialized instance built when the plugin is restored.
+    __slots__ = ()
 
-    @cached_property
+    @property
     def model(self) -> type[CMSPlugin]:
         return get_plugin_model(self.plugin_type)
 
-    @cached_property
-    def deserialized_instance(self) -> DeserializedObject:
+    def deserialize(self) -> DeserializedObject:
         data = {
             'model': force_str(self.model._meta),
             'fields': self.data,
@@ -35,13 +54,26 @@ class ArchivedPlugin(BaseArchivedPlugin):
         # TODO: Handle deserialization error
         return list(deserialize('python', [data]))[0]
 
+    @property
+    def deserialized_instance(self) -> DeserializedObject:
+        warnings.warn(
+            'ArchivedPlugin.deserialized_instance is deprecated, use '
+            'ArchivedPlugin.deserialize() instead. It is no longer cached.',
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return self.deserialize()
+
     @transaction.atomic
-    def restore(
-        self,
-        placeholder: Placeholder,
-        language: str,
-        parent: CMSPlugin | None = None,
-    ) -> CMSPlugin:
+    def restore(self, placeholder: Placeholder, language: str, parent: Any = _UNSET) -> CMSPlugin:
+        if parent is not _UNSET:
+            warnings.warn(
+                'The parent argument of ArchivedPlugin.restore() is deprecated '
+                'and ignored; the plugin is restored under its archived parent_id.',
+                DeprecationWarning,
+                stacklevel=3,
+            )
+
         # Creates the plugin row directly at the archived (global) position.
         # The caller is responsible for having opened a large enough gap in
         # the placeholder's plugin tree beforehand and for squashing the
@@ -51,13 +83,13 @@ class ArchivedPlugin(BaseArchivedPlugin):
             plugin_type=self.plugin_type,
             placeholder=placeholder,
             language=language,
-            parent=parent,
+            parent_id=self.parent_id,
             position=self.position,
             creation_date=self.creation_date or now(),
         )
 
         if self.plugin_type != 'CMSPlugin' and self.data is not None:
-            _d_instance = self.deserialized_instance
+            _d_instance = self.deserialize()
             plugin.set_base_attr(_d_instance.object)
             _d_instance.save()
         return plugin
@@ -0,0 +1,230 @@
+"""
+Delta encoding of long text fields in the post data of plugin changes.
+
+The pre data of a CHANGE_PLUGIN action holds the full plugin data, the post
+data the changed fields (see ``operation_handlers.get_changed_plugin_data``).
+A one word edit of a long text would still store the whole text twice, so
+text fields of at least ``DJANGOCMS_HISTORY_DELTA_THRESHOLD`` characters
+(1024 by default, ``0`` disables the encoding) are stored in the post data as
+``{"__delta__": [...]}``: a list of operations that rebuild the new value from
+the old one. ``[start, end]`` copies a slice of the old value and a string is
+inserted as is. The new value is rebuilt when the post data is parsed.
+
+The operations are computed with ``difflib``, after trimming the common
+prefix and suffix (usually most of the text): first on the lines (or HTML
+tags) of the text, then on the words of the lines that were changed.
+"""
+from __future__ import annotations
+
+import re
+from difflib import SequenceMatcher
+from typing import Any, Iterable, Iterator
+
+from django.conf import settings
+
+DELTA_KEY = '__delta__'
+
+# Split a text into lines (or up to the end of an HTML tag) and into words,
+# whitespace and punctuation; joined, the tokens give the text back.
+_CHUNK_RE = re.compile(r'[^\n>]*[\n>]|[^\n>]+')
+_WORD_RE = re.compile(r'\w+|\s+|[^\w\s]+')
+
+# Changed blocks with more words than this are stored as is rather than
+# compared word by word (the comparison is quadratic in the worst case).
+_MAX_WORDS = 500
+
+# Likewise, texts with more changed lines and tags than this are stored as
+# is rather than compared line by line, and once the word by word
+# comparisons of a text have compared this many pairs of words (the product
+# of the block lengths), its remaining changed blocks are stored as is. The
+# encoding runs in the editor's request; this keeps it to a few
+# milliseconds however large and scattered the change.
+_MAX_CHUNKS = 500
+_MAX_WORK = 200_000
+
+# Approximate stored size of a [start, end] operation.
+_COPY_SIZE = 16
+
+
+def get_threshold() -> int:
+    return getattr(settings, 'DJANGOCMS_HISTORY_DELTA_THRESHOLD', 1024)
+
+
+def encode(base: str, value: str) -> list[list[int] | str]:
+    """
+    Returns the operations that rebuild ``value`` from ``base``.
+    """
+    # The word pairs left to compare, shared by the blocks of the text
+    work = [_MAX_WORK]
+    return _merge_operations(_encode(_CHUNK_RE, base, value, offset=0, work=work))
+
+
+def _encode(
+    token_re: re.Pattern,
+    base: str,
+    value: str,
+    offset: int,
+    work: list[int],
+) -> Iterator[list[int] | str]:
+    prefix = _get_common_prefix_length(base, value)
+    suffix = _get_common_suffix_length(base[prefix:], value[prefix:])
+    base_end = len(base) - suffix
+
+    yield [offset, offset + prefix]
+    yield from _diff(
+        token_re,
+        base[prefix:base_end],
+        value[prefix:len(value) - suffix],
+        offset=offset + prefix,
+        work=work,
+    )
+    yield [offset + base_end, offset + len(base)]
+
+
+def _diff(
+    token_re: re.Pattern,
+    base: str,
+    value: str,
+    offset: int,
+    work: list[int],
+) -> Iterator[list[int] | str]:
+    base_tokens = token_re.findall(base)
+    value_tokens = token_re.findall(value)
+
+    if token_re is _CHUNK_RE:
+        if max(len(base_tokens), len(value_tokens)) > _MAX_CHUNKS:
+            yield value
+            return
+    else:
+        work[0] -= len(base_tokens) * len(value_tokens)
+
+        if work[0] < 0 or max(len(base_tokens), len(value_tokens)) > _MAX_WORDS:
+            yield value
+            return
+
+    # Offsets of the base tokens in the whole base text
+    offsets = [offset]
+    for token in base_tokens:
+        offsets.append(offsets[-1] + len(token))
+
+    # Lines and tags that are very common (e.g. "<p>") only extend the
+    # matches found around them; words are few enough to compare them all.
+    matcher = SequenceMatcher(
+        None,
+        base_tokens,
+        value_tokens,
+        autojunk=token_re is _CHUNK_RE,
+    )
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            yield [offsets[i1], offsets[i2]]
+        elif tag == 'replace' and token_re is _CHUNK_RE:
+            yield from _encode(
+                _WORD_RE,
+                ''.join(base_tokens[i1:i2]),
+                ''.join(value_tokens[j1:j2]),
+                offset=offsets[i1],
+                work=work,
+            )
+        elif tag in ('replace', 'insert'):
+            yield ''.join(value_tokens[j1:j2])
+
+
+def decode(base: str, operations: Iterable[list[int] | str]) -> str:
+    """
+    Rebuilds the value encoded by ``encode`` from its ``base``.
+    """
+    return ''.join(
+        operation if isinstance(operation, str) else base[operation[0]:operation[1]]
+        for operation in operations
+    )
+
+
+def encode_fields(data: dict[str, Any], previous_data: dict[str, Any]) -> dict[str, Any]:
+    """
+    Returns the plugin ``data`` with its long text fields delta encoded
+    against their value in ``previous_data``, when that is shorter.
+    """
+    threshold = get_threshold()
+
+    if not threshold:
+        return data
+
+    encoded_data = {}
+
+    for name, value in data.items():
+        previous_value = previous_data.get(name)
+
+        if isinstance(value, str) and isinstance(previous_value, str) and len(value) >= threshold:
+            operations = encode(previous_value, value)
+            size = sum(
+                len(operation) if isinstance(operation, str) else _COPY_SIZE
+                for operation in operations
+            )
+
+            if size < len(value):
+                value = {DELTA_KEY: operations}
+        encoded_data[name] = value
+    return encoded_data
+
+
+def decode_fields(data: dict[str, Any], previous_data: dict[str, Any]) -> dict[str, Any]:
+    """
+    Returns the plugin ``data`` with its delta encoded fields rebuilt from
+    their value in ``previous_data``.
+    """
+    return {
+        name: decode(previous_data[name], value[DELTA_KEY]) if is_delta(value) else value
+        for name, value in data.items()
+    }
+
+
+def is_delta(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and DELTA_KEY in value
+
+
+def _merge_operations(operations: list[list[int] | str]) -> list[list[int] | str]:
+    merged = []
+
+    for operation in operations:
+        if not operation or (not isinstance(operation, str) and operation[0] == operation[1]):
+            continue
+
+        if merged and isinstance(operation, str) and isinstance(merged[-1], str):
+            merged[-1] += operation
+        elif merged and not isinstance(operation, str) and not isinstance(merged[-1], str) and (
+            merged[-1][1] == operation[0]
+        ):
+            merged[-1] = [merged[-1][0], operation[1]]
+        else:
+            merged.append(operation)
+    return merged
+
+
+def _get_common_prefix_length(first: str, second: str) -> int:
+    # Binary search, so that the characters are compared by the slice
+    # comparison rather than one by one.
+    low, high = 0, min(len(first), len(second))
+
+    while low < high:
+        middle = (low + high + 1) // 2
+
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _get_common_suffix_length(first: str, second: str) -> int:
+    low, high = 0, min(len(first), len(second))
+
+    while low < high:
+        middle = (low + high + 1) // 2
+
+        if first[len(first) - middle:] == second[len(second) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
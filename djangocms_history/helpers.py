@@ -1,21 +1,33 @@
 from __future__ import annotations
 
+import re
+import warnings
 from collections import defaultdict
 from datetime import timedelta
+from functools import lru_cache
 from typing import TYPE_CHECKING, Any, Iterable, Iterator
 from urllib.parse import urlparse
 
+from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core import serializers
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import QuerySet
+from django.core.signals import setting_changed
+from django.db.models import DateField, Field, QuerySet, TimeField
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.fields.related_descriptors import ForeignKeyDeferredAttribute
+from django.db.models.query_utils import DeferredAttribute
+from django.dispatch import receiver
 from django.http import HttpRequest
-from django.urls import Resolver404, resolve
-from django.utils import timezone
+from django.urls import NoReverseMatch, Resolver404, resolve, reverse
+from django.utils import timezone, translation
+from django.utils.encoding import is_protected_type
+from django.utils.functional import cached_property
 
 from cms.models import CMSPlugin, Placeholder
 from cms.utils import get_language_from_request
 
+from . import codecs
 from .utils import get_plugin_fields, get_plugin_model, get_session_key_hash
 
 if TYPE_CHECKING:
@@ -32,6 +44,15 @@ OBJECT_ENDPOINT_URL_NAMES = {
 }
 
 
+# Number of distinct paths whose canonical origin is remembered. The origin
+# is computed for both operation signals and on every toolbar render and
+# undo/redo request, mostly for the handful of paths being edited.
+ORIGIN_CACHE_SIZE = 1024
+
+# Placeholder object ids used to reverse the object endpoints into a pattern.
+_ENDPOINT_ARG_SENTINELS = ('918273645', '546372819')
+
+
 def get_operation_origin(path: str) -> str:
     """
     Canonicalises an operation origin so that the edit, preview and structure
@@ -41,9 +62,62 @@ def get_operation_origin(path: str) -> str:
     Falls back to the plain request path for anything that is not a CMS object
     endpoint (e.g. legacy/static placeholder editing), preserving the previous
     behaviour for those cases.
+
+    Results are cached per path (see ``clear_operation_origin_cache``).
     """
-    path = urlparse(path).path
+    return _get_canonical_origin(urlparse(path).path)
+
+
+def clear_operation_origin_cache() -> None:
+    _get_canonical_origin.cache_clear()
+    _get_object_endpoint_matcher.cache_clear()
+
+
+@receiver(setting_changed, dispatch_uid='clear_operation_origin_cache')
+def _clear_operation_origin_cache(setting: str, **kwargs: Any) -> None:
+    if setting in ('ROOT_URLCONF', 'LANGUAGES', 'LANGUAGE_CODE'):
+        clear_operation_origin_cache()
+
+
+@lru_cache(maxsize=None)
+def _get_object_endpoint_matcher() -> re.Pattern | None:
+    # Reverses the object endpoints (in every language, for i18n prefixed
+    # admin URLs) into a single regular expression that captures the
+    # content type and object ids. Paths it doesn't match are resolved.
+    patterns = set()
 
+    for language, _name in settings.LANGUAGES:
+        with translation.override(language):
+            for url_name in OBJECT_ENDPOINT_URL_NAMES:
+                try:
+                    url = reverse(f'admin:{url_name}', args=_ENDPOINT_ARG_SENTINELS)
+                except NoReverseMatch:
+                    continue
+
+                pattern = re.escape(url)
+                for sentinel in _ENDPOINT_ARG_SENTINELS:
+                    pattern = pattern.replace(sentinel, '([0-9]+)', 1)
+                patterns.add(pattern)
+
+    if not patterns:
+        return None
+    return re.compile('|'.join('(?:{})'.format(pattern) for pattern in sorted(patterns)) + '$')
+
+
+@lru_cache(maxsize=ORIGIN_CACHE_SIZE)
+def _get_canonical_origin(path: str) -> str:
+    matcher = _get_object_endpoint_matcher()
+    match = matcher.match(path) if matcher else None
+
+    if match:
+        content_type_id, object_id = [group for group in match.groups() if group is not None]
+        return '{}:{}'.format(content_type_id, object_id)
+    return resolve_operation_origin(path)
+
+
+def resolve_operation_origin(path: str) -> str:
+    # Computes the canonical origin of an (already parsed) path through
+    # the URL resolver; get_operation_origin() is the cached entry point.
     try:
         match = resolve(path)
     except Resolver404:
@@ -85,6 +159,17 @@ def delete_plugins(placeholder: Placeholder, plugin_ids: Iterable[int]) -> None:
 
 
 def get_bound_plugins(plugins: Iterable[CMSPlugin]) -> Iterator[CMSPlugin]:
+    warnings.warn(
+        'djangocms_history.helpers.get_bound_plugins() is deprecated, use '
+        'get_plugins_data() to build plugin snapshots or '
+        'cms.utils.plugins.get_bound_plugins() to downcast plugins.',
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    return _get_bound_plugins(plugins)
+
+
+def _get_bound_plugins(plugins: Iterable[CMSPlugin]) -> Iterator[CMSPlugin]:
     plugin_types_map = defaultdict(list)
     plugin_lookup = {}
 
@@ -105,23 +190,276 @@ def get_bound_plugins(plugins: Iterable[CMSPlugin]) -> Iterator[CMSPlugin]:
         yield plugin_lookup.get(plugin.pk, plugin)
 
 
-def get_plugin_data(plugin: CMSPlugin, only_meta: bool = False) -> dict[str, Any]:
-    if only_meta:
-        custom_data = None
-    else:
-        plugin_fields = get_plugin_fields(plugin.plugin_type)
-        _plugin_data = serializers.serialize('python', (plugin,), fields=plugin_fields)[0]
-        custom_data = _plugin_data['fields']
+# The plugin fields recorded next to the plugin data, in the order of the
+# plugin snapshots (see get_plugin_data()).
+PLUGIN_META_FIELDS = ('pk', 'creation_date', 'position', 'plugin_type', 'parent_id')
+
+# The most plugin models whose tables are joined to the CMSPlugin table in
+# one query by get_plugins_data().
+MAX_JOINED_MODELS = 16
+
+# Attribute descriptors that return the value stored in the database as is.
+_PLAIN_DESCRIPTORS = (DeferredAttribute, ForeignKeyDeferredAttribute)
+
+
+def _is_plain_field(field: Field) -> bool:
+    # Whether the python serializer's value of the field is the stored value
+    # itself, or its str(), so that no model instance is needed.
+    if field.descriptor_class not in _PLAIN_DESCRIPTORS:
+        return False
+
+    if type(field).value_from_object is not Field.value_from_object:
+        return False
+    # Dates and times are passed through by the serializer, the string
+    # conversion of their fields is never used.
+    return (
+        type(field).value_to_string is Field.value_to_string
+        or isinstance(field, (DateField, TimeField))
+    )
 
-    plugin_data = {
+
+def _get_plain_value(value: Any) -> Any:
+    if type(value) is str or is_protected_type(value):
+        return value
+    return str(value)
+
+
+def _get_lookup_path(model: type[CMSPlugin]) -> str:
+    # Returns the lookup from CMSPlugin to the plugin model, through the
+    # reverse parent links (e.g. "link").
+    names = []
+
+    while model is not CMSPlugin:
+        parent, parent_link = next(
+            (parent, parent_link) for parent, parent_link in model._meta.parents.items()
+            if issubclass(parent, CMSPlugin)
+        )
+        names.insert(0, parent_link.related_query_name())
+        model = parent
+    return LOOKUP_SEP.join(names)
+
+
+class PluginDataExtractor:
+    """
+    Builds the ``data`` of plugin snapshots (the values of the ``python``
+    serializer for the fields of the plugin type) for the instances of one
+    plugin model, without setting up a serializer per plugin.
+    """
+
+    def __init__(self, model: type[CMSPlugin], plugin_fields: tuple[str, ...]) -> None:
+        opts = model._meta.concrete_model._meta
+        self.model = model
+        self.plugin_fields = plugin_fields
+        # The fields the serializer includes, in its order
+        self.fields = [
+            field for field in opts.local_fields
+            if field.serialize and (
+                field.attname if field.remote_field is None else field.attname[:-3]
+            ) in plugin_fields
+        ]
+        self.m2m_fields = [
+            field.name for field in opts.local_many_to_many
+            if field.serialize and field.attname in plugin_fields
+        ]
+        self.plain_fields = [_is_plain_field(field) for field in self.fields]
+        # Plugins with many-to-many fields are read as instances, the others
+        # from the rows of the CMSPlugin table joined to the plugin table.
+        self.reads_rows = not self.m2m_fields
+
+        if model is CMSPlugin or not self.fields:
+            # Nothing to join
+            self.lookups = []
+        else:
+            path = _get_lookup_path(model)
+            self.lookups = [
+                LOOKUP_SEP.join((path, name))
+                for name in ['pk'] + [field.attname for field in self.fields]
+            ]
+
+    def get_data(self, plugins: Iterable[CMSPlugin]) -> list[dict[str, Any]]:
+        """
+        Returns the data of the given plugin instances.
+        """
+        if self.m2m_fields:
+            return [
+                data['fields']
+                for data in serializers.serialize('python', plugins, fields=self.plugin_fields)
+            ]
+        return [self._get_instance_data(plugin) for plugin in plugins]
+
+    def _get_instance_data(self, plugin: CMSPlugin) -> dict[str, Any]:
+        data = {}
+
+        for field, is_plain in zip(self.fields, self.plain_fields):
+            if is_plain:
+                data[field.name] = _get_plain_value(getattr(plugin, field.attname))
+            else:
+                value = field.value_from_object(plugin)
+                data[field.name] = value if is_protected_type(value) else field.value_to_string(plugin)
+        return data
+
+    def get_row_data(self, values: tuple[Any, ...]) -> dict[str, Any] | None:
+        """
+        Returns the data of a plugin from the values of its ``lookups``, or
+        ``None`` if the plugin has no row in the plugin table.
+        """
+        if not self.lookups:
+            return {}
+
+        if values[0] is None:
+            return None
+
+        values = values[1:]
+
+        if all(self.plain_fields):
+            return {
+                field.name: _get_plain_value(value)
+                for field, value in zip(self.fields, values)
+            }
+        plugin = self.model.from_db(None, [field.attname for field in self.fields], values)
+        return self._get_instance_data(plugin)
+
+    def get_stored_snapshots(self, pks: list[int]) -> Iterator[dict[str, Any]]:
+        """
+        Returns the snapshots (see ``get_plugin_data``) of the stored plugins
+        with the given pks, read as instances.
+        """
+        plugins = self.model.objects.filter(pk__in=pks).prefetch_related(*self.m2m_fields)
+
+        for plugin, data in zip(plugins, self.get_data(plugins)):
+            yield _get_plugin_snapshot(plugin, data)
+
+
+def get_plugin_data_extractor(model: type[CMSPlugin], plugin_type: str) -> PluginDataExtractor:
+    # Plugin types sharing a model share its extractor.
+    return _get_plugin_data_extractor(model, tuple(get_plugin_fields(plugin_type)))
+
+
+@lru_cache()
+def _get_plugin_data_extractor(model: type[CMSPlugin], plugin_fields: tuple[str, ...]) -> PluginDataExtractor:
+    return PluginDataExtractor(model, plugin_fields)
+
+
+def _get_plugin_snapshot(plugin: CMSPlugin, data: dict[str, Any] | None) -> dict[str, Any]:
+    return {
         'pk': plugin.pk,
         'creation_date': plugin.creation_date,
         'position': plugin.position,
         'plugin_type': plugin.plugin_type,
         'parent_id': plugin.parent_id,
-        'data': custom_data,
+        'data': data,
+    }
+
+
+def get_plugin_data(plugin: CMSPlugin, only_meta: bool = False) -> dict[str, Any]:
+    if only_meta:
+        custom_data = None
+    else:
+        extractor = get_plugin_data_extractor(type(plugin), plugin.plugin_type)
+        custom_data = extractor.get_data([plugin])[0]
+    return _get_plugin_snapshot(plugin, custom_data)
+
+
+def get_plugins_data(plugins: list[CMSPlugin]) -> list[dict[str, Any]]:
+    """
+    Returns the snapshots of the given plugins, as ``get_plugin_data`` does
+    for the plugins downcast by ``cms.utils.plugins.get_bound_plugins``: in
+    the given order, leaving out plugins that no longer exist and their
+    descendants.
+
+    Plugins that are already downcast are taken as they are. The others are
+    read with one query on the CMSPlugin table, joined to the tables of up
+    to ``MAX_JOINED_MODELS`` plugin models (plugin models without fields of
+    their own are not joined), and one more per plugin model with
+    many-to-many fields.
+    """
+    plugin_ids = {plugin.pk for plugin in plugins}
+    snapshots = {}
+    row_extractors = {}
+    pks_by_extractor = defaultdict(list)
+
+    for plugin in plugins:
+        model = get_plugin_model(plugin.plugin_type)._meta.concrete_model
+        extractor = get_plugin_data_extractor(model, plugin.plugin_type)
+
+        if isinstance(plugin, model):
+            snapshots[plugin.pk] = _get_plugin_snapshot(plugin, extractor.get_data([plugin])[0])
+        elif extractor.reads_rows:
+            row_extractors[plugin.pk] = extractor
+        else:
+            pks_by_extractor[extractor].append(plugin.pk)
+
+    for chunk in _get_joined_chunks(row_extractors):
+        snapshots.update(_read_plugin_rows(chunk))
+
+    for extractor, pks in pks_by_extractor.items():
+        for snapshot in extractor.get_stored_snapshots(pks):
+            snapshots[snapshot['pk']] = snapshot
+
+    return [
+        snapshots[plugin.pk] for plugin in plugins
+        if plugin.pk in snapshots and (
+            not plugin.parent_id
+            or plugin.parent_id not in plugin_ids
+            or plugin.parent_id in snapshots
+        )
+    ]
+
+
+def _get_joined_chunks(extractors: dict[int, PluginDataExtractor]) -> Iterator[dict[int, PluginDataExtractor]]:
+    # Splits the plugins (pk -> extractor) in chunks whose plugin tables can
+    # be joined in one query.
+    joined_extractors = list(dict.fromkeys(
+        extractor for extractor in extractors.values() if extractor.lookups
+    ))
+    chunks = [
+        set(joined_extractors[index:index + MAX_JOINED_MODELS])
+        for index in range(0, len(joined_extractors), MAX_JOINED_MODELS)
+    ]
+
+    for index, chunk in enumerate(chunks or [set()]):
+        yield {
+            pk: extractor for pk, extractor in extractors.items()
+            # Plugins without a table to join go with the first query
+            if extractor in chunk or (index == 0 and not extractor.lookups)
+        }
+
+
+def _read_plugin_rows(extractors: dict[int, PluginDataExtractor]) -> Iterator[tuple[int, dict[str, Any]]]:
+    if not extractors:
+        return
+
+    lookups = list(PLUGIN_META_FIELDS)
+    offsets = {}
+
+    for extractor in dict.fromkeys(extractors.values()):
+        offsets[extractor] = len(lookups)
+        lookups.extend(extractor.lookups)
+
+    meta_size = len(PLUGIN_META_FIELDS)
+    rows = CMSPlugin.objects.filter(pk__in=list(extractors)).values_list(*lookups)
+
+    for row in rows:
+        extractor = extractors[row[0]]
+        offset = offsets[extractor]
+        data = extractor.get_row_data(row[offset:offset + len(extractor.lookups)])
+
+        if data is not None:
+            yield row[0], {**dict(zip(PLUGIN_META_FIELDS, row[:meta_size])), 'data': data}
+
+
+def get_changed_fields(data: dict[str, Any], previous_data: dict[str, Any]) -> dict[str, Any]:
+    """
+    Returns the fields of the plugin ``data`` (as built by ``get_plugin_data``)
+    whose values differ from ``previous_data``, the data as it was recorded.
+    Values are compared in their recorded (JSON) form.
+    """
+    codec = codecs.get_codec()
+    data = codec.decode(codec.encode(data))
+    return {
+        name: value for name, value in data.items()
+        if name not in previous_data or previous_data[name] != value
     }
-    return plugin_data
 
 
 def get_active_operation(operations: QuerySet) -> PlaceholderOperation | None:
@@ -160,27 +498,142 @@ def get_operations_from_request(
     path: str | None = None,
     language: str | None = None,
 ) -> QuerySet:
-    from .models import PlaceholderOperation
+    return get_history_context(request).get_operations(path=path, language=language)
 
-    if not language:
-        language = get_language_from_request(request)
 
-    origin = get_operation_origin(path or request.path)
+def get_history_context(request: HttpRequest) -> HistoryContext:
+    """
+    Returns the history context of the request, creating it on first use.
+    """
+    try:
+        return request._djangocms_history_context
+    except AttributeError:
+        request._djangocms_history_context = HistoryContext(request)
+        return request._djangocms_history_context
+
 
-    # This is controversial :/
-    # By design, we don't let undo/redo span longer than a day.
-    # To be decided if/how this should be configurable.
-    date = timezone.now() - timedelta(days=1)
+class HistoryContext:
+    """
+    Request scoped values shared by the operation signal handlers, the
+    toolbar and the undo/redo views, so that each of them is computed at
+    most once per request.
 
-    site = Site.objects.get_current(request)
+    The active and inactive operations are kept per origin and language.
+    Anything that changes the operations of the request's session must
+    call ``invalidate()`` (or ``record()`` for a newly applied operation).
+    """
 
-    queryset = PlaceholderOperation.objects.filter(
-        site=site,
-        origin=origin,
-        language=language,
-        user=request.user,
-        user_session_key=get_session_key_hash(request.session.session_key),
-        date_created__gt=date,
-        is_archived=False,
-    )
-    return queryset
+    def __init__(self, request: HttpRequest) -> None:
+        self.request = request
+        self._origins = {}
+        self._session_key_hashes = {}
+        self._active_operations = {}
+        self._inactive_operations = {}
+
+    @cached_property
+    def site(self) -> Site:
+        return Site.objects.get_current(self.request)
+
+    @property
+    def user_session_key(self) -> str:
+        # The session key is assigned when a new session is first saved,
+        # so it's not necessarily the same for the whole request.
+        session_key = self.request.session.session_key
+
+        try:
+            return self._session_key_hashes[session_key]
+        except KeyError:
+            key_hash = get_session_key_hash(session_key)
+            self._session_key_hashes[session_key] = key_hash
+            return key_hash
+
+    def get_origin(self, path: str | None = None) -> str:
+        path = path or self.request.path
+
+        try:
+            return self._origins[path]
+        except KeyError:
+            origin = self._origins[path] = get_operation_origin(path)
+            return origin
+
+    def get_language(self, language: str | None = None) -> str:
+        return language or get_language_from_request(self.request)
+
+    def get_operations(self, path: str | None = None, language: str | None = None) -> QuerySet:
+        from .models import PlaceholderOperation
+
+        # This is controversial :/
+        # By design, we don't let undo/redo span longer than a day.
+        # To be decided if/how this should be configurable.
+        date = timezone.now() - timedelta(days=1)
+
+        queryset = PlaceholderOperation.objects.filter(
+            site=self.site,
+            origin=self.get_origin(path),
+            language=self.get_language(language),
+            user=self.request.user,
+            user_session_key=self.user_session_key,
+            date_created__gt=date,
+            is_archived=False,
+        )
+        return queryset
+
+    def get_active_operation(
+        self,
+        path: str | None = None,
+        language: str | None = None,
+        operations: QuerySet | None = None,
+    ) -> PlaceholderOperation | None:
+        """
+        Returns the operation to undo. ``operations`` is the queryset it is
+        looked up in if it isn't known yet (``get_operations()`` by default),
+        e.g. the one of an overridden ``get_queryset()``.
+        """
+        key = (self.get_origin(path), self.get_language(language))
+
+        try:
+            return self._active_operations[key]
+        except KeyError:
+            if operations is None:
+                operations = self.get_operations(path, language)
+            operation = get_active_operation(operations)
+            self._active_operations[key] = operation
+            return operation
+
+    def get_inactive_operation(
+        self,
+        path: str | None = None,
+        language: str | None = None,
+        operations: QuerySet | None = None,
+    ) -> PlaceholderOperation | None:
+        """
+        Returns the operation to redo, like ``get_active_operation``.
+        """
+        key = (self.get_origin(path), self.get_language(language))
+
+        try:
+            return self._inactive_operations[key]
+        except KeyError:
+            if operations is None:
+                operations = self.get_operations(path, language)
+            operation = get_inactive_operation(
+                operations,
+                active_operation=self.get_active_operation(path, language, operations),
+            )
+            self._inactive_operations[key] = operation
+            return operation
+
+    def record(self, operation: PlaceholderOperation) -> None:
+        """
+        Remembers a newly applied operation as the active operation of its
+        origin. Recording it retired every unapplied operation of the
+        session on that origin, so there is nothing to redo.
+        """
+        self.invalidate()
+        key = (operation.origin, operation.language)
+        self._active_operations[key] = operation
+        self._inactive_operations[key] = None
+
+    def invalidate(self) -> None:
+        self._active_operations.clear()
+        self._inactive_operations.clear()
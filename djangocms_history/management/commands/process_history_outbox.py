@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import time
+from argparse import ArgumentParser
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from djangocms_history import outbox
+from djangocms_history.models import OutboxEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the plugin snapshots of operations recorded with '
+        'DJANGOCMS_HISTORY_DEFERRED_SNAPSHOTS enabled.'
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep processing new entries until interrupted.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            metavar='SECONDS',
+            help='Seconds to wait between two runs with --loop (default: 1).',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        while True:
+            count = outbox.process_entries(OutboxEntry.objects.all())
+
+            if count or not options['loop']:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        'Processed {} outbox entry(ies).'.format(count)
+                    )
+                )
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -7,7 +7,7 @@ from typing import Any
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from djangocms_history.models import PlaceholderOperation
+from djangocms_history.models import PlaceholderOperation, delete_operations
 
 
 class Command(BaseCommand):
@@ -39,15 +39,13 @@ class Command(BaseCommand):
             cutoff = timezone.now() - timedelta(days=days)
             queryset = queryset.filter(date_created__lt=cutoff)
 
-        count = queryset.count()
-
         if options['dry_run']:
             self.stdout.write(
-                '{} archived operation(s) would be deleted.'.format(count)
+                '{} archived operation(s) would be deleted.'.format(queryset.count())
             )
             return
 
-        queryset.delete()
+        count = delete_operations(queryset)
         self.stdout.write(
             self.style.SUCCESS(
                 'Deleted {} archived operation(s).'.format(count)
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangocms_history', '0006_outboxentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='placeholderaction',
+            index=models.Index(
+                fields=['placeholder', 'operation'],
+                name='history_action_placeholder_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangocms_history', '0007_add_action_placeholder_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PluginSnapshot',
+            fields=[
+                ('digest', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('data', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PluginSnapshotReference',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot_references', to='djangocms_history.placeholderoperation')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='references', to='djangocms_history.pluginsnapshot')),
+            ],
+            options={
+                'unique_together': {('operation', 'snapshot')},
+            },
+        ),
+    ]
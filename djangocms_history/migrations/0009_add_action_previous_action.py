@@ -0,0 +1,22 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangocms_history', '0008_add_plugin_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placeholderaction',
+            name='previous_action',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='djangocms_history.placeholderaction'),
+        ),
+        migrations.AddField(
+            model_name='placeholderaction',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
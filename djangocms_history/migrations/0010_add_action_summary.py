@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangocms_history', '0009_add_action_previous_action'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placeholderaction',
+            name='parent_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='placeholderaction',
+            name='payload_bytes',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='placeholderaction',
+            name='plugin_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='placeholderaction',
+            name='root_plugin_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='placeholderaction',
+            name='root_plugin_type',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+    ]
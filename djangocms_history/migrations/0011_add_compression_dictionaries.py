@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangocms_history', '0010_add_action_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('dictionary_id', models.CharField(max_length=8, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+    ]
@@ -2,31 +2,101 @@ from __future__ import annotations
 
 import functools
 import json
-from typing import Any
+from datetime import timedelta
+from sys import intern
+from typing import Any, Callable, Iterable
 
 from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.signals import user_logged_in
 from django.contrib.sites.models import Site
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db import models, transaction
-from django.db.models import Q, QuerySet
+from django.db import models, router, transaction
+from django.db.models import Func, Q, QuerySet, Value
+from django.db.models.deletion import Collector
 from django.dispatch import receiver
 from django.http import HttpRequest
+from django.utils import timezone
 from django.utils.functional import cached_property
 
 from cms import operations
 from cms.models import Placeholder
 from cms.signals import post_placeholder_operation, pre_placeholder_operation
 
-from . import action_handlers, actions, operation_handlers, signals
-from .datastructures import ArchivedPlugin
-from .helpers import get_operation_origin
+from . import (
+    action_handlers,
+    actions,
+    codecs,
+    columns,
+    compression,
+    delta,
+    operation_handlers,
+    outbox,
+    signals,
+    snapshots,
+)
+from .datastructures import ArchivedPlugin, intern_data
+from .helpers import get_history_context
 from .utils import get_session_key_hash, plugin_has_m2m
 
 dump_json = functools.partial(json.dumps, cls=DjangoJSONEncoder)
 
 
+class ByteLength(Func):
+    """
+    The length of a text column in bytes, as ``get_size`` counts it.
+    """
+    function = 'OCTET_LENGTH'
+    output_field = models.PositiveIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='LENGTH(CAST(%(expressions)s AS BLOB))', **extra_context)
+
+    def as_oracle(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='LENGTHB', **extra_context)
+
+
+def get_size(text: str) -> int:
+    """
+    Returns the size of stored data in bytes (UTF-8 encoded).
+    """
+    return len(text.encode())
+
+
+def dump_action_data(data: Any, snapshots: dict[str, str] | None = None) -> str:
+    """
+    Returns the action data as stored: JSON (see ``djangocms_history.codecs``)
+    with the plugin list encoded column-wise (see
+    ``djangocms_history.columns``), compressed when that
+    pays off (see ``djangocms_history.compression``). The plugin data is
+    added to ``snapshots``, if given, and referenced by digest.
+    """
+    if isinstance(data, dict) and isinstance(data.get('plugins'), list):
+        data = {**data, 'plugins': columns.encode_plugins(data['plugins'], snapshots)}
+    return compression.compress(codecs.get_codec().encode(data))
+
+
+def get_action_summary(data: Any) -> dict[str, Any]:
+    """
+    Returns the summary columns of an action for its pre or post data
+    ``data``: the id and type of the first plugin, the parent id recorded
+    with it and the number of plugins. Empty if ``data`` holds no plugins.
+
+    The post data is written after the pre data, so the summary reflects the
+    post data unless that holds no plugins.
+    """
+    plugins = data.get('plugins') if isinstance(data, dict) else None
+
+    if not plugins:
+        return {}
+    return {
+        'root_plugin_id': plugins[0]['pk'],
+        'root_plugin_type': plugins[0]['plugin_type'],
+        'parent_id': data.get('parent_id'),
+        'plugin_count': len(plugins),
+    }
+
+
 # TODO: This will likely change into a class based pool integration
 # to allow for custom operations and actions
 
@@ -121,6 +191,47 @@ _action_handlers = {
 }
 
 
+# Number of operations deleted per statement by delete_operations().
+DELETE_BATCH_SIZE = 500
+
+# Default of DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET.
+OPERATION_SIZE_BUDGET = 10 * 1024 * 1024
+
+# The most previous changes the pre data of a plugin change is resolved
+# through (see PlaceholderOperation.get_previous_change()).
+MAX_CHAIN_LENGTH = 10
+
+
+def compress_harder(value: str) -> str:
+    """
+    Recompresses stored action data with lzma, for data over the budget.
+    """
+    compressed = compression.compress(compression.decompress(value), method='lzma')
+    return min(value, compressed, key=len)
+
+
+def get_operation_size(
+    operation_actions: Iterable[PlaceholderAction],
+    operation_snapshots: dict[str, str],
+) -> int:
+    """
+    Returns the size an operation counts against the size budget: the pre
+    and post data of its actions and the JSON of the snapshots they
+    reference (by digest), in bytes.
+    """
+    return sum(action.get_payload_size() for action in operation_actions) + sum(
+        map(get_size, operation_snapshots.values())
+    )
+
+
+def get_operation_size_budget() -> int | None:
+    """
+    The maximum number of bytes of action data (pre and post) an
+    operation may record. ``0`` or ``None`` disables the limit.
+    """
+    return getattr(settings, 'DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET', OPERATION_SIZE_BUDGET)
+
+
 def archive_or_delete_operations(queryset: QuerySet) -> None:
     """
     Retires the given operations from the undo/redo system.
@@ -135,9 +246,153 @@ def archive_or_delete_operations(queryset: QuerySet) -> None:
     command.
     """
     if getattr(settings, 'DJANGOCMS_HISTORY_ARCHIVE_OPERATIONS', False):
-        queryset.update(is_archived=True)
+        queryset.filter(is_archived=False).update(is_archived=True)
     else:
-        queryset.delete()
+        delete_operations(queryset)
+
+
+def delete_operations(queryset: QuerySet, batch_size: int = DELETE_BATCH_SIZE) -> int:
+    """
+    Deletes the given operations and the rows that cascade from them
+    (actions, outbox entries) and returns the number of deleted operations.
+
+    Unlike ``queryset.delete()``, no model instance is loaded: only the
+    primary keys are fetched, ``batch_size`` at a time, and each batch is
+    removed with one DELETE per table. ``post_operations_delete`` is sent
+    once with the total instead of a ``post_delete`` signal per row.
+    Plugin changes that refer to a deleted change (see
+    ``PlaceholderAction.previous_action``) get their pre data stored first.
+
+    Falls back to the deletion collector if a related model can't be
+    deleted that way (e.g. it has delete signal receivers of its own).
+    """
+    using = router.db_for_write(PlaceholderOperation)
+    related_models = _get_fast_delete_related_models(using)
+
+    if related_models is None:
+        # Unlinks the changes and frees the snapshots too
+        # (see PlaceholderOperationQuerySet).
+        deleted = (
+            PlaceholderOperation
+            .objects
+            .using(using)
+            .filter(pk__in=queryset.values('pk'))
+            .delete()[1]
+            .get(PlaceholderOperation._meta.label, 0)
+        )
+    else:
+        deleted = 0
+        rows = queryset.using(using).order_by('pk').values_list('pk', 'operation_type')
+
+        while True:
+            batch_rows = list(rows[:batch_size])
+            batch = [pk for pk, operation_type in batch_rows]
+
+            if not batch:
+                break
+
+            with transaction.atomic(using=using, savepoint=False):
+                # Only plugin changes are referred to by later changes.
+                if any(row[1] == operations.CHANGE_PLUGIN for row in batch_rows):
+                    _unlink_actions(batch, using)
+
+                digests = _get_snapshot_digests(batch, using)
+
+                for model, field_name in related_models:
+                    (
+                        model
+                        ._base_manager
+                        .using(using)
+                        .filter(**{f'{field_name}__in': batch})
+                        ._raw_delete(using)
+                    )
+                deleted += (
+                    PlaceholderOperation
+                    ._base_manager
+                    .using(using)
+                    .filter(pk__in=batch)
+                    ._raw_delete(using)
+                )
+                snapshots.free(digests, using)
+
+            if len(batch) < batch_size:
+                break
+
+    if deleted:
+        signals.post_operations_delete.send(
+            sender=PlaceholderOperation,
+            count=deleted,
+        )
+    return deleted
+
+
+def _delete_unlinked(
+    operations: QuerySet | list[int],
+    using: str,
+    delete: Callable[[], tuple[int, dict[str, int]]],
+) -> tuple[int, dict[str, int]]:
+    # Deletes the given operations with the deletion collector, resolving
+    # the references to their changes and freeing their snapshots like
+    # delete_operations does.
+    with transaction.atomic(using=using, savepoint=False):
+        _unlink_actions(operations, using)
+        digests = _get_snapshot_digests(operations, using)
+        result = delete()
+        snapshots.free(digests, using)
+    return result
+
+
+def _unlink_actions(operations: QuerySet | list[int], using: str) -> None:
+    # Stores the pre data of the changes that refer to a change of the
+    # given operations and are not deleted with them.
+    manager = PlaceholderAction._base_manager.using(using)
+    linked_action_ids = list(
+        manager
+        .filter(previous_action__operation__in=operations)
+        .exclude(operation__in=operations)
+        .values_list('pk', flat=True)
+    )
+
+    if not linked_action_ids:
+        return
+
+    for action in manager.filter(pk__in=linked_action_ids):
+        action.unlink()
+
+
+def _get_snapshot_digests(operations: QuerySet | list[int], using: str) -> list[str]:
+    return list(
+        PluginSnapshotReference
+        ._base_manager
+        .using(using)
+        .filter(operation__in=operations)
+        .values_list('snapshot', flat=True)
+        .distinct()
+    )
+
+
+def _get_fast_delete_related_models(using: str) -> list[tuple[type[models.Model], str]] | None:
+    if models.signals.pre_delete.has_listeners(PlaceholderOperation) or (
+        models.signals.post_delete.has_listeners(PlaceholderOperation)
+    ):
+        return None
+
+    collector = Collector(using=using)
+    related_models = []
+
+    for relation in PlaceholderOperation._meta.related_objects:
+        if relation.on_delete is models.DO_NOTHING:
+            continue
+
+        related_model = relation.related_model
+
+        if relation.on_delete is not models.CASCADE or relation.many_to_many:
+            return None
+
+        if not collector.can_fast_delete(related_model._base_manager.none()):
+            return None
+        related_models.append((related_model, relation.field.name))
+    return related_models
 
 
 @receiver(user_logged_in, dispatch_uid='archive_old_operations')
@@ -188,14 +443,210 @@ def is_unrecordable_change(operation_type: str, kwargs: dict[str, Any]) -> bool:
     return plugin is not None and plugin_has_m2m(plugin.plugin_type)
 
 
+# The operations that are coalesced with the session's previous operation
+# (see coalesce_operation) and the one action they record.
+COALESCED_OPERATION_ACTIONS = {
+    operations.CHANGE_PLUGIN: actions.CHANGE_PLUGIN,
+    operations.MOVE_PLUGIN: actions.MOVE_PLUGIN,
+}
+
+
+def get_session_head(operation: PlaceholderOperation) -> PlaceholderOperation | None:
+    """
+    Returns the latest operation recorded by the session of ``operation``.
+    """
+    return (
+        PlaceholderOperation
+        .objects
+        .filter(
+            site_id=operation.site_id,
+            user_id=operation.user_id,
+            user_session_key=operation.user_session_key,
+            is_archived=False,
+        )
+        .order_by('-date_created', '-pk')
+        .first()
+    )
+
+
+def get_coalesce_window() -> timedelta | None:
+    seconds = getattr(settings, 'DJANGOCMS_HISTORY_COALESCE_WINDOW', 0)
+    return timedelta(seconds=seconds) if seconds else None
+
+
+def coalesce_operation(operation: PlaceholderOperation) -> PlaceholderOperation | None:
+    """
+    Merges a staged plugin change, or a move within a placeholder, into the
+    session's latest operation if that one made the same kind of change to
+    the same plugin less than ``DJANGOCMS_HISTORY_COALESCE_WINDOW`` seconds
+    ago. The latest operation keeps its pre data and takes the staged post
+    data, so a single undo step reverts all the merged changes.
+
+    Returns the operation the change was merged into, or ``None`` if it has
+    to be recorded as a new operation.
+    """
+    window = get_coalesce_window()
+    action_type = COALESCED_OPERATION_ACTIONS.get(operation.operation_type)
+
+    if window is None or action_type is None:
+        return None
+
+    staged_actions = operation._staged_actions
+
+    if operation._staged_outbox_entries or len(staged_actions) != 1:
+        return None
+
+    staged_action = staged_actions[0]
+
+    if staged_action.action != action_type or not staged_action.post_action_data:
+        return None
+
+    head = get_session_head(operation)
+
+    if (
+        head is None
+        or not head.is_applied
+        or head.operation_type != operation.operation_type
+        or head.origin != operation.origin
+        or head.language != operation.language
+        or head.date_created < timezone.now() - window
+    ):
+        return None
+
+    head_actions = list(head.actions.all())
+
+    if len(head_actions) != 1:
+        return None
+
+    head_action = head_actions[0]
+    plugin_id = staged_action.get_pre_action_data()['plugins'][0].pk
+
+    if (
+        head_action.action != action_type
+        or head_action.placeholder_id != staged_action.placeholder_id
+        or head_action.get_pre_action_data()['plugins'][0].pk != plugin_id
+    ):
+        return None
+
+    if action_type == actions.CHANGE_PLUGIN:
+        # The post data only holds the fields changed by the staged change;
+        # add the ones changed before and compare them all to the pre data.
+        # Both are decoded: their long texts are delta encoded against their
+        # own pre data, and are encoded again against the head's.
+        head_changes = {
+            plugin.pk: plugin.data
+            for plugin in head_action.get_post_action_data()['plugins']
+        }
+        plugins = [plugin._asdict() for plugin in staged_action.get_post_action_data()['plugins']]
+
+        for plugin_data in plugins:
+            plugin_data['data'] = {
+                **(head_changes.get(plugin_data['pk']) or {}),
+                **plugin_data['data'],
+            }
+        plugins = operation_handlers.get_changed_plugin_data(head_action, plugins)
+        is_noop = not any(plugin_data['data'] for plugin_data in plugins)
+        post_action_data = dump_action_data({'plugins': plugins})
+    else:
+        post_action_data = staged_action.post_action_data
+        is_noop = (
+            compression.decompress(head_action.pre_action_data)
+            == compression.decompress(post_action_data)
+        )
+
+    if is_noop:
+        # The merged changes cancel out.
+        archive_or_delete_operations(PlaceholderOperation.objects.filter(pk=head.pk))
+        return head
+
+    head_action.post_action_data = post_action_data
+    # Same plugin; a move may have changed its parent.
+    head_action.parent_id = staged_action.parent_id
+    head_action.plugin_count = staged_action.plugin_count
+    head_action.payload_bytes = head_action.get_payload_size()
+    head_action.save(update_fields=[
+        'post_action_data',
+        'parent_id',
+        'plugin_count',
+        'payload_bytes',
+    ])
+    return head
+
+
+def get_staged_operations(request: HttpRequest) -> dict[str, PlaceholderOperation]:
+    """
+    Returns the operations recorded by the pre operation signal of this
+    request that are waiting for their post operation signal, keyed by the
+    CMS operation token. Nothing is written to the database before the post
+    signal fires, so an operation that fails half-way leaves no trace.
+    """
+    try:
+        return request._djangocms_history_staged_operations
+    except AttributeError:
+        request._djangocms_history_staged_operations = {}
+        return request._djangocms_history_staged_operations
+
+
 def clear_operation_history(request: HttpRequest, site: Site, origin: str) -> None:
+    context = get_history_context(request)
     archive_or_delete_operations(
         PlaceholderOperation.objects.filter(
             site=site,
             origin=origin,
             user=request.user,
-            user_session_key=get_session_key_hash(request.session.session_key),
+            user_session_key=context.user_session_key,
+        )
+    )
+    context.invalidate()
+
+
+def get_foreign_operations(user: AbstractBaseUser, placeholder_ids: set[int]) -> Q:
+    """
+    Operations made by users other than ``user`` on one of the given
+    placeholders (undoing them would clash with a newer change).
+    """
+    return Q(
+        pk__in=(
+            PlaceholderAction
+            .objects
+            .filter(placeholder__in=placeholder_ids)
+            .values('operation')
         )
+    ) & ~ Q(user=user)
+
+
+def retire_oversized_operation_history(operation: PlaceholderOperation, placeholder_ids: set[int]) -> None:
+    """
+    Retires the history an operation too large to be recorded makes
+    unreliable: like after an M2M change, the history of its session and
+    origin, together with the operations of other users on the
+    placeholders it changed.
+    """
+    own_operations = Q(
+        origin=operation.origin,
+        user=operation.user_id,
+        user_session_key=operation.user_session_key,
+    )
+    archive_or_delete_operations(
+        PlaceholderOperation.objects.filter(
+            own_operations | get_foreign_operations(operation.user_id, placeholder_ids),
+            site=operation.site_id,
+        )
+    )
+
+
+def discard_oversized_operation(request: HttpRequest, operation: PlaceholderOperation) -> None:
+    """
+    Drops an operation whose action data is larger than the size budget,
+    which can't be undone (see ``retire_oversized_operation_history``).
+    """
+    placeholder_ids = {action.placeholder_id for action in operation._staged_actions}
+    retire_oversized_operation_history(operation, placeholder_ids)
+    get_history_context(request).invalidate()
+    signals.operation_size_exceeded.send(
+        sender=PlaceholderOperation,
+        operation=operation,
+        size=operation.staged_size,
     )
 
 
@@ -216,8 +667,9 @@ def create_placeholder_operation(sender: Any, **kwargs: Any) -> None:
     if not handler or not cms_history:
         return
 
-    site = Site.objects.get_current(request)
-    origin = get_operation_origin(kwargs['origin'])
+    context = get_history_context(request)
+    site = context.site
+    origin = context.get_origin(kwargs['origin'])
 
     if is_unrecordable_change(operation_type, kwargs):
         # The change cannot be undone; clear the (now unreliable) history.
@@ -227,17 +679,31 @@ def create_placeholder_operation(sender: Any, **kwargs: Any) -> None:
     # kwargs['language'] can be None if the user has not enabled
     # I18N or is not using i18n_patterns
     language = kwargs['language'] or settings.LANGUAGE_CODE
+    user_session_key = context.user_session_key
+
+    if outbox.is_enabled():
+        # Build the snapshots this session still owes before the operation
+        # changes the plugins they describe.
+        outbox.process_entries(
+            OutboxEntry.objects.filter(
+                operation__site=site,
+                operation__user=request.user,
+                operation__user_session_key=user_session_key,
+            )
+        )
 
-    operation = PlaceholderOperation.objects.create(
+    operation = PlaceholderOperation(
         operation_type=operation_type,
         token=kwargs['token'],
         origin=origin,
         language=language,
         user=request.user,
-        user_session_key=get_session_key_hash(request.session.session_key),
+        user_session_key=user_session_key,
         site=site,
     )
+    operation.stage_actions()
     handler(operation, **kwargs)
+    get_staged_operations(request)[operation.token] = operation
 
 
 @receiver(post_placeholder_operation)
@@ -259,47 +725,68 @@ def update_placeholder_operation(sender: Any, **kwargs: Any) -> None:
     if not handler or not cms_history:
         return
 
-    site = Site.objects.get_current(request)
-    origin = get_operation_origin(kwargs['origin'])
+    context = get_history_context(request)
+    site = context.site
+    origin = context.get_origin(kwargs['origin'])
 
     if is_unrecordable_change(operation_type, kwargs):
         # Nothing was recorded in the pre handler; the history was cleared.
         return
 
-    p_operations = PlaceholderOperation.objects.filter(
-        site=site,
-        user=request.user,
-        user_session_key=get_session_key_hash(request.session.session_key)
-    )
+    operation = get_staged_operations(request).pop(kwargs['token'], None)
 
-    operation = p_operations.get(token=kwargs['token'])
+    if operation is None:
+        # The pre handler did not record anything for this operation.
+        return
 
-    # Run the placeholder operation handler
-    handler(operation, **kwargs)
+    if not operation.is_over_size_budget:
+        # Run the placeholder operation handler
+        handler(operation, **kwargs)
+
+    if operation.is_over_size_budget:
+        discard_oversized_operation(request, operation)
+        return
+
+    if operation.is_staged_noop():
+        # The plugin was saved without changes; don't record an undo step
+        # that does nothing (nor discard the redo steps).
+        return
+
+    if coalesce_operation(operation) is not None:
+        # Merged into the previous operation, which is still the latest
+        # one; there is nothing new to retire.
+        context.invalidate()
+        return
 
-    # Mark the new operation as applied
-    p_operations.filter(pk=operation.pk).update(is_applied=True)
+    placeholder_ids = {action.placeholder_id for action in operation._staged_actions}
 
-    # Retire any operation from this user's session made on a separate origin
-    # or made on the current origin but not applied.
+    # Write the new (applied) operation together with all of its actions
+    operation.is_applied = True
+    operation.save_staged()
+
+    # Retire, in one go, any operation from this user's session made on a
+    # separate origin or made on the current origin but not applied, and
+    # any operation made by another user on one of the placeholders this
+    # operation changed (undoing it would clash with this operation).
+    own_operations = Q(
+        user=request.user,
+        user_session_key=operation.user_session_key,
+    ) & (~ Q(origin=origin) | Q(is_applied=False))
     archive_or_delete_operations(
-        p_operations.filter(
-            ~ Q(origin=origin)
-            | Q(origin=origin, is_applied=False)
+        PlaceholderOperation.objects.filter(
+            own_operations | get_foreign_operations(request.user, placeholder_ids),
+            site=site,
         )
     )
+    context.record(operation)
 
-    # Last, retire any operation made by another user on the current origin.
-    # TODO: This will need to change to allow for concurrent editing
-    # Its actually better to get the affected placeholders
-    # and archive any operations that contains those
-    foreign_operations = (
-        PlaceholderOperation
-        .objects
-        .filter(origin=origin, site=site)
-        .exclude(user=request.user)
-     )
-    archive_or_delete_operations(foreign_operations)
+
+class PlaceholderOperationQuerySet(QuerySet):
+
+    def delete(self) -> tuple[int, dict[str, int]]:
+        # Plugin changes of other operations may refer to the deleted ones
+        # (see PlaceholderAction.previous_action).
+        return _delete_unlinked(self.values('pk'), self.db, super().delete)
 
 
 class PlaceholderOperation(models.Model):
@@ -335,6 +822,8 @@ class PlaceholderOperation(models.Model):
     is_archived = models.BooleanField(default=False)
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
 
+    objects = PlaceholderOperationQuerySet.as_manager()
+
     class Meta:
         get_latest_by = "date_created"
         ordering = ['-date_created']
@@ -345,6 +834,71 @@ class PlaceholderOperation(models.Model):
             ),
         ]
 
+    #: Actions created while the operation is staged (see ``stage_actions``).
+    #: ``None`` when actions are written to the database right away.
+    _staged_actions = None
+
+    _staged_outbox_entries = None
+
+    #: JSON of the plugin snapshots referenced by the staged actions, by
+    #: digest (see ``djangocms_history.snapshots``).
+    _staged_snapshots = None
+
+    #: Set once the staged action data outgrows the size budget (see
+    #: ``get_operation_size_budget``); the data is then no longer kept.
+    is_over_size_budget = False
+
+    #: Size of the staged action data when it outgrew the budget.
+    staged_size = 0
+
+    def delete(self, using: str | None = None, keep_parents: bool = False) -> tuple[int, dict[str, int]]:
+        using = using or router.db_for_write(PlaceholderOperation, instance=self)
+        delete = functools.partial(super().delete, using, keep_parents)
+        return _delete_unlinked([self.pk], using, delete)
+
+    def stage_actions(self) -> None:
+        """
+        Keeps the actions created from now on in memory instead of writing
+        them one by one. ``save_staged`` writes the operation and all of its
+        actions at once.
+        """
+        self._staged_actions = []
+        self._staged_outbox_entries = []
+        self._staged_snapshots = {}
+
+    def save_staged(self) -> None:
+        staged_actions = self._staged_actions
+        staged_outbox_entries = self._staged_outbox_entries
+        staged_snapshots = self._staged_snapshots
+        self._staged_actions = None
+        self._staged_outbox_entries = None
+        self._staged_snapshots = None
+
+        for action in staged_actions:
+            action.payload_bytes = action.get_payload_size()
+
+        with transaction.atomic(savepoint=False):
+            self.save()
+            PlaceholderAction.objects.bulk_create(staged_actions)
+            snapshots.save(self.pk, staged_snapshots)
+
+            if staged_outbox_entries:
+                OutboxEntry.objects.bulk_create(staged_outbox_entries)
+                transaction.on_commit(functools.partial(outbox.dispatch, self.pk))
+
+    def is_staged_noop(self) -> bool:
+        """
+        Whether the staged operation is a plugin change that didn't change
+        anything, i.e. its post data holds no changed field.
+        """
+        if self.operation_type != operations.CHANGE_PLUGIN or not self._staged_actions:
+            return False
+        return all(
+            action.post_action_data
+            and not any(plugin.data for plugin in action.get_post_action_data()['plugins'])
+            for action in self._staged_actions
+        )
+
     def create_action(
         self,
         action: str,
@@ -352,30 +906,228 @@ class PlaceholderOperation(models.Model):
         placeholder: Placeholder,
         **kwargs: Any,
     ) -> None:
-        pre_data = kwargs.pop('pre_data', '')
-
-        if pre_data:
-            pre_data = dump_json(pre_data)
-
-        post_data = kwargs.pop('post_data', '')
-
-        if post_data:
-            post_data = dump_json(post_data)
-
-        self.actions.create(
+        if self._staged_snapshots is None:
+            action_snapshots = {}
+        else:
+            action_snapshots = self._staged_snapshots
+
+        pre_data = kwargs.pop('pre_data', None)
+        post_data = kwargs.pop('post_data', None)
+        summary = get_action_summary(post_data) or get_action_summary(pre_data) or {'plugin_count': 0}
+
+        if pre_data is None:
+            pre_data = ''
+        else:
+            pre_data = self._dump_action_data(action, 'pre_action_data', pre_data, action_snapshots)
+
+        if post_data is None:
+            post_data = ''
+        else:
+            post_data = self._dump_action_data(action, 'post_action_data', post_data, action_snapshots)
+
+        operation_action = PlaceholderAction(
+            operation=self,
             action=action,
             pre_action_data=pre_data,
             post_action_data=post_data,
             language=language,
             placeholder=placeholder,
+            **summary,
             **kwargs
         )
 
+        operation_action._snapshots = action_snapshots
+
+        if self._staged_actions is None:
+            operation_action.payload_bytes = operation_action.get_payload_size()
+            operation_action.save()
+            snapshots.save(self.pk, action_snapshots)
+        else:
+            self._staged_actions.append(operation_action)
+            self._check_size_budget()
+
+    def _dump_action_data(
+        self,
+        action: str,
+        field_name: str,
+        data: Any,
+        action_snapshots: dict[str, str],
+    ) -> str:
+        # The post data of plugin changes only holds the changed fields,
+        # which are kept in the action data.
+        if snapshots.is_enabled() and (
+            action != actions.CHANGE_PLUGIN or field_name == 'pre_action_data'
+        ):
+            return dump_action_data(data, action_snapshots)
+        return dump_action_data(data)
+
+    def get_previous_change(self, plugin_data: dict[str, Any]) -> PlaceholderAction | None:
+        """
+        Returns the action of the session's latest operation if that
+        operation changed the plugin of ``plugin_data`` (the plugin as it is
+        before this operation) and left it as it still is, so that the action
+        can stand in for the pre data of this change.
+        """
+        head = get_session_head(self)
+
+        if (
+            head is None
+            or not head.is_applied
+            or head.operation_type != operations.CHANGE_PLUGIN
+            or head.origin != self.origin
+        ):
+            return None
+
+        # The plugin and the length of the chain are read from the summary
+        # columns; the action data is only read if they match.
+        head_actions = list(
+            head
+            .actions
+            .values_list('pk', 'action', 'root_plugin_id', 'plugin_count', 'depth')[:2]
+        )
+
+        if len(head_actions) != 1:
+            return None
+
+        pk, action, root_plugin_id, plugin_count, depth = head_actions[0]
+
+        if (
+            action != actions.CHANGE_PLUGIN
+            or root_plugin_id != plugin_data['pk']
+            or plugin_count != 1
+            or depth >= MAX_CHAIN_LENGTH
+        ):
+            return None
+
+        head_action = head.actions.get(pk=pk)
+
+        if not head_action.post_action_data:
+            return None
+
+        plugins = head_action.get_state_after()['plugins']
+        codec = codecs.get_codec()
+        plugin_data = codec.decode(codec.encode(plugin_data))
+
+        if len(plugins) != 1 or plugins[0]._asdict() != plugin_data:
+            return None
+        return head_action
+
+    def get_action(self, action: str) -> PlaceholderAction:
+        if self._staged_actions is None:
+            return self.actions.get(action=action)
+        return next(
+            staged_action for staged_action in self._staged_actions
+            if staged_action.action == action
+        )
+
+    def _set_action_data(self, action: str, **data: Any) -> None:
+        if self._staged_snapshots is None:
+            action_snapshots = {}
+        else:
+            action_snapshots = self._staged_snapshots
+
+        summary = {}
+
+        for value in data.values():
+            summary.update(get_action_summary(value))
+
+        data = {
+            field_name: self._dump_action_data(action, field_name, value, action_snapshots)
+            for field_name, value in data.items()
+        }
+
+        if self._staged_actions is None:
+            pre_size, post_size = (
+                Value(get_size(data[field_name])) if field_name in data else ByteLength(field_name)
+                for field_name in ('pre_action_data', 'post_action_data')
+            )
+            self.actions.filter(action=action).update(
+                payload_bytes=pre_size + post_size,
+                **data,
+                **summary,
+            )
+            snapshots.save(self.pk, action_snapshots)
+            return
+
+        for staged_action in self._staged_actions:
+            if staged_action.action == action:
+                for field_name, value in {**data, **summary}.items():
+                    setattr(staged_action, field_name, value)
+        self._check_size_budget()
+
+    def _check_size_budget(self) -> None:
+        budget = get_operation_size_budget()
+
+        if not budget:
+            return
+
+        if not self.is_over_size_budget:
+            size = self._get_staged_size()
+
+            if size > budget and compression.get_method():
+                # Try harder before giving up on the operation.
+                for action in self._staged_actions:
+                    action.pre_action_data = compress_harder(action.pre_action_data)
+                    action.post_action_data = compress_harder(action.post_action_data)
+                size = self._get_staged_size()
+
+            if size <= budget:
+                return
+
+            self.is_over_size_budget = True
+            self.staged_size = size
+
+        # The operation won't be recorded; don't hold on to its data.
+        for action in self._staged_actions:
+            action.pre_action_data = ''
+            action.post_action_data = ''
+        self._staged_snapshots.clear()
+
+    def _get_staged_size(self) -> int:
+        return get_operation_size(self._staged_actions, self._staged_snapshots)
+
     def set_pre_action_data(self, action: str, data: dict[str, Any]) -> None:
-        self.actions.filter(action=action).update(pre_action_data=dump_json(data))
+        self._set_action_data(action, pre_action_data=data)
 
     def set_post_action_data(self, action: str, data: dict[str, Any]) -> None:
-        self.actions.filter(action=action).update(post_action_data=dump_json(data))
+        self._set_action_data(action, post_action_data=data)
+
+    def defer_post_action_data(
+        self,
+        action: str,
+        plugin_ids: list[int],
+        subtree: bool = False,
+        **data: Any,
+    ) -> None:
+        """
+        Records the plugins whose data becomes the action's post data once
+        the outbox entry is processed (see ``djangocms_history.outbox``).
+        ``data`` holds the rest of the post data, known right away.
+        """
+        entry = OutboxEntry(
+            operation=self,
+            action=action,
+            payload=dump_json({
+                'data': data,
+                'plugin_ids': plugin_ids,
+                'subtree': subtree,
+            }),
+        )
+
+        if self._staged_outbox_entries is None:
+            entry.save()
+            transaction.on_commit(functools.partial(outbox.dispatch, self.pk))
+        else:
+            self._staged_outbox_entries.append(entry)
+
+    def complete_deferred(self) -> None:
+        """
+        Builds any post data of this operation still waiting in the outbox.
+        """
+        if outbox.process_entries(self.outbox_entries.all()):
+            # The actions were read before their data was complete.
+            self.__dict__.pop('cached_actions', None)
+            self.__dict__.pop('_prefetched_actions', None)
 
     @cached_property
     def cached_actions(self):
@@ -446,35 +1198,52 @@ class PlaceholderOperation(models.Model):
 
         operation_action = self.cached_actions[0]
 
-        for data in (
-            operation_action.get_post_action_data(),
-            operation_action.get_pre_action_data(),
-        ):
-            if data and data.get('plugins'):
-                archived = data['plugins'][0]
-                return action, archived.pk, archived.plugin_type, data.get('parent_id')
-        return None
+        if operation_action.plugin_count is None:
+            # Recorded before the action data was summarized
+            for data in (
+                operation_action.get_post_action_data(),
+                operation_action.get_pre_action_data(),
+            ):
+                if data and data.get('plugins'):
+                    archived = data['plugins'][0]
+                    return action, archived.pk, archived.plugin_type, data.get('parent_id')
+            return None
+
+        if not operation_action.plugin_count:
+            return None
+        return (
+            action,
+            operation_action.root_plugin_id,
+            operation_action.root_plugin_type,
+            operation_action.parent_id,
+        )
 
     def get_move_plugin_id(self) -> int | None:
         """
         For a move operation, returns the id of the moved plugin (read from
-        the stored action data, which records it for both same-placeholder
-        and cross-placeholder moves). Returns ``None`` for other operations.
+        the action summary, which records it for both same-placeholder and
+        cross-placeholder moves). Returns ``None`` for other operations.
         """
         if self.operation_type != operations.MOVE_PLUGIN:
             return None
 
         for operation_action in self.cached_actions:
-            for data in (
-                operation_action.get_pre_action_data(),
-                operation_action.get_post_action_data(),
-            ):
-                if data and data.get('plugins'):
-                    return data['plugins'][0].pk
+            if operation_action.plugin_count:
+                return operation_action.root_plugin_id
+
+            if operation_action.plugin_count is None:
+                # Recorded before the action data was summarized
+                for data in (
+                    operation_action.get_pre_action_data(),
+                    operation_action.get_post_action_data(),
+                ):
+                    if data and data.get('plugins'):
+                        return data['plugins'][0].pk
         return None
 
     @transaction.atomic
     def undo(self) -> None:
+        self.complete_deferred()
         actions = self.cached_actions
 
         for action in actions:
@@ -490,6 +1259,7 @@ class PlaceholderOperation(models.Model):
 
     @transaction.atomic
     def redo(self) -> None:
+        self.complete_deferred()
         actions = list(reversed(self.cached_actions))
 
         for action in actions:
@@ -503,6 +1273,15 @@ class PlaceholderOperation(models.Model):
         )
 
 
+class MissingPreviousChangeError(LookupError):
+    """
+    Raised when a plugin change refers to a previous change that was
+    deleted without resolving the reference first (e.g. with raw SQL
+    instead of ``delete_operations`` or ``delete()``); the change cannot
+    be replayed.
+    """
+
+
 class PlaceholderAction(models.Model):
     ACTION_CHOICES = (
         (actions.ADD_PLUGIN, 'Add plugin'),
@@ -526,17 +1305,76 @@ class PlaceholderAction(models.Model):
     language = models.CharField(max_length=15, choices=settings.LANGUAGES)
     operation = models.ForeignKey(to=PlaceholderOperation, related_name='actions', on_delete=models.CASCADE)
     order = models.PositiveIntegerField(default=1)
+    # A plugin change whose plugin was left as is by the session's previous
+    # change refers to that change instead of storing its pre data (see
+    # ``PlaceholderOperation.get_previous_change``). The reference is
+    # resolved, and the pre data stored, before the previous change is
+    # deleted by ``delete_operations`` or ``delete()`` (see
+    # ``PlaceholderOperationQuerySet``). Deletes that bypass them (raw SQL,
+    # ``_base_manager``) leave the reference dangling; the change then
+    # raises ``MissingPreviousChangeError``. Deleting a user deletes the
+    # changes of a chain together, as they are all of the user's session.
+    previous_action = models.ForeignKey(
+        to='self',
+        related_name='+',
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    # The number of previous changes the pre data is resolved through. It
+    # is not lowered when an earlier change of the chain is unlinked, so it
+    # is at most that.
+    depth = models.PositiveSmallIntegerField(default=0)
+    # Summary of the action data, filled when the data is written so that
+    # the undo/redo responses don't have to parse it (see
+    # ``get_action_summary``). ``plugin_count`` is ``None`` for actions
+    # recorded before these columns were added.
+    root_plugin_id = models.IntegerField(null=True, blank=True)
+    root_plugin_type = models.CharField(max_length=50, blank=True)
+    parent_id = models.IntegerField(null=True, blank=True)
+    plugin_count = models.PositiveIntegerField(null=True, blank=True)
+    payload_bytes = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ['order']
         unique_together = ('operation', 'order')
+        indexes = [
+            models.Index(
+                fields=['placeholder', 'operation'],
+                name='history_action_placeholder_idx',
+            ),
+        ]
+
+    #: JSON of plugin snapshots not stored yet, by digest (see
+    #: ``PlaceholderOperation.stage_actions``).
+    _snapshots = None
 
     def _object_version_data_hook(self, data: Any) -> Any:
         if isinstance(data, dict) and 'pk' in data and 'plugin_type' in data and 'position' in data:
-            return ArchivedPlugin(**data)
+            return ArchivedPlugin(**{
+                **data,
+                'plugin_type': intern(data['plugin_type']),
+                'data': intern_data(data['data']),
+            })
         return data
 
-    def _get_parsed_data(self, raw_data: str) -> Any:
+    def _get_parsed_data(self, raw_data: str, stream: bool = False) -> Any:
+        raw_data = compression.decompress(raw_data)
+        data = codecs.get_codec().decode(raw_data)
+
+        if not isinstance(data, dict) or 'plugins' not in data:
+            return data
+
+        if columns.is_columns(data['plugins']) and stream:
+            data['plugins'] = columns.PluginStream(data['plugins'], self._snapshots)
+            return data
+
+        if columns.is_columns(data['plugins']):
+            data['plugins'] = columns.decode_plugins(data['plugins'], self._snapshots)
+            return data
+
+        # Written by earlier versions, with one object per plugin
         data = json.loads(
             raw_data,
             object_hook=self._object_version_data_hook,
@@ -549,13 +1387,87 @@ class PlaceholderAction(models.Model):
     def get_post_action_data(self) -> Any:
         return self._parsed_post_action_data
 
+    def stream_pre_action_data(self) -> Any:
+        """
+        Returns the pre data with the plugins as a ``columns.PluginStream``,
+        which decodes them as they are restored, unless they are parsed
+        already (or were recorded by an earlier version).
+        """
+        if '_parsed_pre_action_data' in self.__dict__ or self.previous_action_id:
+            return self.get_pre_action_data()
+        return self._get_parsed_data(self.pre_action_data, stream=True)
+
+    def stream_post_action_data(self) -> Any:
+        """
+        Returns the post data like ``stream_pre_action_data``.
+        """
+        if '_parsed_post_action_data' in self.__dict__ or self.action == actions.CHANGE_PLUGIN:
+            return self.get_post_action_data()
+        return self._get_parsed_data(self.post_action_data, stream=True)
+
     @cached_property
     def _parsed_pre_action_data(self) -> Any:
+        if self.previous_action_id:
+            try:
+                previous_action = self.previous_action
+            except PlaceholderAction.DoesNotExist:
+                raise MissingPreviousChangeError(
+                    'Previous change {} is no longer stored'.format(self.previous_action_id)
+                ) from None
+            return previous_action.get_state_after()
         return self._get_parsed_data(self.pre_action_data)
 
+    def get_state_after(self) -> dict[str, Any]:
+        """
+        Returns the data of the plugins changed by this (plugin change)
+        action as they were after the change.
+        """
+        changes = {
+            plugin.pk: plugin.data
+            for plugin in self.get_post_action_data()['plugins']
+        }
+        return {
+            'plugins': [
+                plugin._replace(data={**(plugin.data or {}), **(changes.get(plugin.pk) or {})})
+                for plugin in self.get_pre_action_data()['plugins']
+            ],
+        }
+
+    def get_payload_size(self) -> int:
+        return get_size(self.pre_action_data) + get_size(self.post_action_data)
+
+    def unlink(self) -> None:
+        """
+        Stores the pre data of an action that refers to a previous change,
+        so that the previous change can be deleted.
+        """
+        data = self.get_pre_action_data()
+        data = {**data, 'plugins': [plugin._asdict() for plugin in data['plugins']]}
+        action_snapshots = {} if snapshots.is_enabled() else None
+
+        self.pre_action_data = dump_action_data(data, action_snapshots)
+        self.previous_action = None
+        self.depth = 0
+        self.payload_bytes = self.get_payload_size()
+        self.save(update_fields=['pre_action_data', 'previous_action', 'depth', 'payload_bytes'])
+        snapshots.save(self.operation_id, action_snapshots)
+
     @cached_property
     def _parsed_post_action_data(self) -> Any:
-        return self._get_parsed_data(self.post_action_data)
+        data = self._get_parsed_data(self.post_action_data)
+
+        if self.action == actions.CHANGE_PLUGIN and data:
+            # Long texts may be delta encoded against the pre data.
+            previous_data = {
+                plugin.pk: plugin.data or {}
+                for plugin in self.get_pre_action_data()['plugins']
+            }
+            data['plugins'] = [
+                plugin._replace(data=delta.decode_fields(plugin.data, previous_data.get(plugin.pk, {})))
+                if plugin.data else plugin
+                for plugin in data['plugins']
+            ]
+        return data
 
     @transaction.atomic
     def undo(self) -> None:
@@ -564,3 +1476,150 @@ class PlaceholderAction(models.Model):
     @transaction.atomic
     def redo(self) -> None:
         _action_handlers[self.action]['redo'](self)
+
+
+class OutboxEntry(models.Model):
+    """
+    Post data of an action that is built outside of the request that
+    recorded the operation (see ``djangocms_history.outbox``).
+    """
+    operation = models.ForeignKey(
+        to=PlaceholderOperation,
+        related_name='outbox_entries',
+        on_delete=models.CASCADE,
+    )
+    action = models.CharField(max_length=30, choices=PlaceholderAction.ACTION_CHOICES)
+    payload = models.TextField()
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['pk']
+
+    def process(self) -> None:
+        payload = json.loads(self.payload)
+        data = payload['data']
+        data['plugins'] = operation_handlers.get_deferred_plugin_data(
+            plugin_ids=payload['plugin_ids'],
+            subtree=payload['subtree'],
+        )
+        operation_actions = PlaceholderAction.objects.filter(
+            operation_id=self.operation_id,
+            action=self.action,
+        )
+
+        if self.action == actions.CHANGE_PLUGIN:
+            data['plugins'] = operation_handlers.get_changed_plugin_data(
+                operation_actions.get(),
+                plugins=data['plugins'],
+            )
+        if self.action == actions.CHANGE_PLUGIN or not snapshots.is_enabled():
+            action_snapshots = None
+        else:
+            action_snapshots = {}
+
+        post_action_data = dump_action_data(data, action_snapshots)
+        budget = get_operation_size_budget()
+
+        if budget:
+            # Counted like the staged actions of an operation recorded in the
+            # request (see PlaceholderOperation._check_size_budget).
+            recorded_actions = list(
+                PlaceholderAction
+                .objects
+                .filter(operation_id=self.operation_id)
+                .only('pk', 'action', 'pre_action_data', 'post_action_data')
+            )
+
+            for recorded_action in recorded_actions:
+                if recorded_action.action == self.action:
+                    recorded_action.post_action_data = post_action_data
+
+            operation_snapshots = {
+                **snapshots.fetch(
+                    PluginSnapshotReference
+                    .objects
+                    .filter(operation_id=self.operation_id)
+                    .values_list('snapshot', flat=True)
+                ),
+                **(action_snapshots or {}),
+            }
+            size = get_operation_size(recorded_actions, operation_snapshots)
+
+            if size > budget and compression.get_method():
+                # Try harder before giving up on the operation.
+                for recorded_action in recorded_actions:
+                    recorded_action.pre_action_data = compress_harder(recorded_action.pre_action_data)
+                    recorded_action.post_action_data = compress_harder(recorded_action.post_action_data)
+                size = get_operation_size(recorded_actions, operation_snapshots)
+
+                if size <= budget:
+                    for recorded_action in recorded_actions:
+                        recorded_action.payload_bytes = recorded_action.get_payload_size()
+
+                        if recorded_action.action == self.action:
+                            post_action_data = recorded_action.post_action_data
+                    PlaceholderAction.objects.bulk_update(
+                        recorded_actions,
+                        ['pre_action_data', 'post_action_data', 'payload_bytes'],
+                    )
+
+            if size > budget:
+                self.discard_operation(size)
+                return
+        operation_actions.update(
+            post_action_data=post_action_data,
+            payload_bytes=ByteLength('pre_action_data') + get_size(post_action_data),
+            **get_action_summary(data),
+        )
+        snapshots.save(self.operation_id, action_snapshots)
+        OutboxEntry.objects.filter(pk=self.pk).delete()
+
+    def discard_operation(self, size: int) -> None:
+        """
+        Drops the operation, too large to be recorded, like
+        ``discard_oversized_operation`` does.
+        """
+        operation = self.operation
+        placeholder_ids = set(operation.actions.values_list('placeholder_id', flat=True))
+        retire_oversized_operation_history(operation, placeholder_ids)
+        OutboxEntry.objects.filter(operation=operation).delete()
+        signals.operation_size_exceeded.send(
+            sender=PlaceholderOperation,
+            operation=operation,
+            size=size,
+        )
+
+
+class CompressionDictionary(models.Model):
+    """
+    A preset dictionary action data was compressed with, kept to read the
+    data after the installed plugins changed (see
+    ``djangocms_history.compression``).
+    """
+    dictionary_id = models.CharField(max_length=8, primary_key=True)
+    data = models.BinaryField()
+
+
+class PluginSnapshot(models.Model):
+    """
+    Field data of a plugin, stored once for all the operations that
+    recorded it (see ``djangocms_history.snapshots``).
+    """
+    digest = models.CharField(max_length=32, primary_key=True)
+    data = models.TextField()
+
+
+class PluginSnapshotReference(models.Model):
+    operation = models.ForeignKey(
+        to=PlaceholderOperation,
+        related_name='snapshot_references',
+        on_delete=models.CASCADE,
+    )
+    snapshot = models.ForeignKey(
+        to=PluginSnapshot,
+        related_name='references',
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        unique_together = ('operation', 'snapshot')
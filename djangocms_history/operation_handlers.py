@@ -3,13 +3,12 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, Any, Callable
 
 from cms.models import CMSPlugin
-from cms.utils.plugins import get_bound_plugins
 
-from . import actions
-from .helpers import get_plugin_data
+from . import actions, delta, outbox
+from .helpers import get_changed_fields, get_plugin_data, get_plugins_data
 
 if TYPE_CHECKING:
-    from .models import PlaceholderOperation
+    from .models import PlaceholderAction, PlaceholderOperation
 
 # A note on the kwargs sent by the django CMS operation signals (4.1 / 5.x):
 #
@@ -56,18 +55,49 @@ def _with_callback(func: Callable) -> Callable:
     return wrapped
 
 
-def _get_subtree_data(plugin: CMSPlugin, only_meta: bool = False) -> list[dict[str, Any]]:
+def _get_subtree_data(plugin: CMSPlugin) -> list[dict[str, Any]]:
     # Returns plugin data for the given (bound) plugin and all of its
     # descendants, ordered by position (parents before children).
     descendants = plugin.get_descendants().order_by('position')
-    plugin_data = [get_plugin_data(plugin=plugin, only_meta=only_meta)]
-    plugin_data.extend(
-        get_plugin_data(plugin=descendant, only_meta=only_meta)
-        for descendant in get_bound_plugins(descendants)
-    )
+    plugin_data = [get_plugin_data(plugin=plugin)]
+    plugin_data.extend(get_plugins_data(list(descendants)))
     return plugin_data
 
 
+def get_deferred_plugin_data(plugin_ids: list[int], subtree: bool = False) -> list[dict[str, Any]]:
+    # Builds the plugin data recorded by a deferred post handler (see
+    # ``djangocms_history.outbox``): the data of the given plugins or, with
+    # ``subtree``, of the first plugin and all of its descendants.
+    plugins = CMSPlugin.objects.filter(pk__in=plugin_ids).order_by('position')
+
+    if subtree:
+        root = plugins.first()
+        return _get_subtree_data(root.get_bound_plugin()) if root else []
+    return get_plugins_data(list(plugins))
+
+
+def get_changed_plugin_data(
+    operation_action: PlaceholderAction,
+    plugins: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+    # Reduces the data of changed plugins to the fields that differ from the
+    # action's pre data, with long texts delta encoded against it. The pre
+    # data is the full snapshot; undo restores the fields present in the
+    # post data.
+    previous_data = {
+        plugin.pk: plugin.data or {}
+        for plugin in operation_action.get_pre_action_data()['plugins']
+    }
+
+    for plugin_data in plugins:
+        previous_plugin_data = previous_data.get(plugin_data['pk'], {})
+        plugin_data['data'] = delta.encode_fields(
+            get_changed_fields(plugin_data['data'], previous_plugin_data),
+            previous_plugin_data,
+        )
+    return plugins
+
+
 @_with_callback
 def pre_add_plugin(operation: PlaceholderOperation, **kwargs: Any) -> None:
     # Stores the ID of the parent plugin where the new plugin
@@ -90,6 +120,15 @@ def post_add_plugin(operation: PlaceholderOperation, **kwargs: Any) -> None:
     # was created and the plugin data for the new created plugin
     # (including its position in the placeholder).
     plugin = kwargs['plugin']
+
+    if outbox.is_enabled():
+        operation.defer_post_action_data(
+            action=actions.ADD_PLUGIN,
+            plugin_ids=[plugin.pk],
+            parent_id=plugin.parent_id,
+        )
+        return
+
     action_data = {
         'parent_id': plugin.parent_id,
         'plugins': [get_plugin_data(plugin=plugin)],
@@ -101,28 +140,50 @@ def post_add_plugin(operation: PlaceholderOperation, **kwargs: Any) -> None:
 @_with_callback
 def pre_change_plugin(operation: PlaceholderOperation, **kwargs: Any) -> None:
     # Stores
-    #   * the plugin data before any updates
+    #   * the plugin data before any updates, or a reference to the
+    #     session's previous change if that left the plugin as it is
 
     plugin = kwargs['old_plugin']
-    action_data = {'plugins': [get_plugin_data(plugin=plugin)]}
+    plugin_data = get_plugin_data(plugin=plugin)
+    previous_action = operation.get_previous_change(plugin_data)
+
+    if previous_action is not None:
+        operation.create_action(
+            action=actions.CHANGE_PLUGIN,
+            language=plugin.language,
+            placeholder=kwargs['placeholder'],
+            previous_action=previous_action,
+            depth=previous_action.depth + 1,
+        )
+        return
 
     operation.create_action(
         action=actions.CHANGE_PLUGIN,
         language=plugin.language,
         placeholder=kwargs['placeholder'],
-        pre_data=action_data,
+        pre_data={'plugins': [plugin_data]},
     )
 
 
 @_with_callback
 def post_change_plugin(operation: PlaceholderOperation, **kwargs: Any) -> None:
     # Stores
-    #   * the plugin data with updates already applied
+    #   * the plugin fields changed by the update, with the new values
 
     plugin = kwargs['new_plugin']
-    action_data = {
-        'plugins': [get_plugin_data(plugin=plugin)]
-    }
+
+    if outbox.is_enabled():
+        operation.defer_post_action_data(
+            action=actions.CHANGE_PLUGIN,
+            plugin_ids=[plugin.pk],
+        )
+        return
+
+    plugins = get_changed_plugin_data(
+        operation.get_action(actions.CHANGE_PLUGIN),
+        plugins=[get_plugin_data(plugin=plugin)],
+    )
+    action_data = {'plugins': plugins}
 
     operation.set_post_action_data(
         action=actions.CHANGE_PLUGIN,
@@ -232,7 +293,7 @@ def post_move_plugin(operation: PlaceholderOperation, **kwargs: Any) -> None:
     # parent is read back from the data captured by the pre handler.
 
     if move_in:
-        move_out_action = operation.actions.get(action=actions.MOVE_OUT_PLUGIN)
+        move_out_action = operation.get_action(actions.MOVE_OUT_PLUGIN)
         source_parent_id = move_out_action.get_pre_action_data()['parent_id']
         action_data = {'parent_id': source_parent_id}
         operation.set_post_action_data(action=actions.MOVE_OUT_PLUGIN, data=action_data)
@@ -258,6 +319,16 @@ def post_paste_plugin(operation: PlaceholderOperation, **kwargs: Any) -> None:
     #   * plugin data for the pasted plugin and all its descendants
 
     plugin = kwargs['plugin']
+
+    if outbox.is_enabled():
+        operation.defer_post_action_data(
+            action=actions.PASTE_PLUGIN,
+            plugin_ids=[plugin.pk],
+            subtree=True,
+            parent_id=kwargs['target_parent_id'],
+        )
+        return
+
     action_data = {
         'parent_id': kwargs['target_parent_id'],
         'plugins': _get_subtree_data(plugin),
@@ -279,11 +350,15 @@ def post_paste_placeholder(operation: PlaceholderOperation, **kwargs: Any) -> No
     # Stores
     #   * plugin data for the pasted plugins
 
+    if outbox.is_enabled():
+        operation.defer_post_action_data(
+            action=actions.PASTE_PLACEHOLDER,
+            plugin_ids=[plugin.pk for plugin in kwargs['plugins']],
+        )
+        return
+
     plugins = sorted(kwargs['plugins'], key=lambda plugin: plugin.position)
-    plugin_data = [
-        get_plugin_data(plugin=plugin)
-        for plugin in get_bound_plugins(plugins)
-    ]
+    plugin_data = get_plugins_data(plugins)
     action_data = {'plugins': plugin_data}
     operation.set_post_action_data(action=actions.PASTE_PLACEHOLDER, data=action_data)
 
@@ -361,11 +436,15 @@ def post_add_plugins_from_placeholder(operation: PlaceholderOperation, **kwargs:
     # Stores
     #   * plugin data for the new plugins
 
+    if outbox.is_enabled():
+        operation.defer_post_action_data(
+            action=actions.ADD_PLUGINS_FROM_PLACEHOLDER,
+            plugin_ids=[plugin.pk for plugin in kwargs['plugins']],
+        )
+        return
+
     plugins = sorted(kwargs['plugins'], key=lambda plugin: plugin.position)
-    plugin_data = [
-        get_plugin_data(plugin=plugin)
-        for plugin in get_bound_plugins(plugins)
-    ]
+    plugin_data = get_plugins_data(plugins)
     action_data = {'plugins': plugin_data}
 
     operation.set_post_action_data(
@@ -379,10 +458,7 @@ def pre_clear_placeholder(operation: PlaceholderOperation, **kwargs: Any) -> Non
     #   * plugin data for all the plugins being deleted
 
     plugins = sorted(kwargs['plugins'], key=lambda plugin: plugin.position)
-    plugin_data = [
-        get_plugin_data(plugin=plugin)
-        for plugin in get_bound_plugins(plugins)
-    ]
+    plugin_data = get_plugins_data(plugins)
     action_data = {'plugins': plugin_data}
 
     operation.create_action(
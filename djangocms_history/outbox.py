@@ -0,0 +1,107 @@
+"""
+Deferred recording of post operation snapshots.
+
+With ``DJANGOCMS_HISTORY_DEFERRED_SNAPSHOTS = True`` the post operation
+handlers no longer serialize the plugins an operation created or changed
+inside the editor's request. They only record the plugin ids in an outbox
+entry, written in the same transaction as the operation. The snapshots are
+built later, either by the ``process_history_outbox`` management command or
+by an in-process thread pool (``DJANGOCMS_HISTORY_DEFERRED_SNAPSHOT_THREADS``),
+which is handed the operation once its transaction has been committed.
+
+Only post data is deferred: the pre operation state is gone once the
+operation is applied, so it is always captured in the request.
+
+A snapshot reflects the plugins as they are when it is built. To keep it
+identical to the state right after the operation, pending entries of a
+session are built before the session records its next operation, and an
+operation's own entries are built before it is undone or redone.
+"""
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import QuerySet
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'DJANGOCMS_HISTORY_DEFERRED_SNAPSHOTS', False)
+
+
+def get_thread_count() -> int:
+    return getattr(settings, 'DJANGOCMS_HISTORY_DEFERRED_SNAPSHOT_THREADS', 0)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=get_thread_count(),
+            thread_name_prefix='djangocms-history',
+        )
+    return _executor
+
+
+def _process_operation_in_thread(operation_id: int) -> None:
+    from .models import OutboxEntry
+
+    try:
+        process_entries(OutboxEntry.objects.filter(operation_id=operation_id))
+    except Exception:
+        # The future is not waited for; log the error and leave the
+        # entries to the process_history_outbox command.
+        logger.exception('Building the snapshots of operation %s failed', operation_id)
+    finally:
+        # Worker threads get their own connections; don't leak them.
+        connections.close_all()
+
+
+def dispatch(operation_id: int) -> None:
+    """
+    Hands the outbox entries of a committed operation to the in-process
+    thread pool. Without threads configured this does nothing and the
+    entries wait for the ``process_history_outbox`` command.
+    """
+    if get_thread_count() > 0:
+        _get_executor().submit(_process_operation_in_thread, operation_id)
+
+
+def process_entries(queryset: QuerySet) -> int:
+    """
+    Builds the snapshots of the given outbox entries and returns the number
+    of entries processed by this call. An entry another worker is
+    processing is locked; it is waited for, and skipped once processed.
+    """
+    processed = 0
+
+    for entry_id in list(queryset.values_list('pk', flat=True)):
+        if process_entry(entry_id):
+            processed += 1
+    return processed
+
+
+def process_entry(entry_id: int) -> bool:
+    from .models import OutboxEntry
+
+    with transaction.atomic():
+        entry = (
+            OutboxEntry
+            .objects
+            .select_for_update()
+            .filter(pk=entry_id)
+            .first()
+        )
+
+        if entry is None:
+            return False
+
+        entry.process()
+    return True
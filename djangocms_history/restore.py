@@ -0,0 +1,159 @@
+"""
+Bulk restore of archived plugins.
+
+``ArchivedPlugin.restore`` recreates one plugin at a time: it creates the
+``CMSPlugin`` row, then saves the plugin row built by the ``python``
+deserializer, in a savepoint of its own. ``restore_plugins`` inserts the
+``CMSPlugin`` rows of a list of archived plugins with one ``bulk_create``
+and the rows of each plugin model with one insert, converting the archived
+data with field maps built once per model (see ``PluginRowBuilder``).
+
+Plugins that cannot be inserted that way are restored one by one with
+``ArchivedPlugin.restore``, as before: plugins of models that override
+``save()``, have many-to-many fields, inherit from another plugin model or
+have ``pre_save``/``post_save`` receivers, and plugins whose data holds
+fields their model no longer has.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Iterable
+
+from django.db import connections, router
+from django.db.models.signals import post_save, pre_save
+from django.utils.timezone import now
+
+from cms.models import CMSPlugin, Placeholder
+
+from .datastructures import ArchivedPlugin
+
+
+class PluginRowBuilder:
+    """
+    Builds the instances of a plugin model from archived plugin data,
+    converting the values like the ``python`` deserializer does, and
+    inserts their rows into the plugin table.
+    """
+
+    def __init__(self, model: type[CMSPlugin]) -> None:
+        opts = model._meta
+        self.model = model
+        self.pk_attname = opts.pk.attname
+        # The columns of the plugin table, the parent link included
+        self.fields = opts.local_concrete_fields
+        # Attribute name and converter of each field, by field name
+        self.converters: dict[str, tuple[str, Callable[[Any], Any]]] = {}
+
+        for field in self.fields:
+            if field.remote_field is None:
+                self.converters[field.name] = (field.attname, field.to_python)
+            else:
+                target = field.remote_field.model._meta.get_field(field.remote_field.field_name)
+                self.converters[field.name] = (field.attname, _get_fk_converter(target))
+
+    def accepts(self, data: dict[str, Any]) -> bool:
+        return self.converters.keys() >= data.keys()
+
+    def get_instance(self, archived_plugin: ArchivedPlugin) -> CMSPlugin:
+        values = {self.pk_attname: archived_plugin.pk}
+
+        for name, value in archived_plugin.data.items():
+            attname, to_python = self.converters[name]
+            values[attname] = to_python(value)
+        return self.model(**values)
+
+    def insert(self, instances: list[CMSPlugin], using: str) -> None:
+        # bulk_create() refuses models inheriting from a concrete model;
+        # the plugin rows are inserted the way a raw save() inserts them.
+        batch_size = connections[using].ops.bulk_batch_size(self.fields, instances)
+        manager = self.model._base_manager
+
+        for start in range(0, len(instances), batch_size):
+            manager._insert(
+                instances[start:start + batch_size],
+                fields=self.fields,
+                raw=True,
+                using=using,
+            )
+
+
+def _get_fk_converter(target: Any) -> Callable[[Any], Any]:
+    def to_python(value: Any) -> Any:
+        return None if value is None else target.to_python(value)
+    return to_python
+
+
+@lru_cache()
+def _get_row_builder(model: type[CMSPlugin]) -> PluginRowBuilder:
+    return PluginRowBuilder(model)
+
+
+def get_row_builder(model: type[CMSPlugin]) -> PluginRowBuilder | None:
+    """
+    Returns the row builder of a plugin model, or ``None`` if its plugins
+    have to be restored one by one.
+    """
+    opts = model._meta
+
+    if (
+        model.save is not CMSPlugin.save
+        or opts.local_many_to_many
+        or list(opts.parents) != [CMSPlugin]
+        or pre_save.has_listeners(model)
+        or post_save.has_listeners(model)
+    ):
+        return None
+    return _get_row_builder(model)
+
+
+def restore_plugins(
+    archived_plugins: Iterable[ArchivedPlugin],
+    placeholder: Placeholder,
+    language: str,
+) -> None:
+    """
+    Recreates the given archived plugins, in position order, at their
+    archived positions and with their original primary keys (see
+    ``action_handlers._restore_archived_plugins``, which opens the gap for
+    them and runs in a transaction).
+    """
+    using = router.db_for_write(CMSPlugin)
+    bulk_base = not (pre_save.has_listeners(CMSPlugin) or post_save.has_listeners(CMSPlugin))
+    base_rows = []
+    plugin_rows = defaultdict(list)
+
+    for archived_plugin in archived_plugins:
+        if archived_plugin.plugin_type == 'CMSPlugin' or archived_plugin.data is None:
+            builder = None
+        else:
+            builder = get_row_builder(archived_plugin.model)
+
+            if builder is None or not builder.accepts(archived_plugin.data):
+                builder = False
+
+        if builder is False or not bulk_base:
+            # Rows are inserted in position order, parents before their
+            # children.
+            CMSPlugin.objects.using(using).bulk_create(base_rows)
+            base_rows = []
+            archived_plugin.restore(placeholder=placeholder, language=language)
+            continue
+
+        base_rows.append(CMSPlugin(
+            pk=archived_plugin.pk,
+            plugin_type=archived_plugin.plugin_type,
+            placeholder=placeholder,
+            language=language,
+            parent_id=archived_plugin.parent_id,
+            position=archived_plugin.position,
+            creation_date=archived_plugin.creation_date or now(),
+        ))
+
+        if builder is not None:
+            plugin_rows[builder].append(builder.get_instance(archived_plugin))
+
+    CMSPlugin.objects.using(using).bulk_create(base_rows)
+
+    for builder, instances in plugin_rows.items():
+        builder.insert(instances, using)
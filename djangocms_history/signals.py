@@ -3,3 +3,7 @@ from django.dispatch import Signal
 post_operation_undo = Signal("operation actions")
 
 post_operation_redo = Signal("operation actions")
+
+post_operations_delete = Signal("count")
+
+operation_size_exceeded = Signal("operation size")
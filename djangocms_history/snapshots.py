@@ -0,0 +1,142 @@
+"""
+Content-addressed store of the field data of recorded plugins.
+
+Cutting a plugin records its subtree twice (as it was in its placeholder
+and as it is in the clipboard) and pasting it records the same data again.
+With ``DJANGOCMS_HISTORY_SNAPSHOT_STORE`` (off by default) the field data of
+each plugin is stored once in ``PluginSnapshot``, keyed by a digest of the
+data, and the action data only holds the digest (see
+``columns.encode_plugins``). The data is stored as it was recorded; like
+the serializer's, it leaves out the plugin's pk (and parent link), so that
+copies of a plugin share their snapshot.
+
+Operations reference the snapshots of their actions through
+``PluginSnapshotReference`` rows, deleted with the operation. Snapshots no
+longer referenced by any operation are deleted together with the last
+operation referencing them (see ``models.delete_operations``). ``save``
+and ``free`` lock the snapshot rows they reference or delete, so that a
+snapshot referenced again while it is freed is not deleted, or is stored
+again.
+
+Data shorter than ``MIN_SIZE`` characters is not worth a reference and stays
+in the action data, like the changed fields of plugin changes.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Exists, OuterRef
+
+from . import codecs, compression
+
+MIN_SIZE = 64
+
+
+class MissingSnapshotError(LookupError):
+    """
+    Raised when action data references snapshots that are no longer
+    stored; the action cannot be replayed.
+    """
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'DJANGOCMS_HISTORY_SNAPSHOT_STORE', False)
+
+
+def get_digest(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def dump(data: dict[str, Any]) -> str:
+    """
+    Returns the JSON of the plugin ``data`` as stored in a snapshot.
+    """
+    return codecs.get_codec().encode(data, sort_keys=True)
+
+
+def load(text: str) -> dict[str, Any]:
+    return codecs.get_codec().decode(text)
+
+
+def fetch(digests: Iterable[str]) -> dict[str, str]:
+    """
+    Returns the JSON of the stored snapshots with the given digests.
+    """
+    from .models import PluginSnapshot
+
+    return {
+        digest: compression.decompress(data)
+        for digest, data in PluginSnapshot.objects.filter(pk__in=digests).values_list('pk', 'data')
+    }
+
+
+def save(operation_id: int, snapshots: dict[str, str] | None) -> None:
+    """
+    Stores the given snapshots, unless they are already stored, and
+    references them from the operation.
+    """
+    from .models import PluginSnapshot, PluginSnapshotReference
+
+    if not snapshots:
+        return
+
+    using = router.db_for_write(PluginSnapshot)
+    manager = PluginSnapshot._base_manager.using(using)
+    missing = list(snapshots)
+
+    with transaction.atomic(using=using, savepoint=False):
+        while missing:
+            manager.bulk_create(
+                [
+                    PluginSnapshot(digest=digest, data=compression.compress(snapshots[digest]))
+                    for digest in missing
+                ],
+                ignore_conflicts=True,
+            )
+            # A snapshot that already existed may be deleted by free() until
+            # it is locked; store the ones deleted in the meantime again.
+            locked = set(
+                manager
+                .select_for_update()
+                .filter(pk__in=snapshots)
+                .order_by('pk')
+                .values_list('pk', flat=True)
+            )
+            missing = [digest for digest in snapshots if digest not in locked]
+
+        PluginSnapshotReference._base_manager.using(using).bulk_create(
+            [
+                PluginSnapshotReference(operation_id=operation_id, snapshot_id=digest)
+                for digest in snapshots
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def free(digests: list[str], using: str) -> int:
+    """
+    Deletes the snapshots with the given digests that are no longer
+    referenced by any operation.
+    """
+    from .models import PluginSnapshot, PluginSnapshotReference
+
+    if not digests:
+        return 0
+
+    manager = PluginSnapshot._base_manager.using(using)
+    references = PluginSnapshotReference._base_manager.using(using).filter(snapshot=OuterRef('pk'))
+
+    with transaction.atomic(using=using, savepoint=False):
+        # Waits for the transactions of save() referencing them; the delete
+        # below sees their references.
+        locked = list(
+            manager
+            .select_for_update()
+            .filter(pk__in=digests)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        return manager.filter(pk__in=locked).exclude(Exists(references))._raw_delete(using)
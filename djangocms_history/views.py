@@ -30,13 +30,14 @@ try:
 except ImportError:
     SUPPORTS_DATA_BRIDGE = False
 
+from .compression import UnknownDictionaryError
 from .forms import UndoRedoForm
 from .helpers import (
-    get_active_operation,
-    get_inactive_operation,
+    get_history_context,
     get_operations_from_request,
 )
-from .models import PlaceholderOperation
+from .models import MissingPreviousChangeError, PlaceholderOperation
+from .snapshots import MissingSnapshotError
 
 
 class UndoRedoView(DetailView):
@@ -72,10 +73,19 @@ class UndoRedoView(DetailView):
         # the plugin away.
         self._move_old_parent_id = self._capture_move_old_parent_id()
 
-        if self.action == 'undo':
-            self.object.undo()
-        else:
-            self.object.redo()
+        try:
+            if self.action == 'undo':
+                self.object.undo()
+            else:
+                self.object.redo()
+        except (MissingPreviousChangeError, MissingSnapshotError, UnknownDictionaryError):
+            # Nothing was changed (undo and redo run in a transaction).
+            return HttpResponseBadRequest(
+                'The operation cannot be applied because '
+                'its recorded data is incomplete'
+            )
+
+        get_history_context(request).invalidate()
 
         # Reflect the result to the frontend so it can update the structure
         # board in place. Add/edit operations return the plugin's close frame
@@ -278,11 +288,12 @@ class UndoRedoView(DetailView):
         if queryset is None:
             queryset = self.get_queryset()
 
+        data = self.form.cleaned_data
+        context = get_history_context(self.request)
+
         if self.action == 'undo':
-            operation = get_active_operation(queryset)
-        else:
-            operation = get_inactive_operation(queryset)
-        return operation
+            return context.get_active_operation(data['cms_path'], data['language'], queryset)
+        return context.get_inactive_operation(data['cms_path'], data['language'], queryset)
 
     def get_queryset(self) -> QuerySet:
         data = self.form.cleaned_data
@@ -0,0 +1,28 @@
+import os
+import time
+from unittest import skipUnless
+
+# The benchmarks print timings rather than assert on them; they are only
+# run on demand: BENCHMARKS=1 pytest tests/benchmarks -s
+benchmark = skipUnless(os.environ.get('BENCHMARKS'), 'set BENCHMARKS=1 to run the benchmarks')
+
+
+def measure(func, number=1000, repeat=5):
+    """
+    Returns the best time per call of ``func``, in microseconds.
+    """
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) / number * 1e6
+
+
+def report(title, rows):
+    print()
+    print(title)
+    for label, value in rows:
+        print('  {:<48} {:>12}'.format(label, value))
@@ -0,0 +1,75 @@
+import tracemalloc
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+from django.utils.functional import cached_property
+
+from djangocms_history import columns
+from djangocms_history.datastructures import BaseArchivedPlugin
+from djangocms_history.models import PlaceholderAction, dump_action_data
+from djangocms_history.utils import get_plugin_model
+
+from .base import benchmark, report
+from .test_columns_benchmark import get_plugins
+
+
+class DictArchivedPlugin(BaseArchivedPlugin):
+    # The archived plugin as it was before, with an instance dictionary
+    # holding the cached model (and deserialized instance)
+
+    @cached_property
+    def model(self):
+        return get_plugin_model(self.plugin_type)
+
+
+def get_retained_size(func):
+    # Returns the memory allocated by func() and still held by its result
+    tracemalloc.start()
+
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = func()
+        return tracemalloc.get_traced_memory()[0] - start, result
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark
+@override_settings(DJANGOCMS_HISTORY_COMPRESSION=None)
+class ArchivedPluginBenchmark(SimpleTestCase):
+
+    def test_bytes_per_plugin(self):
+        rows = []
+        plugins = [{**plugin, 'plugin_type': 'LinkPlugin'} for plugin in get_plugins(5000)]
+
+        for label, use_snapshots in (('inline data', False), ('snapshots', True)):
+            snapshots = {} if use_snapshots else None
+            text = dump_action_data({'plugins': plugins}, snapshots)
+
+            def decode():
+                action = PlaceholderAction(pre_action_data=text)
+                action._snapshots = snapshots
+                archived_plugins = action.get_pre_action_data()['plugins']
+
+                for plugin in archived_plugins:
+                    # As read by the restore
+                    plugin.model
+                return archived_plugins
+
+            with patch.object(columns, 'ArchivedPlugin', DictArchivedPlugin), \
+                    patch.object(columns, 'intern', str), \
+                    patch.object(columns, 'intern_data', lambda data: data):
+                before, archived_plugins = get_retained_size(decode)
+                assert type(archived_plugins[0]) is DictArchivedPlugin
+
+            del archived_plugins
+            after, archived_plugins = get_retained_size(decode)
+            rows.append((
+                '5000 plugins, {}'.format(label),
+                '{:>6.0f} B {:>6.0f} B {:>5.1f}x'.format(
+                    before / len(plugins),
+                    after / len(plugins),
+                    before / after,
+                ),
+            ))
+        report('bytes per archived plugin: before / slotted and interned', rows)
@@ -0,0 +1,45 @@
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+from djangocms_history.codecs import JSONCodec, OrjsonCodec
+from djangocms_history.columns import encode_plugins
+
+from .base import benchmark, measure, report
+from .test_columns_benchmark import get_plugins
+
+
+@benchmark
+@skipUnless(OrjsonCodec.is_available(), 'orjson is not installed')
+class CodecBenchmark(SimpleTestCase):
+
+    def test_encode_and_decode_time(self):
+        json_codec = JSONCodec()
+        orjson_codec = OrjsonCodec()
+        rows = []
+
+        for count in (10, 100, 1000, 5000):
+            # Action data as stored, with the plugin list encoded column-wise
+            data = {'parent_id': None, 'plugins': encode_plugins(get_plugins(count))}
+            text = json_codec.encode(data)
+            assert orjson_codec.encode(data) == text
+
+            number = max(10, 10_000 // count)
+            timings = [
+                measure(lambda: json_codec.encode(data), number=number),
+                measure(lambda: orjson_codec.encode(data), number=number),
+                measure(lambda: json_codec.decode(text), number=number),
+                measure(lambda: orjson_codec.decode(text), number=number),
+            ]
+            rows.append((
+                '{} plugins ({} B)'.format(count, len(text)),
+                '{:>8.0f} us {:>7.0f} us {:>4.1f}x {:>8.0f} us {:>7.0f} us {:>4.1f}x'.format(
+                    timings[0],
+                    timings[1],
+                    timings[0] / timings[1],
+                    timings[2],
+                    timings[3],
+                    timings[2] / timings[3],
+                ),
+            ))
+        report('json / orjson encode time, json / orjson decode time', rows)
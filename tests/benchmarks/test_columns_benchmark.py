@@ -0,0 +1,78 @@
+import functools
+import json
+from datetime import datetime, timezone
+
+from django.test import SimpleTestCase, override_settings
+
+from djangocms_history import columns
+from djangocms_history.models import PlaceholderAction, dump_action_data, dump_json
+
+from .base import benchmark, measure, report
+
+
+def get_plugins(count):
+    # A subtree of rows of columns of links, as built by get_plugin_data
+    plugins = []
+
+    for index in range(count):
+        parent_id = None if index % 10 == 0 else index - index % 10 + 1
+        plugins.append({
+            'pk': index + 1,
+            'creation_date': datetime(2026, 10, 18, 12, 0, index % 60, tzinfo=timezone.utc),
+            'position': index + 1,
+            'plugin_type': 'RowPlugin' if parent_id is None else 'LinkPlugin',
+            'parent_id': parent_id,
+            'data': {
+                'cmsplugin_ptr': index + 1,
+                'name': 'Link {}'.format(index),
+                'external_link': 'https://www.django-cms.org/{}/'.format(index),
+                'internal_link': None,
+                'anchor': '',
+                'target': '',
+                'attributes': {},
+                'template': 'default',
+            },
+        })
+    return plugins
+
+
+@benchmark
+class PluginColumnsBenchmark(SimpleTestCase):
+
+    def test_size_and_decode_time(self):
+        action = PlaceholderAction()
+        rows = []
+
+        for count in (10, 100, 1000):
+            plugins = get_plugins(count)
+            # As stored by earlier versions, and parsed by them
+            rowwise = dump_json({'plugins': plugins})
+            parse_rowwise = functools.partial(
+                json.loads,
+                rowwise,
+                object_hook=action._object_version_data_hook,
+            )
+            with override_settings(DJANGOCMS_HISTORY_COMPRESSION=None):
+                columnwise = dump_action_data({'plugins': plugins})
+            assert parse_rowwise() == action._get_parsed_data(columnwise)
+
+            number = max(10, 10_000 // count)
+            rowwise_time = measure(parse_rowwise, number=number)
+            columnwise_time = measure(lambda: action._get_parsed_data(columnwise), number=number)
+            encode_time = measure(
+                lambda: dump_json({'plugins': columns.encode_plugins(plugins)}),
+                number=number,
+            )
+            rows.append((
+                '{} plugins'.format(count),
+                '{:>9} B {:>8} B {:>4.1f}x {:>8.0f} us {:>8.0f} us {:>4.1f}x {:>8.0f} us'.format(
+                    len(rowwise),
+                    len(columnwise),
+                    len(rowwise) / len(columnwise),
+                    rowwise_time,
+                    columnwise_time,
+                    rowwise_time / columnwise_time,
+                    encode_time,
+                ),
+            ))
+        report('rows / columns size, rows / columns decode time, columns encode time', rows)
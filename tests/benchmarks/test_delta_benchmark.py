@@ -0,0 +1,62 @@
+import json
+import random
+
+from django.test import SimpleTestCase
+
+from djangocms_history import delta
+
+from .base import benchmark, measure, report
+
+
+def get_text(size, seed=0):
+    rng = random.Random(seed)
+    # A vocabulary of a few hundred words, used with a skewed frequency
+    syllables = ['lo', 'rem', 'ip', 'sum', 'do', 'lor', 'sit', 'a', 'met', 'con', 'sec', 'tur']
+    words = [''.join(rng.choices(syllables, k=rng.randint(1, 4))) for _ in range(500)]
+    words = [word for word in words for _ in range(500 // (words.index(word) + 1) + 1)]
+    text = []
+
+    while sum(map(len, text)) < size:
+        text.append('<p>{}</p>\n'.format(' '.join(rng.choice(words) for _ in range(60))))
+    return ''.join(text)[:size]
+
+
+def edit(text, count, seed=1):
+    rng = random.Random(seed)
+    words = text.split(' ')
+
+    for _ in range(count):
+        words[rng.randrange(len(words))] = 'edited'
+    return ' '.join(words)
+
+
+@benchmark
+class DeltaEncodingBenchmark(SimpleTestCase):
+
+    def test_encode_decode_cost_against_bytes_saved(self):
+        rows = []
+
+        for size in (10_000, 50_000, 200_000):
+            base = get_text(size)
+
+            for label, value in (
+                ('one word', edit(base, 1)),
+                ('1% of words', edit(base, size // 700)),
+                ('appended paragraph', base + get_text(500, seed=2)),
+            ):
+                operations = delta.encode(base, value)
+                assert delta.decode(base, operations) == value
+                number = 20 if size > 50_000 else 100
+                encode_time = measure(lambda: delta.encode(base, value), number=number)
+                decode_time = measure(lambda: delta.decode(base, operations), number=number)
+                stored = len(json.dumps({delta.DELTA_KEY: operations}))
+                rows.append((
+                    '{} kB, {}'.format(size // 1000, label),
+                    '{:>8.0f} us {:>6.0f} us {:>8} B {:>5.1f}%'.format(
+                        encode_time,
+                        decode_time,
+                        len(json.dumps(value)) - stored,
+                        100 * stored / len(json.dumps(value)),
+                    ),
+                ))
+        report('delta encode / decode / bytes saved / stored size', rows)
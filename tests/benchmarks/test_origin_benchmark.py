@@ -0,0 +1,52 @@
+from urllib.parse import urlparse
+
+from cms.toolbar.utils import get_object_edit_url
+
+from djangocms_history import helpers
+from djangocms_history.helpers import (
+    clear_operation_origin_cache,
+    get_operation_origin,
+    resolve_operation_origin,
+)
+
+from ..base import HistoryTestCase
+from .base import benchmark, measure, report
+
+
+@benchmark
+class OperationOriginBenchmark(HistoryTestCase):
+    """
+    The origin is computed three times per editor request: in the pre and
+    post operation signals and when the toolbar (or the undo/redo view)
+    looks up the operations of the current origin.
+    """
+    calls_per_request = 3
+
+    def _resolve(self, url):
+        return resolve_operation_origin(urlparse(url).path)
+
+    def _miss(self, url):
+        # Only the per path cache, the endpoint matcher is built once.
+        helpers._get_canonical_origin.cache_clear()
+        return get_operation_origin(url)
+
+    def test_origin_cost_per_request(self):
+        urls = {
+            'object endpoint': get_object_edit_url(self.page_content, 'en'),
+            'page path': '/en/home/?edit',
+        }
+        rows = []
+
+        for label, url in urls.items():
+            for variant, func in (
+                ('resolve()', self._resolve),
+                ('cache miss', self._miss),
+                ('cached', get_operation_origin),
+            ):
+                per_call = measure(lambda: func(url))
+                rows.append((
+                    '{}, {}'.format(label, variant),
+                    '{:.2f} us'.format(per_call * self.calls_per_request),
+                ))
+        clear_operation_origin_cache()
+        report('get_operation_origin() per request', rows)
@@ -0,0 +1,68 @@
+from django.core import serializers
+
+from cms.api import add_plugin
+from cms.models import CMSPlugin
+from cms.utils.plugins import get_bound_plugins
+
+from djangocms_history.helpers import get_plugins_data
+from djangocms_history.utils import get_plugin_fields
+
+from ..base import HistoryTestCase
+from .base import benchmark, measure, report
+
+
+def get_serialized_plugins_data(plugins):
+    # The snapshots as built before, with a serializer per plugin
+    return [
+        {
+            'pk': plugin.pk,
+            'creation_date': plugin.creation_date,
+            'position': plugin.position,
+            'plugin_type': plugin.plugin_type,
+            'parent_id': plugin.parent_id,
+            'data': serializers.serialize(
+                'python',
+                (plugin,),
+                fields=get_plugin_fields(plugin.plugin_type),
+            )[0]['fields'],
+        }
+        for plugin in get_bound_plugins(plugins)
+    ]
+
+
+@benchmark
+class PluginDataBenchmark(HistoryTestCase):
+    """
+    Snapshots of the plugins of a placeholder, as recorded when it is
+    cleared or when a subtree is cut, deleted or pasted.
+    """
+
+    def test_snapshot_time(self):
+        rows = []
+        count = 0
+
+        for target in (10, 100, 1000, 5000):
+            for index in range(count, target):
+                add_plugin(
+                    self.placeholder,
+                    'LinkPlugin',
+                    'en',
+                    name='Link {}'.format(index),
+                    external_link='https://www.django-cms.org/{}/'.format(index),
+                )
+            count = target
+            plugins = list(CMSPlugin.objects.filter(placeholder=self.placeholder).order_by('position'))
+            assert get_plugins_data(plugins) == get_serialized_plugins_data(plugins)
+
+            number = max(1, 1000 // count)
+            serializer_time = measure(lambda: get_serialized_plugins_data(plugins), number=number, repeat=3)
+            extractor_time = measure(lambda: get_plugins_data(plugins), number=number, repeat=3)
+            rows.append((
+                '{} plugins'.format(count),
+                '{:>10.0f} us {:>10.0f} us {:>5.1f}x'.format(
+                    serializer_time,
+                    extractor_time,
+                    serializer_time / extractor_time,
+                ),
+            ))
+        report('serializer per plugin / batched extractor', rows)
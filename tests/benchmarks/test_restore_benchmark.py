@@ -0,0 +1,221 @@
+import time
+import tracemalloc
+
+from django.db import connection
+
+from cms.api import add_plugin
+from cms.models import CMSPlugin
+
+from djangocms_history.action_handlers import _restore_archived_plugins
+from djangocms_history.models import PlaceholderAction
+from djangocms_history.restore import restore_plugins
+
+from ..base import HistoryTestCase
+from .base import benchmark, report
+
+
+def restore_one_by_one(action, data):
+    # The restore as done before: every archived plugin restored with its
+    # own queries, and every restored plugin kept until the end.
+    placeholder = action.placeholder
+    archived_plugins = sorted(data['plugins'], key=lambda plugin: plugin.position)
+    restored_ids = {archived_plugin.pk for archived_plugin in archived_plugins}
+    surviving_parent_ids = {
+        archived_plugin.parent_id
+        for archived_plugin in archived_plugins
+        if archived_plugin.parent_id and archived_plugin.parent_id not in restored_ids
+    }
+    plugins_by_id = CMSPlugin.objects.in_bulk(surviving_parent_ids)
+
+    for archived_plugin in archived_plugins:
+        plugin = archived_plugin.restore(placeholder=placeholder, language=action.language)
+        plugins_by_id[plugin.pk] = plugin
+
+    placeholder._recalculate_plugin_positions(action.language)
+    placeholder.clear_cache(action.language)
+
+
+def restore_and_recalculate(action, data):
+    # The positions as rewritten before: every plugin at or after the first
+    # archived position shifted beyond any archived position, then all
+    # positions of the placeholder recalculated.
+    placeholder = action.placeholder
+    archived_plugins = sorted(data['plugins'], key=lambda plugin: plugin.position)
+    start = archived_plugins[0].position
+    last = placeholder.get_last_plugin_position(action.language) or 0
+
+    if last >= start:
+        placeholder._shift_plugin_positions(action.language, start=start, offset=last + len(archived_plugins))
+    restore_plugins(archived_plugins, placeholder=placeholder, language=action.language)
+    placeholder._recalculate_plugin_positions(action.language)
+    placeholder.clear_cache(action.language)
+
+
+def get_restore_time(placeholder, restore, repeat=3):
+    # Returns the best time of a restore, in milliseconds, and its queries
+    timings = []
+    queries = []
+
+    def count_query(execute, *args):
+        queries.append(args[0])
+        return execute(*args)
+
+    for _ in range(repeat):
+        placeholder.clear()
+        queries.clear()
+
+        with connection.execute_wrapper(count_query):
+            start = time.perf_counter()
+            restore()
+            timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, len(queries)
+
+
+def get_peak_memory(func):
+    tracemalloc.start()
+
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark
+class RestoreBenchmark(HistoryTestCase):
+    """
+    Undo of a placeholder clear, which restores all of its plugins.
+    """
+
+    def test_restore_time(self):
+        rows = []
+        count = 0
+
+        for target in (10, 100, 1000):
+            for index in range(count, target):
+                add_plugin(
+                    self.placeholder,
+                    'LinkPlugin',
+                    'en',
+                    name='Link {}'.format(index),
+                    external_link='https://www.django-cms.org/{}/'.format(index),
+                )
+            count = target
+            tree = self.tree(self.placeholder)
+
+            with self.login_user_context(self.superuser):
+                self.clear_placeholder_via_endpoint(self.placeholder)
+            action = self.latest_operation().actions.get()
+            data = action.get_pre_action_data()
+
+            results = []
+
+            for restore in (restore_one_by_one, _restore_archived_plugins):
+                results.append(get_restore_time(self.placeholder, lambda: restore(action, data)))
+                assert self.tree(self.placeholder) == tree
+
+            rows.append((
+                '{} plugins'.format(count),
+                '{:>8.1f} ms {:>5} q {:>8.1f} ms {:>5} q {:>5.1f}x'.format(
+                    results[0][0],
+                    results[0][1],
+                    results[1][0],
+                    results[1][1],
+                    results[0][0] / results[1][0],
+                ),
+            ))
+        report('restore time and queries: one by one / in bulk', rows)
+
+    def test_peak_memory(self):
+        rows = []
+        count = 0
+
+        for target in (100, 1000, 5000):
+            for index in range(count, target):
+                add_plugin(
+                    self.placeholder,
+                    'LinkPlugin',
+                    'en',
+                    name='Link {}'.format(index),
+                    external_link='https://www.django-cms.org/{}/'.format(index),
+                )
+            count = target
+            tree = self.tree(self.placeholder)
+
+            with self.login_user_context(self.superuser):
+                self.clear_placeholder_via_endpoint(self.placeholder)
+            action_id = self.latest_operation().actions.get().pk
+
+            # The same restore, with the plugins decoded all at once or a
+            # chunk at a time.
+            def restore_decoded():
+                action = PlaceholderAction.objects.get(pk=action_id)
+                _restore_archived_plugins(action, action.get_pre_action_data())
+
+            def restore_streamed():
+                action = PlaceholderAction.objects.get(pk=action_id)
+                _restore_archived_plugins(action, action.stream_pre_action_data())
+
+            peaks = []
+
+            for restore in (restore_decoded, restore_streamed):
+                # The first run fills the caches
+                self.placeholder.clear()
+                restore()
+                self.placeholder.clear()
+                peaks.append(get_peak_memory(restore))
+                assert self.tree(self.placeholder) == tree
+
+            rows.append((
+                '{} plugins'.format(count),
+                '{:>8.0f} KB {:>8.0f} KB {:>5.1f}x'.format(
+                    peaks[0] / 1024,
+                    peaks[1] / 1024,
+                    peaks[0] / peaks[1],
+                ),
+            ))
+        report('peak memory of a restore: decoded at once / streamed', rows)
+
+    def test_restore_position_time(self):
+        rows = []
+
+        for index in range(3000):
+            add_plugin(
+                self.placeholder,
+                'LinkPlugin',
+                'en',
+                name='Link {}'.format(index),
+                external_link='https://www.django-cms.org/{}/'.format(index),
+            )
+        tree = self.tree(self.placeholder)
+
+        for label, position in (('top', 1), ('middle', 1500), ('end', 3000)):
+            plugin = self.placeholder.get_plugins('en').get(position=position)
+
+            with self.login_user_context(self.superuser):
+                self.delete_plugin_via_endpoint(plugin)
+            action = self.latest_operation().actions.get()
+            data = action.get_pre_action_data()
+            results = []
+
+            for restore in (restore_and_recalculate, _restore_archived_plugins):
+                timings = []
+
+                for _ in range(3):
+                    start = time.perf_counter()
+                    restore(action, data)
+                    timings.append(time.perf_counter() - start)
+                    assert self.tree(self.placeholder) == tree
+                    self.placeholder.delete_plugin(self.placeholder.get_plugins('en').get(pk=plugin.pk))
+                results.append(min(timings) * 1000)
+
+            restore(action, data)
+            rows.append((
+                '3000 plugins, 1 restored at the {}'.format(label),
+                '{:>8.1f} ms {:>8.1f} ms {:>5.1f}x'.format(
+                    results[0],
+                    results[1],
+                    results[0] / results[1],
+                ),
+            ))
+        report('restore time: shift and recalculate / shift the range only', rows)
@@ -10,9 +10,11 @@ from djangocms_history.action_handlers import (
     _delete_plugins,
     _move_plugin,
     _restore_archived_plugins,
+    redo_change_plugin,
+    undo_change_plugin,
 )
-from djangocms_history.helpers import get_plugin_data
-from djangocms_history.models import PlaceholderOperation
+from djangocms_history.helpers import get_changed_fields, get_plugin_data
+from djangocms_history.models import PlaceholderOperation, dump_json
 
 from .base import HistoryTestCase
 
@@ -113,6 +115,76 @@ class ActionHandlerPrimitivesTestCase(HistoryTestCase):
 
         self.assertEqual(len(self.tree(self.placeholder)), 1)
 
+    def restore_with_updates(self, action):
+        table = CMSPlugin._meta.db_table
+
+        with CaptureQueriesContext(connection) as ctx:
+            _restore_archived_plugins(action, data=action.get_post_action_data())
+        return [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith('UPDATE') and table in query['sql']
+        ]
+
+    def test_restore_only_shifts_the_following_plugins(self):
+        plugins = [self.add_plugin(name='plugin {}'.format(index)) for index in range(6)]
+        data = self.archive(plugins[1:3])
+        action = self.create_action(post_data=data)
+        tree = self.tree(self.placeholder)
+
+        for plugin in plugins[1:3]:
+            self.placeholder.delete_plugin(plugin)
+
+        # Plugins 3 to 5 move up by two, without recalculating all positions.
+        updates = self.restore_with_updates(action)
+
+        self.assertEqual(len(updates), 2)
+        self.assertTrue(all('position' in update for update in updates))
+        self.assertEqual(self.tree(self.placeholder), tree)
+
+    def test_restore_near_the_end_shifts_in_one_statement(self):
+        plugins = [self.add_plugin(name='plugin {}'.format(index)) for index in range(4)]
+        data = self.archive(plugins[2:3])
+        action = self.create_action(post_data=data)
+        tree = self.tree(self.placeholder)
+        self.placeholder.delete_plugin(plugins[2])
+
+        self.assertEqual(len(self.restore_with_updates(action)), 1)
+        self.assertEqual(self.tree(self.placeholder), tree)
+
+    def test_restore_at_the_end_shifts_nothing(self):
+        plugins = [self.add_plugin(name='plugin {}'.format(index)) for index in range(3)]
+        data = self.archive(plugins[2:])
+        action = self.create_action(post_data=data)
+        tree = self.tree(self.placeholder)
+        self.placeholder.delete_plugin(plugins[2])
+
+        self.assertEqual(self.restore_with_updates(action), [])
+        self.assertEqual(self.tree(self.placeholder), tree)
+
+    def test_restore_into_placeholder_with_holes(self):
+        plugins = [self.add_plugin(name='plugin {}'.format(index)) for index in range(4)]
+        data = self.archive(plugins[1:2])
+        action = self.create_action(post_data=data)
+        self.placeholder.delete_plugin(plugins[1])
+        CMSPlugin.objects.filter(pk=plugins[3].pk).update(position=7)
+
+        _restore_archived_plugins(action, data=action.get_post_action_data())
+
+        tree = self.tree(self.placeholder)
+        self.assertEqual([row[0] for row in tree], [plugin.pk for plugin in plugins])
+        self.assertEqual([row[2] for row in tree], [1, 2, 3, 4])
+
+    def test_restore_under_missing_parent(self):
+        parent = self.add_plugin(name='parent')
+        child = self.add_plugin(parent=parent, name='child')
+        data = self.archive([child])
+        action = self.create_action(post_data=data)
+
+        self.placeholder.delete_plugin(parent)
+
+        with self.assertRaises(CMSPlugin.DoesNotExist):
+            _restore_archived_plugins(action, data=action.get_post_action_data())
+
     def test_restore_under_surviving_parent(self):
         parent = self.add_plugin(name='parent')
         child = self.add_plugin(parent=parent, name='child')
@@ -194,3 +266,122 @@ class ActionHandlerPrimitivesTestCase(HistoryTestCase):
 
         tree = self.tree(self.placeholder)
         self.assertEqual([(row[0], row[2]) for row in tree], [(keeper.pk, 1)])
+
+
+class ChangePluginDataTestCase(HistoryTestCase):
+    """
+    A CHANGE_PLUGIN action stores the full plugin data before the change and
+    only the changed fields after it.
+    """
+
+    def change(self, plugin, **data):
+        data.setdefault('name', plugin.name)
+        data.setdefault('external_link', plugin.external_link)
+        with self.login_user_context(self.superuser):
+            self.change_plugin_via_endpoint(plugin, **data)
+        return self.latest_operation().actions.get()
+
+    def test_post_data_only_holds_changed_fields(self):
+        plugin = self.add_plugin(name='before')
+        action = self.change(plugin, name='after')
+
+        post_plugin = action.get_post_action_data()['plugins'][0]
+        self.assertEqual(post_plugin.data, {'name': 'after'})
+        pre_plugin = action.get_pre_action_data()['plugins'][0]
+        self.assertEqual(
+            pre_plugin.data,
+            {'name': 'before', 'external_link': 'https://www.django-cms.org'},
+        )
+
+    def test_undo_only_restores_changed_fields(self):
+        plugin = self.add_plugin(name='before')
+        action = self.change(plugin, name='after')
+        # Changed outside of the recorded operation.
+        type(plugin).objects.filter(pk=plugin.pk).update(external_link='https://example.com')
+
+        with CaptureQueriesContext(connection) as ctx:
+            undo_change_plugin(action)
+
+        plugin.refresh_from_db()
+        self.assertEqual(plugin.name, 'before')
+        self.assertEqual(plugin.external_link, 'https://example.com')
+        update = next(query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE'))
+        self.assertNotIn('external_link', update)
+
+    def test_undo_of_full_post_data_restores_all_fields(self):
+        plugin = self.add_plugin(name='before')
+        action = self.change(plugin, name='after')
+        # Actions recorded before only the changed fields were stored.
+        plugin_data = get_plugin_data(plugin.reload().get_bound_plugin())
+        action.post_action_data = dump_json({'plugins': [plugin_data]})
+        type(plugin).objects.filter(pk=plugin.pk).update(external_link='https://example.com')
+
+        undo_change_plugin(action)
+
+        plugin.refresh_from_db()
+        self.assertEqual(plugin.name, 'before')
+        self.assertEqual(plugin.external_link, 'https://www.django-cms.org')
+
+    def test_changes_of_several_plugins_are_grouped(self):
+        plugins = [self.add_plugin(name='before {}'.format(index)) for index in range(3)]
+        operation = PlaceholderOperation.objects.create(
+            operation_type='change_plugin',
+            token='test-token',
+            origin='/en/',
+            language='en',
+            user=self.superuser,
+            user_session_key='session',
+            site_id=1,
+        )
+        pre_plugins = [get_plugin_data(plugin.get_bound_plugin()) for plugin in plugins]
+        post_plugins = [
+            dict(plugin_data, data={'name': 'after {}'.format(index)})
+            for index, plugin_data in enumerate(pre_plugins)
+        ]
+        # A plugin whose link changed as well is updated on its own.
+        post_plugins[2]['data']['external_link'] = 'https://example.com'
+        operation.create_action(
+            action=actions.CHANGE_PLUGIN,
+            language='en',
+            placeholder=self.placeholder,
+            pre_data={'plugins': pre_plugins},
+            post_data={'plugins': post_plugins},
+        )
+        action = operation.actions.get()
+
+        def get_values():
+            return list(
+                type(plugins[0]).objects
+                .filter(pk__in=[plugin.pk for plugin in plugins])
+                .order_by('position')
+                .values_list('name', 'external_link')
+            )
+
+        for handler, expected in (
+            (redo_change_plugin, [
+                ('after 0', 'https://www.django-cms.org'),
+                ('after 1', 'https://www.django-cms.org'),
+                ('after 2', 'https://example.com'),
+            ]),
+            (undo_change_plugin, [
+                ('before {}'.format(index), 'https://www.django-cms.org') for index in range(3)
+            ]),
+        ):
+            with CaptureQueriesContext(connection) as ctx:
+                handler(action)
+
+            updates = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE')]
+            self.assertEqual(len(updates), 2)
+            self.assertEqual(get_values(), expected)
+
+    def test_changed_fields_of_a_wide_plugin(self):
+        # None of the test plugins has many fields; build the data of one
+        # with 50 text fields of which a single one changes.
+        previous_data = {'field_{}'.format(index): 'x' * 40 for index in range(50)}
+        data = dict(previous_data, field_7='changed')
+
+        full_size = len(dump_json(data))
+        changed_size = len(dump_json(get_changed_fields(data, previous_data)))
+
+        self.assertEqual(get_changed_fields(data, previous_data), {'field_7': 'changed'})
+        self.assertLess(changed_size / full_size, 0.02)
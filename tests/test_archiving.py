@@ -2,24 +2,24 @@ from datetime import timedelta
 from io import StringIO
 
 from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_delete
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from djangocms_history.models import (
     PlaceholderAction,
     PlaceholderOperation,
     archive_or_delete_operations,
+    delete_operations,
 )
+from djangocms_history.signals import post_operations_delete
 
 from .base import HistoryTestCase
 
 
-class RetirementModeTestCase(HistoryTestCase):
-    """
-    archive_or_delete_operations() either flags operations as archived or
-    deletes them outright, depending on the
-    DJANGOCMS_HISTORY_ARCHIVE_OPERATIONS setting.
-    """
+class OperationFixtureMixin:
 
     def _create_operations(self, count):
         for index in range(count):
@@ -38,6 +38,14 @@ class RetirementModeTestCase(HistoryTestCase):
                 placeholder=self.placeholder,
             )
 
+
+class RetirementModeTestCase(OperationFixtureMixin, HistoryTestCase):
+    """
+    archive_or_delete_operations() either flags operations as archived or
+    deletes them outright, depending on the
+    DJANGOCMS_HISTORY_ARCHIVE_OPERATIONS setting.
+    """
+
     def test_deletes_by_default(self):
         self._create_operations(2)
 
@@ -60,6 +68,60 @@ class RetirementModeTestCase(HistoryTestCase):
         self.assertEqual(PlaceholderAction.objects.count(), 2)
 
 
+class FastDeleteTestCase(OperationFixtureMixin, HistoryTestCase):
+    """
+    delete_operations() removes operations and their actions without loading
+    them and reports the total through a single signal.
+    """
+
+    def test_deletes_in_batches_without_loading_rows(self):
+        self._create_operations(5)
+
+        with CaptureQueriesContext(connection) as ctx:
+            deleted = delete_operations(PlaceholderOperation.objects.all(), batch_size=2)
+
+        self.assertEqual(deleted, 5)
+        self.assertFalse(PlaceholderOperation.objects.exists())
+        self.assertFalse(PlaceholderAction.objects.exists())
+
+        statements = [query['sql'] for query in ctx.captured_queries]
+        self.assertFalse([sql for sql in statements if 'pre_action_data' in sql])
+        operation_deletes = [
+            sql for sql in statements
+            if sql.startswith('DELETE FROM "{}"'.format(PlaceholderOperation._meta.db_table))
+        ]
+        self.assertEqual(len(operation_deletes), 3)
+
+    def test_sends_one_aggregate_signal(self):
+        self._create_operations(3)
+        received = []
+
+        def receiver(sender, count, **kwargs):
+            received.append((sender, count))
+
+        post_operations_delete.connect(receiver)
+        self.addCleanup(post_operations_delete.disconnect, receiver)
+
+        delete_operations(PlaceholderOperation.objects.all(), batch_size=2)
+        delete_operations(PlaceholderOperation.objects.all())
+
+        self.assertEqual(received, [(PlaceholderOperation, 3)])
+
+    def test_falls_back_to_the_collector_for_delete_receivers(self):
+        self._create_operations(2)
+        deleted_actions = []
+
+        def receiver(sender, instance, **kwargs):
+            deleted_actions.append(instance.pk)
+
+        post_delete.connect(receiver, sender=PlaceholderAction)
+        self.addCleanup(post_delete.disconnect, receiver, sender=PlaceholderAction)
+
+        self.assertEqual(delete_operations(PlaceholderOperation.objects.all()), 2)
+        self.assertEqual(len(deleted_actions), 2)
+        self.assertFalse(PlaceholderAction.objects.exists())
+
+
 class IntegrationRetirementTestCase(HistoryTestCase):
     """
     The same toggle applies when the CMS retires competing operations during
@@ -0,0 +1,97 @@
+import datetime
+import uuid
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import SimpleTestCase, override_settings
+
+from djangocms_history import codecs
+from djangocms_history.codecs import JSONCodec, OrjsonCodec
+
+from .base import HistoryTestCase
+
+ORJSON_CODEC = 'djangocms_history.codecs.OrjsonCodec'
+
+DATA = {
+    'pk': 1,
+    'creation_date': datetime.datetime(2026, 10, 18, 12, 0, 0, 123456, tzinfo=datetime.timezone.utc),
+    'date': datetime.date(2026, 10, 18),
+    'time': datetime.time(12, 30, 15, 500000),
+    'price': Decimal('10.50'),
+    'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'name': 'Zürich – «quoted» "text"',
+    'values': [1, 2.5, None, True, {'nested': 'value'}],
+}
+
+
+class JSONCodecTestCase(SimpleTestCase):
+
+    def test_values_are_encoded_as_by_django(self):
+        encoded = JSONCodec().decode(JSONCodec().encode(DATA))
+        expected = DjangoJSONEncoder()
+
+        self.assertEqual(encoded['creation_date'], expected.default(DATA['creation_date']))
+        self.assertEqual(encoded['creation_date'], '2026-10-18T12:00:00.123Z')
+        self.assertEqual(encoded['date'], '2026-10-18')
+        self.assertEqual(encoded['time'], '12:30:15.500')
+        self.assertEqual(encoded['price'], '10.50')
+        self.assertEqual(encoded['uuid'], '12345678-1234-5678-1234-567812345678')
+        self.assertEqual(encoded['name'], DATA['name'])
+
+    def test_sort_keys(self):
+        self.assertEqual(JSONCodec().encode({'b': 1, 'a': 2}, sort_keys=True), '{"a":2,"b":1}')
+
+    def test_default_codec(self):
+        self.assertIsInstance(codecs.get_codec(), JSONCodec)
+        self.assertNotIsInstance(codecs.get_codec(), OrjsonCodec)
+
+    @override_settings(DJANGOCMS_HISTORY_CODEC=ORJSON_CODEC)
+    def test_unavailable_codec_falls_back_to_the_default(self):
+        codecs._get_codec.cache_clear()
+        self.addCleanup(codecs._get_codec.cache_clear)
+
+        with patch.object(OrjsonCodec, 'is_available', return_value=False):
+            self.assertIs(type(codecs.get_codec()), JSONCodec)
+
+
+@skipUnless(OrjsonCodec.is_available(), 'orjson is not installed')
+class OrjsonCodecTestCase(SimpleTestCase):
+
+    def test_encodes_like_the_default_codec(self):
+        for sort_keys in (False, True):
+            with self.subTest(sort_keys=sort_keys):
+                self.assertEqual(
+                    OrjsonCodec().encode(DATA, sort_keys=sort_keys),
+                    JSONCodec().encode(DATA, sort_keys=sort_keys),
+                )
+
+    def test_decodes_like_the_default_codec(self):
+        text = JSONCodec().encode(DATA)
+        self.assertEqual(OrjsonCodec().decode(text), JSONCodec().decode(text))
+
+    @override_settings(DJANGOCMS_HISTORY_CODEC=ORJSON_CODEC)
+    def test_setting(self):
+        self.assertIsInstance(codecs.get_codec(), OrjsonCodec)
+
+
+@skipUnless(OrjsonCodec.is_available(), 'orjson is not installed')
+class CodecActionDataTestCase(HistoryTestCase):
+
+    def test_actions_recorded_with_another_codec_are_undone(self):
+        parent = self.add_plugin(name='Zürich')
+        self.add_plugin(parent=parent, name='child')
+        tree = self.tree(self.placeholder)
+
+        with self.login_user_context(self.superuser):
+            with override_settings(DJANGOCMS_HISTORY_CODEC=ORJSON_CODEC):
+                self.delete_plugin_via_endpoint(parent)
+
+            self.undo()
+            self.assertEqual(self.tree(self.placeholder), tree)
+
+            with override_settings(DJANGOCMS_HISTORY_CODEC=ORJSON_CODEC):
+                self.redo()
+
+        self.assertFalse(self.placeholder.get_plugins('en').exists())
@@ -0,0 +1,193 @@
+import json
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from djangocms_history import columns
+from djangocms_history import snapshots as snapshot_store
+from djangocms_history.action_handlers import _restore_archived_plugins
+from djangocms_history.datastructures import ArchivedPlugin
+from djangocms_history.models import PlaceholderAction, dump_action_data, dump_json
+
+from .base import HistoryTestCase
+
+PLUGINS = [
+    {
+        'pk': 7,
+        'creation_date': '2026-10-18T12:00:00Z',
+        'position': 1,
+        'plugin_type': 'RowPlugin',
+        'parent_id': None,
+        'data': {'title': 'Row'},
+    },
+    {
+        'pk': 8,
+        'creation_date': '2026-10-18T12:00:01Z',
+        'position': 2,
+        'plugin_type': 'LinkPlugin',
+        'parent_id': 7,
+        'data': {'name': 'First', 'external_link': 'https://www.django-cms.org'},
+    },
+    {
+        'pk': 3,
+        'creation_date': None,
+        'position': 3,
+        'plugin_type': 'LinkPlugin',
+        'parent_id': 7,
+        'data': {'name': 'Second', 'external_link': ''},
+    },
+    {
+        'pk': 12,
+        'creation_date': '2026-10-18T12:00:03Z',
+        'position': 5,
+        'plugin_type': 'LinkPlugin',
+        'parent_id': None,
+        'data': {'name': {'__delta__': [[0, 3], 'changed']}},
+    },
+    {
+        'pk': 13,
+        'creation_date': '2026-10-18T12:00:04Z',
+        'position': 6,
+        'plugin_type': 'RowPlugin',
+        'parent_id': None,
+        'data': None,
+    },
+]
+
+
+class PluginColumnsTestCase(SimpleTestCase):
+
+    def decode(self, plugins):
+        return columns.decode_plugins(json.loads(dump_json(columns.encode_plugins(plugins))))
+
+    def test_round_trip(self):
+        decoded = self.decode(PLUGINS)
+
+        self.assertEqual(decoded, [ArchivedPlugin(**plugin) for plugin in PLUGINS])
+        self.assertTrue(all(type(plugin) is ArchivedPlugin for plugin in decoded))
+
+    def test_archived_plugins_are_compact(self):
+        first, second = self.decode(PLUGINS), self.decode(PLUGINS)
+
+        self.assertFalse(hasattr(first[1], '__dict__'))
+        # Plugin types and field names are shared by all action data
+        self.assertIs(first[1].plugin_type, second[1].plugin_type)
+        self.assertIs(list(first[1].data)[0], list(second[1].data)[0])
+
+    def test_empty_list(self):
+        self.assertEqual(self.decode([]), [])
+
+    def test_types_and_field_names_are_stored_once(self):
+        encoded = columns.encode_plugins(PLUGINS)
+
+        self.assertEqual(encoded['types'], ['RowPlugin', 'LinkPlugin'])
+        self.assertEqual(encoded['type'], [0, 1, 1, 1, 0])
+        self.assertEqual(encoded['fields'], [['title'], ['name', 'external_link'], ['name']])
+        self.assertEqual(encoded['shape'], [0, 1, 1, 2, None])
+        self.assertEqual(encoded['pk'], [7, 1, -5, 9, 1])
+
+    def test_unknown_version(self):
+        encoded = columns.encode_plugins(PLUGINS)
+        encoded[columns.COLUMNS_KEY] = 2
+
+        with self.assertRaises(ValueError):
+            columns.decode_plugins(encoded)
+
+    def test_stream(self):
+        stream = columns.PluginStream(json.loads(dump_json(columns.encode_plugins(PLUGINS))))
+        chunks = list(stream.iter_chunks(size=2))
+
+        self.assertEqual(len(stream), 5)
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(list(stream), [plugin for chunk in chunks for plugin in chunk])
+        self.assertEqual(list(stream), self.decode(PLUGINS))
+
+    def test_stream_order(self):
+        self.assertTrue(columns.PluginStream(columns.encode_plugins(PLUGINS)).is_ordered())
+        self.assertFalse(columns.PluginStream(columns.encode_plugins(PLUGINS[::-1])).is_ordered())
+
+    @override_settings(DJANGOCMS_HISTORY_COMPRESSION=None)
+    def test_action_data_round_trip(self):
+        action = PlaceholderAction(pre_action_data=dump_action_data({'parent_id': 7, 'plugins': PLUGINS}))
+        data = action.get_pre_action_data()
+
+        self.assertEqual(data['parent_id'], 7)
+        self.assertEqual(data['plugins'], [ArchivedPlugin(**plugin) for plugin in PLUGINS])
+
+    def test_rowwise_action_data_is_read(self):
+        # As stored by earlier versions
+        action = PlaceholderAction(pre_action_data=dump_json({'parent_id': 7, 'plugins': PLUGINS}))
+        self.assertEqual(
+            action.get_pre_action_data()['plugins'],
+            [ArchivedPlugin(**plugin) for plugin in PLUGINS],
+        )
+
+
+class PluginColumnsActionTestCase(HistoryTestCase):
+
+    @override_settings(DJANGOCMS_HISTORY_COMPRESSION=None)
+    def test_subtree_is_stored_column_wise(self):
+        parent = self.add_plugin(name='parent')
+        children = [self.add_plugin(parent=parent, name='child {}'.format(index)) for index in range(3)]
+        tree = self.tree(self.placeholder)
+
+        with self.login_user_context(self.superuser):
+            self.delete_plugin_via_endpoint(parent)
+            action = self.latest_operation().actions.get()
+            plugins = json.loads(action.pre_action_data)['plugins']
+
+            self.assertEqual(plugins['types'], ['LinkPlugin'])
+            self.assertEqual(list(plugins['pk']), [parent.pk] + [1] * len(children))
+
+            self.undo()
+
+        self.assertEqual(self.tree(self.placeholder), tree)
+
+    @patch.object(columns, 'CHUNK_SIZE', 2)
+    def test_restore_in_chunks(self):
+        parent = self.add_plugin(name='parent')
+        child = self.add_plugin(parent=parent, name='child')
+        self.add_plugin(parent=child, name='grandchild')
+        self.add_plugin(parent=parent, name='second child')
+        self.add_plugin(name='sibling')
+        tree = self.tree(self.placeholder)
+
+        with self.login_user_context(self.superuser):
+            self.clear_placeholder_via_endpoint(self.placeholder)
+            action = self.latest_operation().actions.get()
+            self.assertIsInstance(action.stream_pre_action_data()['plugins'], columns.PluginStream)
+
+            self.undo()
+
+        self.assertEqual(self.tree(self.placeholder), tree)
+
+    @patch.object(columns, 'CHUNK_SIZE', 2)
+    def test_parents_restored_by_earlier_chunks_are_not_looked_up(self):
+        parent = self.add_plugin(name='parent')
+        child = self.add_plugin(parent=parent, name='child')
+        self.add_plugin(parent=child, name='grandchild')
+        self.add_plugin(parent=parent, name='second child')
+        tree = self.tree(self.placeholder)
+
+        with self.login_user_context(self.superuser):
+            self.clear_placeholder_via_endpoint(self.placeholder)
+        action = self.latest_operation().actions.get()
+
+        with CaptureQueriesContext(connection) as ctx:
+            _restore_archived_plugins(action, action.stream_pre_action_data())
+
+        self.assertEqual(self.tree(self.placeholder), tree)
+        parent_lookups = [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith('SELECT "cms_cmsplugin"."id" FROM "cms_cmsplugin" WHERE')
+        ]
+        self.assertEqual(parent_lookups, [])
+
+    def test_missing_snapshots(self):
+        encoded = columns.encode_plugins(PLUGINS[:1], snapshots={})
+        encoded['data'] = ['0' * 32]
+
+        with self.assertRaises(snapshot_store.MissingSnapshotError):
+            columns.decode_plugins(encoded)
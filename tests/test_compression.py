@@ -0,0 +1,151 @@
+import json
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from djangocms_history import compression
+from djangocms_history.columns import encode_plugins
+from djangocms_history.models import CompressionDictionary, compress_harder, dump_json
+
+from .base import HistoryTestCase
+
+PLUGINS = {
+    'parent_id': None,
+    'plugins': [
+        {
+            'pk': index,
+            'creation_date': '2026-10-18T12:00:00Z',
+            'position': index,
+            'plugin_type': 'LinkPlugin',
+            'parent_id': None,
+            'data': {'name': 'Link {}'.format(index), 'external_link': 'https://www.django-cms.org'},
+        }
+        for index in range(1, 101)
+    ],
+}
+
+
+class CompressionTestCase(SimpleTestCase):
+
+    def test_round_trips(self):
+        text = dump_json(PLUGINS)
+
+        for method in ('zlib', 'lzma'):
+            with self.subTest(method=method):
+                value = compression.compress(text, method=method)
+                self.assertTrue(compression.is_compressed(value))
+                self.assertEqual(compression.decompress(value), text)
+
+    def test_plugin_lists_shrink(self):
+        text = dump_json(PLUGINS)
+        self.assertLess(len(compression.compress(text)) * 5, len(text))
+
+    def test_short_data_is_stored_as_is(self):
+        text = dump_json({'parent_id': None})
+        self.assertEqual(compression.compress(text), text)
+
+    def test_plain_json_is_read_as_is(self):
+        text = dump_json(PLUGINS)
+        self.assertFalse(compression.is_compressed(text))
+        self.assertEqual(compression.decompress(text), text)
+
+    @override_settings(DJANGOCMS_HISTORY_COMPRESSION=None)
+    def test_disabled(self):
+        text = dump_json(PLUGINS)
+        self.assertEqual(compression.compress(text), text)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            compression.decompress('~qabc')
+
+    def test_compress_harder(self):
+        text = dump_json(PLUGINS)
+        value = compression.compress(text)
+        harder = compress_harder(value)
+
+        self.assertLessEqual(len(harder), len(value))
+        self.assertEqual(compression.decompress(harder), text)
+
+
+@override_settings(DJANGOCMS_HISTORY_COMPRESSION_DICTIONARY=True)
+class PresetDictionaryTestCase(TestCase):
+
+    def test_preset_dictionary(self):
+        text = dump_json({'plugins': encode_plugins(PLUGINS['plugins'][:3])}, separators=(',', ':'))
+        value = compression.compress(text)
+
+        self.assertTrue(value.startswith(compression.MARKER + compression.ZLIB_DICTIONARY))
+        self.assertEqual(compression.decompress(value), text)
+
+        with override_settings(DJANGOCMS_HISTORY_COMPRESSION_DICTIONARY=False):
+            self.assertLess(len(value), len(compression.compress(text)))
+
+    def test_earlier_dictionary(self):
+        text = dump_json(PLUGINS)
+        value = compression.compress(text)
+        self.addCleanup(compression.get_dictionary.cache_clear)
+
+        # As if the installed plugins had changed since
+        with patch.object(compression, 'ACTION_DATA_KEYS', ('{"changed":',)):
+            compression.get_dictionary.cache_clear()
+            self.assertNotEqual(value[2:2 + compression.DICTIONARY_ID_LENGTH], compression.get_dictionary()[0])
+            self.assertEqual(compression.decompress(value), text)
+
+    def test_unknown_dictionary(self):
+        value = compression.compress(dump_json(PLUGINS))
+        dictionary_id = value[2:2 + compression.DICTIONARY_ID_LENGTH]
+        value = value.replace(dictionary_id, '0' * compression.DICTIONARY_ID_LENGTH, 1)
+
+        with self.assertRaises(compression.UnknownDictionaryError):
+            compression.decompress(value)
+
+
+class CompressedActionDataTestCase(HistoryTestCase):
+
+    def test_action_data_is_stored_compressed(self):
+        for index in range(20):
+            self.add_plugin(name='Link {}'.format(index))
+
+        with self.login_user_context(self.superuser):
+            self.clear_placeholder_via_endpoint(self.placeholder)
+            action = self.latest_operation().actions.get()
+
+            self.assertTrue(compression.is_compressed(action.pre_action_data))
+            self.assertEqual(len(action.get_pre_action_data()['plugins']), 20)
+
+            self.undo()
+
+        self.assertEqual(self.placeholder.get_plugins('en').count(), 20)
+
+    def test_plain_json_action_data_is_read(self):
+        plugin = self.add_plugin(name='legacy')
+
+        with self.login_user_context(self.superuser):
+            self.delete_plugin_via_endpoint(plugin)
+            action = self.latest_operation().actions.get()
+            pre_data = json.loads(compression.decompress(action.pre_action_data))
+            action.pre_action_data = json.dumps(pre_data)
+            action.save()
+
+            self.undo()
+
+        self.assertEqual(self.placeholder.get_plugins('en').get().pk, plugin.pk)
+
+    @override_settings(DJANGOCMS_HISTORY_COMPRESSION_DICTIONARY=True)
+    def test_action_data_of_an_unknown_dictionary_is_not_replayed(self):
+        plugin = self.add_plugin(name='Link ' * 100)
+
+        with self.login_user_context(self.superuser):
+            self.delete_plugin_via_endpoint(plugin)
+            action = self.latest_operation().actions.get()
+            self.assertTrue(action.pre_action_data.startswith(compression.MARKER + compression.ZLIB_DICTIONARY))
+            CompressionDictionary.objects.all().delete()
+            compression._stored_dictionaries.clear()
+
+            with patch.object(compression, 'ACTION_DATA_KEYS', ('{"changed":',)):
+                compression.get_dictionary.cache_clear()
+                self.addCleanup(compression.get_dictionary.cache_clear)
+                response = self.post_undo()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.placeholder.get_plugins('en').exists())
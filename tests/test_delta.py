@@ -0,0 +1,142 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from djangocms_history import delta
+
+from .base import HistoryTestCase
+
+TEXT = ' '.join('word{}'.format(index) for index in range(400))
+
+
+class DeltaEncodingTestCase(SimpleTestCase):
+
+    def assert_round_trip(self, base, value):
+        operations = delta.encode(base, value)
+        self.assertEqual(delta.decode(base, operations), value)
+        return operations
+
+    def test_round_trips(self):
+        cases = [
+            (TEXT, TEXT.replace('word200', 'changed')),
+            (TEXT, 'intro ' + TEXT),
+            (TEXT, TEXT + ' outro'),
+            (TEXT, TEXT.replace('word10 ', '').replace('word300', 'a, b; c')),
+            (TEXT, ''),
+            ('', TEXT),
+            ('ä € 漢字 ' * 50, 'ä € 漢 字 ' * 50),
+            (TEXT, TEXT),
+        ]
+
+        for base, value in cases:
+            with self.subTest(value=value[:20]):
+                self.assert_round_trip(base, value)
+
+    def test_one_word_edit_copies_the_rest(self):
+        operations = self.assert_round_trip(TEXT, TEXT.replace('word200', 'changed'))
+
+        self.assertEqual(
+            [operation for operation in operations if isinstance(operation, str)],
+            ['changed'],
+        )
+        self.assertEqual(len(operations), 3)
+
+    @patch.object(delta, '_MAX_CHUNKS', 10)
+    def test_changes_of_many_lines_are_stored_as_is(self):
+        words = TEXT.split(' ')
+        base = '\n'.join(' '.join(words[index:index + 10]) for index in range(0, len(words), 10))
+        value = base.replace('word10 ', 'ten ').replace('word300', 'three hundred')
+
+        operations = self.assert_round_trip(base, value)
+
+        inserted = [operation for operation in operations if isinstance(operation, str)]
+        self.assertEqual(len(inserted), 1)
+        self.assertTrue(inserted[0].startswith('ten ') and inserted[0].endswith('three hundred'))
+
+    @patch.object(delta, '_MAX_WORK', 0)
+    def test_word_comparisons_are_bounded(self):
+        value = TEXT.replace('word10 ', 'ten ').replace('word100', 'one hundred')
+
+        operations = self.assert_round_trip(TEXT, value)
+
+        inserted = [operation for operation in operations if isinstance(operation, str)]
+        self.assertEqual(len(inserted), 1)
+        self.assertTrue(inserted[0].startswith('ten ') and inserted[0].endswith('one hundred'))
+
+    @override_settings(DJANGOCMS_HISTORY_DELTA_THRESHOLD=100)
+    def test_only_long_texts_are_encoded(self):
+        previous_data = {'body': TEXT, 'title': 'short title', 'count': 1}
+        data = {'body': TEXT.replace('word5', 'five'), 'title': 'other title', 'count': 2}
+
+        encoded = delta.encode_fields(data, previous_data)
+
+        self.assertTrue(delta.is_delta(encoded['body']))
+        self.assertEqual(encoded['title'], 'other title')
+        self.assertEqual(delta.decode_fields(encoded, previous_data), data)
+
+    @override_settings(DJANGOCMS_HISTORY_DELTA_THRESHOLD=100)
+    def test_rewritten_texts_are_stored_as_is(self):
+        previous_data = {'body': TEXT}
+        data = {'body': 'x' * len(TEXT)}
+
+        self.assertEqual(delta.encode_fields(data, previous_data), data)
+
+    @override_settings(DJANGOCMS_HISTORY_DELTA_THRESHOLD=0)
+    def test_disabled(self):
+        data = {'body': TEXT.replace('word5', 'five')}
+        self.assertEqual(delta.encode_fields(data, {'body': TEXT}), data)
+
+
+@override_settings(DJANGOCMS_HISTORY_DELTA_THRESHOLD=100)
+class DeltaEncodedChangeTestCase(HistoryTestCase):
+
+    def test_long_text_change_round_trip(self):
+        before = ' '.join('link{}'.format(index) for index in range(30))
+        after = before.replace('link20', 'changed')
+        plugin = self.add_plugin(name=before)
+
+        with self.login_user_context(self.superuser):
+            self.change_plugin_via_endpoint(
+                plugin,
+                name=after,
+                external_link='https://www.django-cms.org',
+            )
+
+            action = self.latest_operation().actions.get()
+            self.assertNotIn(after, action.post_action_data)
+            self.assertEqual(action.get_post_action_data()['plugins'][0].data, {'name': after})
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, before)
+
+            self.redo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, after)
+
+    @override_settings(DJANGOCMS_HISTORY_COALESCE_WINDOW=60)
+    def test_coalesced_long_text_changes_round_trip(self):
+        before = ' '.join('link{}'.format(index) for index in range(30))
+        first = before.replace('link20', 'changed')
+        second = first.replace('link5', 'changed again')
+        plugin = self.add_plugin(name=before)
+
+        with self.login_user_context(self.superuser):
+            for name in (first, second):
+                self.change_plugin_via_endpoint(
+                    plugin,
+                    name=name,
+                    external_link='https://www.django-cms.org',
+                )
+
+            action = self.latest_operation().actions.get()
+            self.assertNotIn(second, action.post_action_data)
+            self.assertEqual(action.get_post_action_data()['plugins'][0].data, {'name': second})
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, before)
+
+            self.redo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, second)
@@ -1,23 +1,40 @@
+import warnings
 from types import SimpleNamespace
 from unittest.mock import Mock, patch
 
+from django.core import serializers
 from django.test import RequestFactory
 
+from cms.api import add_plugin
 from cms.models import CMSPlugin
+from cms.test_utils.project.pluginapp.plugins.manytomany_rel.models import Section
+from cms.utils.plugins import get_bound_plugins as get_cms_bound_plugins
 
+from djangocms_history import helpers
 from djangocms_history.helpers import (
     OBJECT_ENDPOINT_URL_NAMES,
+    PluginDataExtractor,
+    clear_operation_origin_cache,
     delete_plugins,
     get_bound_plugins,
+    get_history_context,
     get_operation_origin,
     get_operations_from_request,
+    get_plugin_data,
+    get_plugins_data,
 )
+from djangocms_history.utils import get_plugin_fields
 
 from .base import HistoryTestCase
 
 
 class OperationOriginHelperTestCase(HistoryTestCase):
 
+    def setUp(self):
+        super().setUp()
+        clear_operation_origin_cache()
+        self.addCleanup(clear_operation_origin_cache)
+
     @patch('djangocms_history.helpers.resolve')
     def test_object_endpoint_supports_named_url_arguments(self, resolve):
         resolve.return_value = SimpleNamespace(
@@ -41,7 +58,7 @@ class OperationOriginHelperTestCase(HistoryTestCase):
 
 class PluginHelperTestCase(HistoryTestCase):
 
-    def test_get_bound_plugins_downcasts_and_preserves_missing_plugins(self):
+    def test_deprecated_get_bound_plugins_downcasts_and_preserves_missing_plugins(self):
         plugin = self.add_plugin(name='bound')
         base_plugin = CMSPlugin.objects.get(pk=plugin.pk)
         missing_plugin = SimpleNamespace(
@@ -49,8 +66,13 @@ class PluginHelperTestCase(HistoryTestCase):
             plugin_type=base_plugin.plugin_type,
         )
 
-        bound_plugin, fallback = get_bound_plugins([base_plugin, missing_plugin])
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            bound_plugin, fallback = get_bound_plugins([base_plugin, missing_plugin])
 
+        [warning] = [warning for warning in caught if 'get_bound_plugins' in str(warning.message)]
+        self.assertIs(warning.category, DeprecationWarning)
+        self.assertEqual(warning.filename, __file__)
         self.assertEqual(bound_plugin.pk, plugin.pk)
         self.assertEqual(bound_plugin.name, 'bound')
         self.assertIs(fallback, missing_plugin)
@@ -91,3 +113,142 @@ class OperationQueryHelperTestCase(HistoryTestCase):
 
         get_language.assert_called_once_with(request)
         self.assertEqual(len(operations), 1)
+
+
+class HistoryContextTestCase(HistoryTestCase):
+
+    def get_request(self):
+        request = RequestFactory().get(self.page.get_absolute_url('en'))
+        request.user = self.superuser
+        request.session = self.client.session
+        return request
+
+    def test_context_is_shared_by_the_request(self):
+        request = self.get_request()
+        self.assertIs(get_history_context(request), get_history_context(request))
+
+    def test_operations_are_looked_up_once_per_request(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint(name='first')
+            self.add_plugin_via_endpoint(name='second')
+            self.undo()
+            context = get_history_context(self.get_request())
+
+            with self.assertNumQueries(2):
+                active = context.get_active_operation(language='en')
+                inactive = context.get_inactive_operation(language='en')
+
+            with self.assertNumQueries(0):
+                self.assertEqual(context.get_active_operation(language='en'), active)
+                self.assertEqual(context.get_inactive_operation(language='en'), inactive)
+
+        first, second = self.operations().order_by('date_created')
+        self.assertEqual(active, first)
+        self.assertEqual(inactive, second)
+
+    def test_recorded_operation_is_active_without_queries(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint()
+            context = get_history_context(self.get_request())
+            operation = self.latest_operation()
+            context.record(operation)
+
+            with self.assertNumQueries(0):
+                self.assertIs(context.get_active_operation(operation.origin, 'en'), operation)
+                self.assertIsNone(context.get_inactive_operation(operation.origin, 'en'))
+
+    def test_invalidate_forgets_the_operations(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint()
+            context = get_history_context(self.get_request())
+            context.get_inactive_operation(language='en')
+            context.invalidate()
+
+            with self.assertNumQueries(1):
+                context.get_active_operation(language='en')
+
+
+def serialize_plugin(plugin):
+    # The plugin snapshot as built with the python serializer
+    fields = get_plugin_fields(plugin.plugin_type)
+    return {
+        'pk': plugin.pk,
+        'creation_date': plugin.creation_date,
+        'position': plugin.position,
+        'plugin_type': plugin.plugin_type,
+        'parent_id': plugin.parent_id,
+        'data': serializers.serialize('python', (plugin,), fields=fields)[0]['fields'],
+    }
+
+
+class PluginDataTestCase(HistoryTestCase):
+
+    def add_plugins(self):
+        section = Section.objects.create(name='Section')
+        parent = self.add_plugin(name='parent')
+        self.add_plugin(parent=parent, name='child', external_link='')
+        article = add_plugin(self.placeholder, 'ArticlePlugin', 'en', target=parent, title='article')
+        article.sections.add(section)
+        return CMSPlugin.objects.filter(placeholder=self.placeholder).order_by('position')
+
+    def test_matches_the_serializer(self):
+        plugins = self.add_plugins()
+        expected = [serialize_plugin(plugin) for plugin in get_cms_bound_plugins(list(plugins))]
+
+        self.assertEqual(get_plugins_data(list(plugins)), expected)
+        self.assertEqual(
+            [get_plugin_data(plugin) for plugin in get_cms_bound_plugins(list(plugins))],
+            expected,
+        )
+
+    def test_reads_one_query_per_model(self):
+        plugins = list(self.add_plugins())
+
+        # The links, the articles and their sections
+        with self.assertNumQueries(3):
+            get_plugins_data(plugins)
+
+    def test_plugin_models_are_joined_in_one_query(self):
+        parent = self.add_plugin(name='parent')
+        add_plugin(self.placeholder, 'PluginWithFKFromModel', 'en', target=parent, title='title')
+        add_plugin(self.placeholder, 'BuggyPlugin', 'en', target=parent)
+        plugins = list(CMSPlugin.objects.filter(placeholder=self.placeholder).order_by('position'))
+        expected = [serialize_plugin(plugin) for plugin in get_cms_bound_plugins(list(plugins))]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_plugins_data(plugins), expected)
+
+        with patch.object(helpers, 'MAX_JOINED_MODELS', 1):
+            with self.assertNumQueries(2):
+                self.assertEqual(get_plugins_data(plugins), expected)
+
+    def test_bound_plugins_are_not_read_again(self):
+        plugins = [self.add_plugin(name=str(index)) for index in range(3)]
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_plugins_data(plugins),
+                [serialize_plugin(plugin) for plugin in plugins],
+            )
+
+    def test_plugin_model_without_fields_is_not_joined(self):
+        model = type(self.add_plugin())
+        self.assertEqual(PluginDataExtractor(model, ('cmsplugin_ptr',)).lookups, [])
+
+    def test_row_data_of_fields_that_need_an_instance(self):
+        plugin = self.add_plugin(name='name')
+        extractor = PluginDataExtractor(type(plugin), ('cmsplugin_ptr', 'name', 'external_link'))
+        extractor.plain_fields = [False] * len(extractor.fields)
+
+        self.assertEqual(
+            extractor.get_row_data((plugin.pk, 'name', 'https://www.django-cms.org')),
+            serialize_plugin(plugin)['data'],
+        )
+
+    def test_leaves_out_missing_plugins_and_their_descendants(self):
+        plugins = list(self.add_plugins())
+        other = self.add_plugin(name='other')
+        plugins.append(CMSPlugin.objects.get(pk=other.pk))
+        type(other).objects.filter(pk=plugins[0].pk)._raw_delete('default')
+
+        self.assertEqual([data['pk'] for data in get_plugins_data(plugins)], [other.pk])
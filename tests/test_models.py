@@ -8,7 +8,7 @@ from cms.models import Placeholder
 from djangocms_history import actions
 from djangocms_history.datastructures import ArchivedPlugin
 from djangocms_history.helpers import get_plugin_data
-from djangocms_history.models import PlaceholderOperation
+from djangocms_history.models import PlaceholderAction, PlaceholderOperation
 
 from .base import HistoryTestCase
 
@@ -76,6 +76,112 @@ class ActionDataTestCase(HistoryTestCase):
         self.assertEqual(parse.call_count, 2)
 
 
+class ActionSummaryTestCase(HistoryTestCase):
+    """
+    The plugin an action centers on is recorded in columns when the action
+    data is written, so the undo/redo responses don't parse the data.
+    """
+
+    def assert_summary(self, action, plugin, parent_id, plugin_count):
+        self.assertEqual(action.root_plugin_id, plugin.pk)
+        self.assertEqual(action.root_plugin_type, plugin.plugin_type)
+        self.assertEqual(action.parent_id, parent_id)
+        self.assertEqual(action.plugin_count, plugin_count)
+        self.assertEqual(
+            action.payload_bytes,
+            len(action.pre_action_data.encode()) + len(action.post_action_data.encode()),
+        )
+
+    def test_actions_are_summarized(self):
+        parent = self.add_plugin(name='parent')
+        child = self.add_plugin(parent=parent, name='child')
+        self.add_plugin(parent=child, name='grandchild')
+
+        with self.login_user_context(self.superuser):
+            self.delete_plugin_via_endpoint(child)
+            self.assert_summary(self.latest_operation().actions.get(), child, parent.pk, 1)
+
+            added = self.add_plugin_via_endpoint(parent=parent)
+            self.assert_summary(self.latest_operation().actions.get(), added, parent.pk, 1)
+
+            self.move_plugin_via_endpoint(added, target_position=1)
+            self.assert_summary(self.latest_operation().actions.get(), added, None, 1)
+
+    @override_settings(DJANGOCMS_HISTORY_COMPRESSION=None)
+    def test_payload_is_measured_in_bytes(self):
+        plugin = self.add_plugin(name='Grüße aus Köln')
+
+        with self.login_user_context(self.superuser):
+            self.change_plugin_via_endpoint(
+                plugin,
+                name='Grüße aus Zürich',
+                external_link='https://www.django-cms.org',
+            )
+            self.delete_plugin_via_endpoint(plugin)
+
+        for operation in self.operations():
+            action = operation.actions.get()
+            self.assertIn('ü', action.pre_action_data)
+            self.assert_summary(action, plugin, None, 1)
+
+    def test_actions_without_plugins(self):
+        with self.login_user_context(self.superuser):
+            self.clear_placeholder_via_endpoint(self.placeholder)
+
+        action = self.latest_operation().actions.get()
+        self.assertEqual(action.plugin_count, 0)
+        self.assertIsNone(action.root_plugin_id)
+
+    def test_inspection_does_not_parse_the_action_data(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change_plugin_via_endpoint(
+                plugin,
+                name='after',
+                external_link='https://www.django-cms.org',
+            )
+            change = self.latest_operation()
+            self.move_plugin_via_endpoint(self.add_plugin(name='moved'), target_position=1)
+            move = self.latest_operation()
+
+        with patch.object(PlaceholderAction, '_get_parsed_data') as parse:
+            self.assertEqual(
+                change.get_close_frame_target(),
+                ('edit', plugin.pk, 'LinkPlugin', None),
+            )
+            self.assertIsNotNone(move.get_move_plugin_id())
+
+        parse.assert_not_called()
+
+    def test_actions_recorded_before_the_summary(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change_plugin_via_endpoint(
+                plugin,
+                name='after',
+                external_link='https://www.django-cms.org',
+            )
+            change = self.latest_operation()
+            self.move_plugin_via_endpoint(plugin, target_position=1)
+            move = self.latest_operation()
+
+        PlaceholderAction.objects.update(
+            root_plugin_id=None,
+            root_plugin_type='',
+            plugin_count=None,
+            payload_bytes=None,
+        )
+        change = PlaceholderOperation.objects.get(pk=change.pk)
+        move = PlaceholderOperation.objects.get(pk=move.pk)
+        self.assertEqual(
+            change.get_close_frame_target(),
+            ('edit', plugin.pk, 'LinkPlugin', None),
+        )
+        self.assertEqual(move.get_move_plugin_id(), plugin.pk)
+
+
 class ArchiveOnLoginTestCase(HistoryTestCase):
 
     @override_settings(DJANGOCMS_HISTORY_ARCHIVE_OPERATIONS=True)
@@ -1,10 +1,29 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+from django.apps import apps
 from django.conf import settings
-from django.test import override_settings
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 
 from cms import operations
-
-from djangocms_history import actions
-from djangocms_history.models import PlaceholderOperation
+from cms.models import CMSPlugin
+from cms.signals import post_placeholder_operation, pre_placeholder_operation
+
+from djangocms_history import actions, models, outbox, signals, snapshots
+from djangocms_history.models import (
+    OutboxEntry,
+    PlaceholderAction,
+    PlaceholderOperation,
+    PluginSnapshotReference,
+    delete_operations,
+    get_operation_size,
+    get_staged_operations,
+)
 from djangocms_history.utils import get_session_key_hash
 
 from .base import HistoryTestCase
@@ -94,6 +113,23 @@ class OperationRecordingTestCase(HistoryTestCase):
         self.assertEqual(action.get_pre_action_data()['plugins'][0].data['name'], 'before')
         self.assertEqual(action.get_post_action_data()['plugins'][0].data['name'], 'after')
 
+    def test_unchanged_plugin_save_is_not_recorded(self):
+        plugin = self.add_plugin(name='same')
+
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint(name='first')
+            self.undo()
+            self.change_plugin_via_endpoint(
+                plugin,
+                name='same',
+                external_link='https://www.django-cms.org',
+            )
+
+        # Nothing was recorded and the undone operation can still be redone.
+        operation = self.latest_operation()
+        self.assertEqual(operation.operation_type, operations.ADD_PLUGIN)
+        self.assertFalse(operation.is_applied)
+
     def test_delete_plugin_records_subtree(self):
         parent = self.add_plugin(name='parent')
         child = self.add_plugin(parent=parent, name='child')
@@ -343,3 +379,459 @@ class OperationRecordingTestCase(HistoryTestCase):
 
         first.refresh_from_db()
         self.assertTrue(first.is_archived)
+
+
+class StagedRecordingTestCase(HistoryTestCase):
+    """
+    An operation and its actions are kept in memory between the pre and the
+    post operation signal and written at once when the post signal fires.
+    """
+
+    def test_operation_without_post_signal_writes_nothing(self):
+        with self.login_user_context(self.superuser):
+            request = RequestFactory().get('/')
+            request.user = self.superuser
+            request.session = self.client.session
+
+            plugin = CMSPlugin(
+                plugin_type='LinkPlugin',
+                placeholder=self.placeholder,
+                language='en',
+                position=1,
+            )
+            pre_placeholder_operation.send(
+                sender=self.__class__,
+                operation=operations.ADD_PLUGIN,
+                request=request,
+                language='en',
+                token='pending-token',
+                origin=self.page.get_absolute_url('en'),
+                plugin=plugin,
+                placeholder=self.placeholder,
+            )
+
+        self.assertIn('pending-token', get_staged_operations(request))
+        self.assertEqual(PlaceholderOperation.objects.count(), 0)
+        self.assertEqual(PlaceholderAction.objects.count(), 0)
+
+    def test_actions_are_written_in_a_single_insert(self):
+        plugin = self.add_plugin(name='moves')
+        action_table = PlaceholderAction._meta.db_table
+
+        with self.login_user_context(self.superuser):
+            with CaptureQueriesContext(connection) as ctx:
+                self.move_plugin_via_endpoint(
+                    plugin,
+                    target_position=1,
+                    target_placeholder=self.sidebar,
+                )
+
+        action_writes = [
+            query['sql'] for query in ctx.captured_queries
+            if action_table in query['sql']
+            and query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE'))
+        ]
+        self.assertEqual(len(action_writes), 1, '\n'.join(action_writes))
+        self.assertTrue(action_writes[0].startswith('INSERT'))
+
+        operation = self.latest_operation()
+        self.assertTrue(operation.is_applied)
+        self.assertEqual(
+            list(operation.actions.values_list('action', flat=True)),
+            [actions.MOVE_OUT_PLUGIN, actions.MOVE_IN_PLUGIN],
+        )
+
+
+class RetirementQueryBudgetTestCase(HistoryTestCase):
+    """
+    Superseded operations are retired with a fixed number of statements
+    per recorded operation, however many of them there are.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.other_page, self.other_placeholder = self.create_other_page()
+        self.editor = self._create_user('editor', is_staff=True, is_superuser=True)
+
+    def create_operation(self, user, session_key, origin, is_applied=True):
+        operation = PlaceholderOperation.objects.create(
+            operation_type=operations.ADD_PLUGIN,
+            token='superseded',
+            origin=origin,
+            language='en',
+            user=user,
+            user_session_key=get_session_key_hash(session_key),
+            site_id=1,
+            is_applied=is_applied,
+        )
+        operation.create_action(actions.ADD_PLUGIN, 'en', self.placeholder, order=1)
+        return operation
+
+    def create_superseded_operations(self):
+        origin = self.page.get_absolute_url('en')
+        session_key = self.client.session.session_key
+        # Same session, other origin.
+        self.create_operation(self.superuser, session_key, self.other_page.get_absolute_url('en'))
+        # Same session, current origin, undone.
+        self.create_operation(self.superuser, session_key, origin, is_applied=False)
+        # Other user, current origin.
+        self.create_operation(self.editor, 'other-session', origin)
+
+    @contextmanager
+    def capture_history_queries(self):
+        """
+        Captures every statement on the history tables (snapshot tables
+        included) run while the operation is recorded, by the pre and post
+        operation receivers, leaving out the lookups the CMS views make on
+        their own.
+        """
+        tables = [model._meta.db_table for model in apps.get_app_config('djangocms_history').get_models()]
+        history_queries = []
+
+        def capturing(receiver):
+            def capture(sender, **kwargs):
+                with CaptureQueriesContext(connection) as ctx:
+                    receiver(sender, **kwargs)
+                history_queries.extend(
+                    query['sql'] for query in ctx.captured_queries
+                    if any(table in query['sql'] for table in tables)
+                )
+            return capture
+
+        for signal, receiver in (
+            (pre_placeholder_operation, models.create_placeholder_operation),
+            (post_placeholder_operation, models.update_placeholder_operation),
+        ):
+            capture = capturing(receiver)
+            signal.disconnect(receiver)
+            signal.connect(capture)
+            self.addCleanup(signal.connect, receiver)
+            self.addCleanup(signal.disconnect, capture)
+
+        yield history_queries
+
+    def get_writes(self, history_queries):
+        return [
+            sql for sql in history_queries
+            if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+
+    def test_superseded_operations_are_deleted_together(self):
+        with self.login_user_context(self.superuser):
+            self.create_superseded_operations()
+
+            with self.capture_history_queries() as history_queries:
+                self.add_plugin_via_endpoint()
+
+        self.assertEqual(PlaceholderOperation.objects.count(), 1)
+        writes = self.get_writes(history_queries)
+        # The operation and its action are inserted; the superseded
+        # operations are deleted together with their actions, outbox
+        # entries and snapshot references, in one statement per table.
+        self.assertEqual(len(writes), 6, '\n'.join(writes))
+        self.assertFalse([sql for sql in writes if sql.lstrip().upper().startswith('UPDATE')])
+        # Plus the lookups of the superseded operations and of the snapshots
+        # they referenced.
+        self.assertEqual(len(history_queries), 8, '\n'.join(history_queries))
+
+    @override_settings(DJANGOCMS_HISTORY_ARCHIVE_OPERATIONS=True)
+    def test_superseded_operations_are_archived_in_one_update(self):
+        with self.login_user_context(self.superuser):
+            self.create_superseded_operations()
+
+            with self.capture_history_queries() as history_queries:
+                self.add_plugin_via_endpoint()
+
+        self.assertEqual(PlaceholderOperation.objects.filter(is_archived=False).count(), 1)
+        writes = self.get_writes(history_queries)
+        self.assertEqual(len(writes), 3, '\n'.join(writes))
+        self.assertTrue(writes[2].lstrip().upper().startswith('UPDATE'))
+
+    @override_settings(DJANGOCMS_HISTORY_ARCHIVE_OPERATIONS=True)
+    def test_archived_operations_are_not_archived_again(self):
+        with self.login_user_context(self.superuser):
+            self.create_superseded_operations()
+            self.add_plugin_via_endpoint()
+
+            with self.capture_history_queries() as history_queries:
+                self.add_plugin_via_endpoint()
+
+        updates = [
+            sql for sql in self.get_writes(history_queries)
+            if sql.lstrip().upper().startswith('UPDATE')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('is_archived', updates[0])
+        self.assertEqual(PlaceholderOperation.objects.filter(is_archived=False).count(), 2)
+
+
+class ConcurrentEditingRetirementTestCase(HistoryTestCase):
+    """
+    Another user's operations are only retired when the new operation
+    changes one of the placeholders they touched.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.editor = self._create_user('editor', is_staff=True, is_superuser=True)
+
+        with self.login_user_context(self.editor):
+            self.add_plugin_via_endpoint(placeholder=self.sidebar)
+        self.editor_operation = self.latest_operation()
+
+    def test_operation_on_other_placeholder_keeps_foreign_history(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint(placeholder=self.placeholder)
+
+        self.assertTrue(PlaceholderOperation.objects.filter(pk=self.editor_operation.pk).exists())
+
+    def test_operation_on_shared_placeholder_retires_foreign_history(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint(placeholder=self.sidebar)
+
+        self.assertFalse(PlaceholderOperation.objects.filter(pk=self.editor_operation.pk).exists())
+
+    def test_move_retires_foreign_history_of_both_placeholders(self):
+        plugin = self.add_plugin(placeholder=self.placeholder)
+
+        with self.login_user_context(self.superuser):
+            self.move_plugin_via_endpoint(
+                plugin,
+                target_position=1,
+                target_placeholder=self.sidebar,
+            )
+
+        self.assertFalse(PlaceholderOperation.objects.filter(pk=self.editor_operation.pk).exists())
+
+
+@override_settings(DJANGOCMS_HISTORY_COALESCE_WINDOW=60)
+class CoalescingTestCase(HistoryTestCase):
+    """
+    Consecutive changes (or moves) of the same plugin within the coalesce
+    window are recorded as one operation.
+    """
+
+    def change(self, plugin, name):
+        return self.change_plugin_via_endpoint(
+            plugin,
+            name=name,
+            external_link='https://www.django-cms.org',
+        )
+
+    def test_consecutive_changes_are_merged(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            self.change(plugin, 'second')
+
+            operation = self.operations().get()
+            action = operation.actions.get()
+            self.assertEqual(action.get_pre_action_data()['plugins'][0].data['name'], 'before')
+            self.assertEqual(action.get_post_action_data()['plugins'][0].data['name'], 'second')
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'before')
+
+            self.redo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'second')
+
+    def test_changes_of_different_fields_are_merged(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'after')
+            self.change_plugin_via_endpoint(
+                plugin,
+                name='after',
+                external_link='https://example.com',
+            )
+
+            action = self.operations().get().actions.get()
+            self.assertEqual(
+                action.get_post_action_data()['plugins'][0].data,
+                {'name': 'after', 'external_link': 'https://example.com'},
+            )
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'before')
+            self.assertEqual(plugin.external_link, 'https://www.django-cms.org')
+
+    def test_changes_that_cancel_out_leave_no_operation(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            self.change(plugin, 'before')
+
+        self.assertFalse(PlaceholderOperation.objects.exists())
+
+    def test_changes_of_other_plugins_are_not_merged(self):
+        first = self.add_plugin(name='first')
+        second = self.add_plugin(name='second')
+
+        with self.login_user_context(self.superuser):
+            self.change(first, 'first changed')
+            self.change(second, 'second changed')
+
+        self.assertEqual(PlaceholderOperation.objects.count(), 2)
+
+    def test_operation_in_between_prevents_merging(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            self.add_plugin_via_endpoint(placeholder=self.sidebar)
+            self.change(plugin, 'second')
+
+        self.assertEqual(PlaceholderOperation.objects.count(), 3)
+
+    def test_changes_outside_the_window_are_not_merged(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            PlaceholderOperation.objects.update(
+                date_created=timezone.now() - timedelta(minutes=5),
+            )
+            self.change(plugin, 'second')
+
+        self.assertEqual(PlaceholderOperation.objects.count(), 2)
+
+    def test_consecutive_moves_are_merged(self):
+        plugins = [self.add_plugin(name=str(index)) for index in range(3)]
+        tree = self.tree(self.placeholder)
+
+        with self.login_user_context(self.superuser):
+            self.move_plugin_via_endpoint(plugins[0], target_position=2)
+            self.move_plugin_via_endpoint(plugins[0], target_position=3)
+            self.assertEqual(PlaceholderOperation.objects.count(), 1)
+
+            self.undo()
+            self.assertEqual(self.tree(self.placeholder), tree)
+
+    @override_settings(DJANGOCMS_HISTORY_COALESCE_WINDOW=0)
+    def test_disabled_by_default(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            self.change(plugin, 'second')
+
+        self.assertEqual(PlaceholderOperation.objects.count(), 2)
+
+
+class OperationSizeBudgetTestCase(HistoryTestCase):
+    """
+    An operation whose action data doesn't fit the size budget is not
+    recorded and clears the history it makes unreliable.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.sizes = []
+        signals.operation_size_exceeded.connect(self.receiver)
+        self.addCleanup(signals.operation_size_exceeded.disconnect, self.receiver)
+
+    def receiver(self, sender, operation, size, **kwargs):
+        self.sizes.append((operation.operation_type, size))
+
+    def test_oversized_operation_clears_the_history(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint(name='small')
+
+            with override_settings(DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET=300):
+                self.add_plugin_via_endpoint(name=get_random_string(240))
+
+        self.assertFalse(PlaceholderOperation.objects.exists())
+        self.assertEqual(len(self.sizes), 1)
+        operation_type, size = self.sizes[0]
+        self.assertEqual(operation_type, operations.ADD_PLUGIN)
+        self.assertGreater(size, 300)
+
+    def test_oversized_operation_retires_foreign_history(self):
+        editor = self._create_user('editor', is_staff=True, is_superuser=True)
+
+        with self.login_user_context(editor):
+            self.add_plugin_via_endpoint(name='small')
+
+        with self.login_user_context(self.superuser):
+            with override_settings(DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET=300):
+                self.add_plugin_via_endpoint(name=get_random_string(240))
+
+        self.assertFalse(PlaceholderOperation.objects.exists())
+
+    @override_settings(DJANGOCMS_HISTORY_COMPRESSION=None)
+    def test_budget_is_counted_in_bytes(self):
+        with self.login_user_context(self.superuser):
+            # 160 characters, over 300 bytes in UTF-8
+            with override_settings(DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET=300):
+                self.add_plugin_via_endpoint(name='ü' * 160)
+
+        self.assertFalse(PlaceholderOperation.objects.exists())
+        self.assertGreater(self.sizes[0][1], 300)
+
+    @override_settings(DJANGOCMS_HISTORY_COMPRESSION=None, DJANGOCMS_HISTORY_SNAPSHOT_STORE=True)
+    def test_deferred_snapshots_count_the_same_size(self):
+        # The pre data of a change is stored as a snapshot, referenced by
+        # the operation; the post data is built later with deferred snapshots.
+        plugin = self.add_plugin(name=get_random_string(200))
+
+        def change(budget, deferred):
+            with override_settings(
+                DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET=budget,
+                DJANGOCMS_HISTORY_DEFERRED_SNAPSHOTS=deferred,
+            ):
+                self.change_plugin_via_endpoint(
+                    plugin,
+                    name=get_random_string(200),
+                    external_link='https://www.django-cms.org',
+                )
+                outbox.process_entries(OutboxEntry.objects.all())
+
+            operation = PlaceholderOperation.objects.first()
+            size = operation and get_operation_size(
+                operation.actions.all(),
+                snapshots.fetch(
+                    PluginSnapshotReference.objects.filter(operation=operation).values_list('snapshot', flat=True)
+                ),
+            )
+            # Don't link the next change to this one.
+            delete_operations(PlaceholderOperation.objects.all())
+            return size
+
+        with self.login_user_context(self.superuser):
+            size = change(budget=None, deferred=False)
+
+            for deferred in (False, True):
+                with self.subTest(deferred=deferred):
+                    self.sizes.clear()
+                    self.assertEqual(change(budget=size, deferred=deferred), size)
+                    self.assertIsNone(change(budget=size - 1, deferred=deferred))
+                    self.assertEqual(self.sizes, [(operations.CHANGE_PLUGIN, size)])
+
+    def test_oversized_pre_data_skips_the_post_handler(self):
+        plugins = [self.add_plugin(name=get_random_string(200)) for index in range(10)]
+
+        with self.login_user_context(self.superuser):
+            with override_settings(DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET=1000):
+                handler = Mock()
+
+                with patch.dict(models._operation_handlers[operations.CLEAR_PLACEHOLDER], post=handler):
+                    self.clear_placeholder_via_endpoint(self.placeholder)
+
+        handler.assert_not_called()
+        self.assertFalse(PlaceholderOperation.objects.exists())
+        self.assertEqual(self.sizes[0][0], operations.CLEAR_PLACEHOLDER)
+        self.assertFalse(self.placeholder.get_plugins('en').filter(pk__in=[p.pk for p in plugins]).exists())
+
+    def test_operation_within_budget_is_recorded(self):
+        with self.login_user_context(self.superuser):
+            with override_settings(DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET=10000):
+                self.add_plugin_via_endpoint(name='small')
+
+        self.assertEqual(PlaceholderOperation.objects.count(), 1)
+        self.assertEqual(self.sizes, [])
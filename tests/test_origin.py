@@ -1,5 +1,8 @@
+from unittest.mock import patch
 from urllib.parse import urlencode
 
+from django.test import override_settings
+
 from cms.toolbar.utils import (
     get_object_edit_url,
     get_object_preview_url,
@@ -7,7 +10,12 @@ from cms.toolbar.utils import (
 )
 from cms.utils.urlutils import admin_reverse
 
-from djangocms_history.helpers import get_operation_origin
+from djangocms_history import helpers
+from djangocms_history.helpers import (
+    clear_operation_origin_cache,
+    get_operation_origin,
+    resolve_operation_origin,
+)
 
 from .base import HistoryTestCase
 
@@ -29,6 +37,51 @@ class OperationOriginTestCase(HistoryTestCase):
         self.assertEqual(get_operation_origin('/some/unknown/'), '/some/unknown/')
 
 
+class OperationOriginCacheTestCase(HistoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_operation_origin_cache()
+        self.addCleanup(clear_operation_origin_cache)
+
+    def test_matcher_agrees_with_the_resolver(self):
+        urls = [
+            get_object_edit_url(self.page_content, language)
+            for language in ('en', 'de')
+        ] + [
+            get_object_structure_url(self.page_content, 'en'),
+            get_object_preview_url(self.page_content, 'de'),
+            '/en/home/',
+            admin_reverse('cms_placeholder_add_plugin'),
+        ]
+
+        for url in urls:
+            path = url.split('?')[0]
+            self.assertEqual(get_operation_origin(url), resolve_operation_origin(path), url)
+
+    def test_object_endpoints_do_not_hit_the_resolver(self):
+        edit_url = get_object_edit_url(self.page_content, 'en')
+        expected = resolve_operation_origin(edit_url.split('?')[0])
+
+        with patch.object(helpers, 'resolve') as resolve:
+            self.assertEqual(get_operation_origin(edit_url), expected)
+        resolve.assert_not_called()
+
+    def test_origins_are_cached_per_path(self):
+        with patch.object(helpers, 'resolve', wraps=helpers.resolve) as resolve:
+            get_operation_origin('/en/home/?toolbar_on')
+            get_operation_origin('/en/home/?edit')
+            get_operation_origin('/en/home/')
+        resolve.assert_called_once_with('/en/home/')
+
+    def test_cache_is_cleared_when_the_urlconf_changes(self):
+        get_operation_origin('/en/home/')
+        self.assertEqual(helpers._get_canonical_origin.cache_info().currsize, 1)
+
+        with override_settings(ROOT_URLCONF='tests.urls'):
+            self.assertEqual(helpers._get_canonical_origin.cache_info().currsize, 0)
+
+
 class StructureBoardStateTestCase(HistoryTestCase):
     """
     The undo/redo buttons must reflect the correct state on the structure
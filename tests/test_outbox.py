@@ -0,0 +1,189 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils.crypto import get_random_string
+
+from djangocms_history import actions, outbox, signals
+from djangocms_history.models import OutboxEntry, PlaceholderOperation
+
+from .base import HistoryTestCase
+from .test_undo_redo import UndoRedoRoundTripMixin
+
+
+@override_settings(DJANGOCMS_HISTORY_DEFERRED_SNAPSHOTS=True)
+class DeferredSnapshotTestCase(UndoRedoRoundTripMixin, HistoryTestCase):
+    """
+    With deferred snapshots the request only records the plugin ids of the
+    post data; the data itself is built from the outbox later.
+    """
+
+    def test_post_data_is_deferred_to_the_outbox(self):
+        with self.login_user_context(self.superuser):
+            plugin = self.add_plugin_via_endpoint(name='deferred')
+
+        operation = self.latest_operation()
+        action = operation.actions.get()
+        self.assertEqual(action.post_action_data, '')
+        self.assertEqual(operation.outbox_entries.get().action, actions.ADD_PLUGIN)
+
+        out = StringIO()
+        call_command('process_history_outbox', stdout=out)
+        self.assertIn('Processed 1', out.getvalue())
+        self.assertFalse(OutboxEntry.objects.exists())
+
+        post_data = operation.actions.get().get_post_action_data()
+        self.assertIsNone(post_data['parent_id'])
+        self.assertEqual(post_data['plugins'][0].pk, plugin.pk)
+        self.assertEqual(post_data['plugins'][0].data['name'], 'deferred')
+        self.assertEqual(operation.actions.get().root_plugin_id, plugin.pk)
+
+    def test_deferred_paste_records_the_whole_subtree(self):
+        parent = self.add_plugin(name='parent')
+        self.add_plugin(parent=parent, name='child')
+
+        with self.login_user_context(self.superuser):
+            clipboard_root = self.copy_plugin_to_clipboard_via_endpoint(parent)
+            self.paste_plugin_via_endpoint(
+                clipboard_root,
+                target_placeholder=self.sidebar,
+                target_position=1,
+            )
+
+        outbox.process_entries(OutboxEntry.objects.all())
+
+        post_data = self.latest_operation().actions.get().get_post_action_data()
+        root = self.sidebar.get_plugins('en').get(parent__isnull=True)
+        child = self.sidebar.get_plugins('en').get(parent=root)
+        self.assertEqual(
+            [(plugin.pk, plugin.parent_id, plugin.data['name']) for plugin in post_data['plugins']],
+            [(root.pk, None, 'parent'), (child.pk, root.pk, 'child')],
+        )
+
+    def test_undo_completes_pending_entries(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change_plugin_via_endpoint(
+                plugin,
+                name='after',
+                external_link='https://www.django-cms.org',
+            )
+            self.assertTrue(OutboxEntry.objects.exists())
+
+            self.undo()
+            self.assertFalse(OutboxEntry.objects.exists())
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'before')
+
+            self.redo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'after')
+
+    def test_next_operation_completes_pending_entries(self):
+        with self.login_user_context(self.superuser):
+            first = self.add_plugin_via_endpoint(name='first')
+            self.change_plugin_via_endpoint(
+                first,
+                name='changed',
+                external_link='https://www.django-cms.org',
+            )
+
+        add_operation = self.operations().first()
+        self.assertFalse(add_operation.outbox_entries.exists())
+        # The add snapshot was built before the change was applied.
+        post_data = add_operation.actions.get().get_post_action_data()
+        self.assertEqual(post_data['plugins'][0].data['name'], 'first')
+
+    def test_round_trip_with_deferred_snapshots(self):
+        self.add_plugin(name='first')
+        parent = self.add_plugin(name='second')
+        self.add_plugin(parent=parent, name='nested')
+
+        with self.login_user_context(self.superuser):
+            reference = self.copy_placeholder_to_clipboard_via_endpoint(self.placeholder)
+            self.snapshot_before(placeholders=[self.placeholder, self.sidebar])
+            self.paste_plugin_via_endpoint(
+                reference,
+                target_placeholder=self.sidebar,
+                target_position=1,
+            )
+            self.assert_round_trip(placeholders=[self.placeholder, self.sidebar])
+
+    def test_oversized_snapshot_discards_the_operation(self):
+        sizes = []
+
+        def receiver(sender, operation, size, **kwargs):
+            sizes.append(size)
+
+        signals.operation_size_exceeded.connect(receiver)
+        self.addCleanup(signals.operation_size_exceeded.disconnect, receiver)
+
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint(name='small')
+            self.add_plugin_via_endpoint(name=get_random_string(240))
+
+        with override_settings(DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET=300):
+            outbox.process_entries(OutboxEntry.objects.order_by('pk'))
+
+        self.assertFalse(PlaceholderOperation.objects.exists())
+        self.assertFalse(OutboxEntry.objects.exists())
+        self.assertEqual(len(sizes), 1)
+        self.assertGreater(sizes[0], 300)
+
+    def test_oversized_snapshot_retires_foreign_history(self):
+        editor = self._create_user('editor', is_staff=True, is_superuser=True)
+
+        with self.login_user_context(editor):
+            self.add_plugin_via_endpoint(name='small')
+
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint(name=get_random_string(240))
+
+        with override_settings(DJANGOCMS_HISTORY_OPERATION_SIZE_BUDGET=300):
+            outbox.process_entries(OutboxEntry.objects.filter(operation__user=self.superuser))
+
+        self.assertFalse(PlaceholderOperation.objects.exists())
+
+    def test_retired_operations_drop_their_entries(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint()
+
+        PlaceholderOperation.objects.all().delete()
+        self.assertFalse(OutboxEntry.objects.exists())
+
+    @override_settings(DJANGOCMS_HISTORY_DEFERRED_SNAPSHOT_THREADS=2)
+    def test_committed_operation_is_handed_to_the_thread_pool(self):
+        with patch.object(outbox, '_get_executor') as get_executor:
+            with self.login_user_context(self.superuser):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.add_plugin_via_endpoint()
+
+        get_executor.return_value.submit.assert_called_once_with(
+            outbox._process_operation_in_thread,
+            self.latest_operation().pk,
+        )
+
+    def test_failing_thread_logs_and_leaves_the_entry(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint()
+        operation = self.latest_operation()
+
+        with patch.object(OutboxEntry, 'process', side_effect=ValueError('broken')):
+            with patch.object(outbox.connections, 'close_all'):
+                with self.assertLogs('djangocms_history.outbox', 'ERROR') as logs:
+                    outbox._process_operation_in_thread(operation.pk)
+
+        self.assertIn('operation {}'.format(operation.pk), logs.output[0])
+        self.assertIn('ValueError: broken', logs.output[0])
+        self.assertEqual(OutboxEntry.objects.filter(operation=operation).count(), 1)
+
+    def test_without_threads_entries_wait_for_the_command(self):
+        with patch.object(outbox, '_get_executor') as get_executor:
+            with self.login_user_context(self.superuser):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.add_plugin_via_endpoint()
+
+        get_executor.assert_not_called()
+        self.assertEqual(OutboxEntry.objects.count(), 1)
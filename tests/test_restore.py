@@ -0,0 +1,121 @@
+import warnings
+from unittest.mock import patch
+
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+
+from cms.test_utils.project.pluginapp.plugins.link.models import Link
+from cms.test_utils.project.pluginapp.plugins.manytomany_rel.models import (
+    ArticlePluginModel,
+    PluginModelWithFKFromModel,
+)
+
+from djangocms_history.action_handlers import _restore_archived_plugins
+from djangocms_history.restore import get_row_builder
+
+from .base import HistoryTestCase
+
+
+def get_inserts(queries):
+    return [query['sql'] for query in queries if query['sql'].startswith('INSERT')]
+
+
+class BulkRestoreTestCase(HistoryTestCase):
+
+    def delete_subtree(self, size):
+        parent = self.add_plugin(name='parent', external_link='https://www.django-cms.org')
+
+        for index in range(size - 1):
+            self.add_plugin(parent=parent, name='child {}'.format(index), external_link='')
+        tree = self.tree(self.placeholder)
+
+        with self.login_user_context(self.superuser):
+            self.delete_plugin_via_endpoint(parent)
+        return self.latest_operation().actions.get(), tree
+
+    def restore(self, action):
+        with CaptureQueriesContext(connection) as queries:
+            _restore_archived_plugins(action, data=action.get_pre_action_data())
+        return get_inserts(queries)
+
+    def test_plugins_are_inserted_in_bulk(self):
+        action, tree = self.delete_subtree(10)
+
+        inserts = self.restore(action)
+
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(self.tree(self.placeholder), tree)
+        self.assertEqual(
+            list(Link.objects.order_by('position').values_list('name', 'external_link'))[:2],
+            [('parent', 'https://www.django-cms.org'), ('child 0', '')],
+        )
+
+    def test_models_overriding_save_are_restored_one_by_one(self):
+        action, tree = self.delete_subtree(3)
+
+        with patch.object(Link, 'save', lambda self, *args, **kwargs: None):
+            inserts = self.restore(action)
+
+        self.assertEqual(len(inserts), 6)
+        self.assertEqual(self.tree(self.placeholder), tree)
+
+    def test_models_with_receivers_are_restored_one_by_one(self):
+        action, tree = self.delete_subtree(3)
+        saved = []
+
+        def receiver(instance, raw, **kwargs):
+            saved.append((instance.pk, raw))
+
+        post_save.connect(receiver, sender=Link)
+        self.addCleanup(post_save.disconnect, receiver, sender=Link)
+        self.restore(action)
+
+        self.assertEqual(saved, [(row[0], True) for row in tree])
+        self.assertEqual(self.tree(self.placeholder), tree)
+
+    def test_row_builders(self):
+        self.assertIsNotNone(get_row_builder(Link))
+        self.assertIsNotNone(get_row_builder(PluginModelWithFKFromModel))
+        # Many-to-many fields are set by the deserializer
+        self.assertIsNone(get_row_builder(ArticlePluginModel))
+
+    def test_values_are_converted_like_the_deserializer(self):
+        action, tree = self.delete_subtree(1)
+        archived_plugin = action.get_pre_action_data()['plugins'][0]
+
+        instance = get_row_builder(Link).get_instance(archived_plugin)
+        deserialized = archived_plugin.deserialize().object
+
+        self.assertEqual(instance.pk, archived_plugin.pk)
+
+        for field in Link._meta.local_concrete_fields:
+            if not field.primary_key:
+                self.assertEqual(getattr(instance, field.attname), getattr(deserialized, field.attname))
+
+    def test_deserialized_instance_is_deprecated(self):
+        action, tree = self.delete_subtree(1)
+        archived_plugin = action.get_pre_action_data()['plugins'][0]
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            deserialized = archived_plugin.deserialized_instance
+
+        [warning] = [warning for warning in caught if 'deserialized_instance' in str(warning.message)]
+        self.assertIs(warning.category, DeprecationWarning)
+        self.assertEqual(warning.filename, __file__)
+        self.assertEqual(deserialized.object.name, 'parent')
+
+    def test_parent_argument_of_restore_is_ignored(self):
+        action, tree = self.delete_subtree(2)
+        parent, child = action.get_pre_action_data()['plugins']
+        parent.restore(placeholder=self.placeholder, language='en')
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            child.restore(placeholder=self.placeholder, language='en', parent=None)
+
+        [warning] = [warning for warning in caught if 'parent argument' in str(warning.message)]
+        self.assertIs(warning.category, DeprecationWarning)
+        self.assertEqual(warning.filename, __file__)
+        self.assertEqual(self.tree(self.placeholder), tree)
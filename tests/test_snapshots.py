@@ -0,0 +1,392 @@
+from unittest.mock import patch
+
+from django.db.models import QuerySet, Sum
+from django.db.models.functions import Length
+from django.test import override_settings
+
+from djangocms_history import models, snapshots
+from djangocms_history.helpers import get_plugin_data
+from djangocms_history.models import (
+    PlaceholderAction,
+    PlaceholderOperation,
+    PluginSnapshot,
+    PluginSnapshotReference,
+    delete_operations,
+)
+
+from .base import HistoryTestCase
+from .test_undo_redo import UndoRedoRoundTripMixin
+
+# Long enough for the plugin data to be stored as a snapshot
+LONG_NAME = 'A link with a name long enough to be stored as a snapshot {}'
+# Tracking parameters make up most of real world links
+LONG_LINK = 'https://www.django-cms.org/en/?' + '&'.join(
+    'utm_{0}=campaign-{0}'.format(index) for index in range(20)
+)
+
+
+def get_stored_size():
+    actions = PlaceholderAction.objects.aggregate(
+        size=Sum(Length('pre_action_data') + Length('post_action_data')),
+    )
+    snapshots = PluginSnapshot.objects.aggregate(size=Sum(Length('data')))
+    return (actions['size'] or 0) + (snapshots['size'] or 0)
+
+
+@override_settings(DJANGOCMS_HISTORY_COMPRESSION=None, DJANGOCMS_HISTORY_SNAPSHOT_STORE=True)
+class SnapshotStoreTestCase(UndoRedoRoundTripMixin, HistoryTestCase):
+
+    def add_subtree(self, size=4, **data):
+        parent = self.add_plugin(name=LONG_NAME.format('parent'), **data)
+
+        for index in range(size - 1):
+            self.add_plugin(parent=parent, name=LONG_NAME.format(index), **data)
+        return parent
+
+    def cut_and_paste(self, parent):
+        self.cut_plugin_via_endpoint(parent)
+        clipboard_root = self.get_clipboard().get_plugins('en').get(parent__isnull=True)
+        self.paste_plugin_via_endpoint(
+            clipboard_root,
+            target_placeholder=self.sidebar,
+            target_position=1,
+        )
+
+    def test_cut_stores_the_subtree_once(self):
+        parent = self.add_subtree()
+        self.snapshot_before(placeholders=[self.placeholder, self.get_clipboard()])
+
+        with self.login_user_context(self.superuser):
+            self.cut_plugin_via_endpoint(parent)
+
+            self.assertEqual(PluginSnapshot.objects.count(), 4)
+            self.assertEqual(self.latest_operation().snapshot_references.count(), 4)
+            self.assert_round_trip(placeholders=[self.placeholder, self.get_clipboard()])
+
+    def test_paste_shares_the_snapshots_of_the_cut(self):
+        parent = self.add_subtree()
+
+        with self.login_user_context(self.superuser):
+            self.cut_and_paste(parent)
+
+        self.assertEqual(PluginSnapshot.objects.count(), 4)
+        self.assertEqual(PluginSnapshotReference.objects.count(), 8)
+
+    def test_cut_and_paste_store_less_than_half(self):
+        parent = self.add_subtree(size=10, external_link=LONG_LINK)
+
+        with self.login_user_context(self.superuser):
+            self.cut_and_paste(parent)
+        size = get_stored_size()
+
+        PlaceholderOperation.objects.all().delete()
+        PluginSnapshot.objects.all().delete()
+        parent = self.add_subtree(size=10, external_link=LONG_LINK)
+
+        with override_settings(DJANGOCMS_HISTORY_SNAPSHOT_STORE=False):
+            with self.login_user_context(self.superuser):
+                self.cut_and_paste(parent)
+
+        self.assertLess(size * 2, get_stored_size())
+
+    def test_change_round_trip(self):
+        plugin = self.add_plugin(name=LONG_NAME.format('before'))
+
+        with self.login_user_context(self.superuser):
+            self.change_plugin_via_endpoint(
+                plugin,
+                name=LONG_NAME.format('after'),
+                external_link='https://www.django-cms.org',
+            )
+            action = self.latest_operation().actions.get()
+            self.assertEqual(PluginSnapshot.objects.count(), 1)
+            self.assertEqual(
+                action.get_post_action_data()['plugins'][0].data,
+                {'name': LONG_NAME.format('after')},
+            )
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, LONG_NAME.format('before'))
+
+    def test_snapshot_data_is_loaded_as_recorded(self):
+        plugin = self.add_plugin(name=LONG_NAME.format('link'))
+        recorded = get_plugin_data(plugin)['data']
+
+        with self.login_user_context(self.superuser):
+            self.delete_plugin_via_endpoint(plugin)
+
+        data = self.latest_operation().actions.get().get_pre_action_data()['plugins'][0].data
+        self.assertEqual(data, recorded)
+        self.assertNotIn('cmsplugin_ptr', data)
+
+    def test_snapshot_field_names_are_shared(self):
+        parent = self.add_subtree(size=2)
+
+        with self.login_user_context(self.superuser):
+            self.delete_plugin_via_endpoint(parent)
+
+        first, second = self.latest_operation().actions.get().get_pre_action_data()['plugins']
+        self.assertIs(list(first.data)[1], list(second.data)[1])
+
+    def test_deleted_operations_free_their_snapshots(self):
+        parent = self.add_subtree()
+
+        with self.login_user_context(self.superuser):
+            self.cut_and_paste(parent)
+
+        cut, paste = self.operations().order_by('pk')
+        delete_operations(PlaceholderOperation.objects.filter(pk=cut.pk))
+        self.assertEqual(PluginSnapshot.objects.count(), 4)
+
+        delete_operations(PlaceholderOperation.objects.filter(pk=paste.pk))
+        self.assertFalse(PluginSnapshot.objects.exists())
+        self.assertFalse(PluginSnapshotReference.objects.exists())
+
+    @override_settings(DJANGOCMS_HISTORY_DEFERRED_SNAPSHOTS=True)
+    def test_deferred_snapshots_are_stored(self):
+        parent = self.add_subtree()
+
+        with self.login_user_context(self.superuser):
+            self.cut_and_paste(parent)
+            self.snapshot_before(placeholders=[self.sidebar])
+            self.assertEqual(PluginSnapshotReference.objects.count(), 4)
+
+            self.undo()
+            self.assertEqual(PluginSnapshotReference.objects.count(), 8)
+            self.redo()
+
+    def test_snapshot_freed_while_referenced_is_stored_again(self):
+        plugin = self.add_plugin(name=LONG_NAME.format('link'))
+
+        with self.login_user_context(self.superuser):
+            self.delete_plugin_via_endpoint(plugin)
+
+        operation = self.latest_operation()
+        snapshot = PluginSnapshot.objects.get()
+        text = models.compression.decompress(snapshot.data)
+        bulk_create = QuerySet.bulk_create
+        inserts = []
+
+        def bulk_create_and_free(queryset, objs, **kwargs):
+            created = bulk_create(queryset, objs, **kwargs)
+
+            if queryset.model is PluginSnapshot and not inserts:
+                # A concurrent free() of the snapshot, found unreferenced
+                PluginSnapshot.objects.filter(pk=snapshot.pk).delete()
+            inserts.append(queryset.model)
+            return created
+
+        with patch.object(QuerySet, 'bulk_create', bulk_create_and_free):
+            snapshots.save(operation.pk, {snapshot.pk: text})
+
+        self.assertEqual(inserts.count(PluginSnapshot), 2)
+        self.assertTrue(PluginSnapshot.objects.filter(pk=snapshot.pk, references__operation=operation).exists())
+
+    def test_missing_snapshots_are_not_replayed(self):
+        parent = self.add_subtree()
+
+        with self.login_user_context(self.superuser):
+            self.delete_plugin_via_endpoint(parent)
+            PluginSnapshot.objects.all().delete()
+
+            response = self.post_undo()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.placeholder.get_plugins('en').exists())
+        self.assertTrue(self.latest_operation().is_applied)
+
+    @override_settings(DJANGOCMS_HISTORY_SNAPSHOT_STORE=False)
+    def test_disabled(self):
+        parent = self.add_subtree()
+
+        with self.login_user_context(self.superuser):
+            self.cut_and_paste(parent)
+
+        self.assertFalse(PluginSnapshot.objects.exists())
+
+
+class LinkedChangesTestCase(HistoryTestCase):
+    """
+    A plugin change following the session's change of the same plugin
+    refers to it instead of storing the plugin data again.
+    """
+
+    def change(self, plugin, name):
+        return self.change_plugin_via_endpoint(
+            plugin,
+            name=name,
+            external_link='https://www.django-cms.org',
+        )
+
+    def get_change_actions(self):
+        return [operation.actions.get() for operation in self.operations()]
+
+    def test_consecutive_changes_are_linked(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            self.change(plugin, 'second')
+
+            first, second = self.get_change_actions()
+            self.assertEqual(second.previous_action_id, first.pk)
+            self.assertEqual(second.pre_action_data, '')
+            self.assertEqual(second.get_pre_action_data()['plugins'][0].data['name'], 'first')
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'first')
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'before')
+
+            self.redo()
+            self.redo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'second')
+
+    @override_settings(DJANGOCMS_HISTORY_COMPRESSION=None, DJANGOCMS_HISTORY_SNAPSHOT_STORE=True)
+    def test_consecutive_changes_are_linked_with_the_snapshot_store(self):
+        plugin = self.add_plugin(name=LONG_NAME.format('before'))
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, LONG_NAME.format('first'))
+            self.change(plugin, LONG_NAME.format('second'))
+
+            first, second = self.get_change_actions()
+            self.assertTrue(PluginSnapshot.objects.exists())
+            self.assertEqual(second.previous_action_id, first.pk)
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, LONG_NAME.format('first'))
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, LONG_NAME.format('before'))
+
+    def test_change_outside_of_the_history_is_not_linked(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            type(plugin).objects.filter(pk=plugin.pk).update(name='elsewhere')
+            self.change(plugin, 'second')
+
+            second = self.get_change_actions()[1]
+            self.assertIsNone(second.previous_action_id)
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'elsewhere')
+
+    def test_change_after_undo_is_not_linked(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            self.undo()
+            self.change(plugin, 'second')
+
+        self.assertIsNone(self.latest_operation().actions.get().previous_action_id)
+
+    def test_change_of_another_plugin_is_not_linked(self):
+        first = self.add_plugin(name='first')
+        second = self.add_plugin(name='second')
+
+        with self.login_user_context(self.superuser):
+            self.change(first, 'first changed')
+            self.change(second, 'second changed')
+
+        self.assertIsNone(self.latest_operation().actions.get().previous_action_id)
+
+    def test_other_plugin_is_told_apart_without_reading_the_data(self):
+        first = self.add_plugin(name='first')
+        second = self.add_plugin(name='second')
+
+        with self.login_user_context(self.superuser):
+            self.change(first, 'first changed')
+
+        operation = self.latest_operation()
+        first.refresh_from_db()
+
+        # The head operation and the summary of its actions
+        with self.assertNumQueries(2):
+            self.assertIsNone(operation.get_previous_change(get_plugin_data(second)))
+
+        self.assertEqual(operation.get_previous_change(get_plugin_data(first)), operation.actions.get())
+
+    @patch.object(models, 'MAX_CHAIN_LENGTH', 2)
+    def test_chain_length_is_limited(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            for index in range(4):
+                self.change(plugin, str(index))
+
+        self.assertEqual(
+            [action.depth for action in self.get_change_actions()],
+            [0, 1, 2, 0],
+        )
+
+    def test_deleted_change_is_unlinked_first(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            self.change(plugin, 'second')
+            self.change(plugin, 'third')
+
+            first, second, third = self.get_change_actions()
+            delete_operations(PlaceholderOperation.objects.filter(pk=first.operation_id))
+
+            second.refresh_from_db()
+            third.refresh_from_db()
+            self.assertIsNone(second.previous_action_id)
+            self.assertEqual(second.get_pre_action_data()['plugins'][0].data['name'], 'first')
+            self.assertEqual(third.previous_action_id, second.pk)
+
+            self.undo()
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'first')
+
+    def test_change_is_unlinked_by_delete(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            self.change(plugin, 'second')
+            self.change(plugin, 'third')
+
+            first, second, third = self.get_change_actions()
+            first.operation.delete()
+            PlaceholderOperation.objects.filter(pk=second.operation_id).delete()
+
+            third.refresh_from_db()
+            self.assertIsNone(third.previous_action_id)
+            self.assertEqual(third.get_pre_action_data()['plugins'][0].data['name'], 'second')
+
+            self.undo()
+            plugin.refresh_from_db()
+            self.assertEqual(plugin.name, 'second')
+
+    def test_change_of_a_deleted_change_is_not_replayed(self):
+        plugin = self.add_plugin(name='before')
+
+        with self.login_user_context(self.superuser):
+            self.change(plugin, 'first')
+            self.change(plugin, 'second')
+
+            first = self.get_change_actions()[0]
+            # Deleted without unlinking the changes that refer to it
+            PlaceholderOperation._base_manager.filter(pk=first.operation_id).delete()
+
+            response = self.post_undo()
+
+        self.assertEqual(response.status_code, 400)
+        plugin.refresh_from_db()
+        self.assertEqual(plugin.name, 'second')
+        self.assertTrue(self.latest_operation().is_applied)
@@ -7,6 +7,7 @@ from django.test.utils import CaptureQueriesContext
 from cms.models import Placeholder
 from cms.toolbar.toolbar import CMSToolbar as RequestToolbar
 
+from djangocms_history.cms_toolbars import UndoRedoToolbar
 from djangocms_history.models import PlaceholderAction, PlaceholderOperation
 
 from .base import HistoryTestCase
@@ -107,6 +108,17 @@ class UndoRedoToolbarTestCase(HistoryTestCase):
         self.assertTrue(undo_button.disabled)
         self.assertTrue(redo_button.disabled)
 
+    def test_operations_are_looked_up_in_get_operations(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint()
+
+            with patch.object(UndoRedoToolbar, 'get_operations', lambda toolbar: PlaceholderOperation.objects.none()):
+                toolbar = self.get_toolbar()
+                undo_button, redo_button = self.get_buttons(toolbar)
+
+        self.assertTrue(undo_button.disabled)
+        self.assertTrue(redo_button.disabled)
+
     def test_actions_for_undo_and_redo_candidates_are_fetched_together(self):
         with self.login_user_context(self.superuser):
             self.add_plugin_via_endpoint(name='first')
@@ -130,3 +142,26 @@ class UndoRedoToolbarTestCase(HistoryTestCase):
             and action_table in query['sql']
         ]
         self.assertEqual(len(action_selects), 1)
+
+    def test_operations_are_looked_up_once_per_request(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint()
+            toolbar = self.get_toolbar()
+            self.get_buttons(toolbar)
+
+            # Another toolbar rendered for the same request (e.g. by a
+            # structure board refresh) reuses the operations.
+            request = toolbar.request
+            request.toolbar = RequestToolbar(request)
+            request.toolbar.edit_mode_active = True
+
+            with CaptureQueriesContext(connection) as queries:
+                undo_button, _ = self.get_buttons(request.toolbar)
+
+        self.assertFalse(undo_button.disabled)
+        operation_table = PlaceholderOperation._meta.db_table
+        self.assertFalse([
+            query['sql']
+            for query in queries.captured_queries
+            if operation_table in query['sql']
+        ])
@@ -8,7 +8,7 @@ from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from djangocms_history.models import PlaceholderAction, PlaceholderOperation
-from djangocms_history.views import SUPPORTS_DATA_BRIDGE
+from djangocms_history.views import SUPPORTS_DATA_BRIDGE, UndoRedoView
 
 from .base import HistoryTestCase
 
@@ -61,6 +61,16 @@ class UndoRedoViewTestCase(HistoryTestCase):
             response = self.client.post(self.redo_url, self.valid_data)
             self.assertEqual(response.status_code, 400)
 
+    def test_operations_are_looked_up_in_get_queryset(self):
+        with self.login_user_context(self.superuser):
+            self.add_plugin_via_endpoint()
+
+            with patch.object(UndoRedoView, 'get_queryset', lambda view: PlaceholderOperation.objects.none()):
+                response = self.client.post(self.undo_url, self.valid_data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(self.latest_operation().is_applied)
+
     def test_undo_and_redo_flip_is_applied(self):
         with self.login_user_context(self.superuser):
             self.add_plugin_via_endpoint()